@@ -0,0 +1,81 @@
+"""`ReActAgent.get_clean_messages` on long trajectories.
+
+Every question ends with `get_clean_messages` over its full history before the
+result is written. The benchmark builds trajectories shaped like real runs (a
+prompt, then per step an assistant message with reasoning and one tool call and
+a tool message with a page-sized result) and times the conversion.
+
+    python benchmarks/bench_clean_messages.py --steps 10 30 --tool_chars 8000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_trajectory(steps: int, tool_chars: int, seed: int = 0):
+    rng = random.Random(seed)
+    messages = [{"role": "user", "content": "Question prompt. " * 400}]
+    for step in range(steps):
+        name = rng.choice(["search", "visit"])
+        arguments = json.dumps({"query": [f"query {step} {i}" for i in range(3)]} if name == "search"
+                               else {"url": [f"https://example.com/{step}"], "goal": "find the table"})
+        tool_call = SimpleNamespace(id=f"call_{step}", type="function",
+                                    function=SimpleNamespace(name=name, arguments=arguments))
+        messages.append({
+            "role": "assistant",
+            "content": "",
+            "reasoning_content": "Thinking about the next step. " * 60,
+            "tool_calls": [tool_call],
+        })
+        messages.append({"role": "tool", "tool_call_id": tool_call.id, "content": "r" * tool_chars})
+    return messages
+
+
+def run(steps=(10, 30), tool_chars=8000, repeat=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("TOOL_CACHE_PATH", os.path.join(tmp, "tool_cache.db"))
+        from react_agent import ReActAgent
+        agent = ReActAgent(model_name="bench", api_base_url="http://127.0.0.1", api_key="")
+
+        results = []
+        for n in steps:
+            messages = make_trajectory(n, tool_chars)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                clean = agent.get_clean_messages(messages)
+                timings.append(time.perf_counter() - start)
+            json.dumps(clean, ensure_ascii=False)
+            timings.sort()
+            row = {
+                "steps": n,
+                "messages": len(messages),
+                "tool_chars": tool_chars,
+                "p50_ms": round(timings[len(timings) // 2] * 1000, 4),
+                "best_ms": round(timings[0] * 1000, 4),
+            }
+            results.append(row)
+            print(f"[bench_clean_messages] steps={n:<4} messages={row['messages']:<4} "
+                  f"p50={row['p50_ms']}ms  best={row['best_ms']}ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 30])
+    parser.add_argument("--tool_chars", type=int, default=8000, help="characters per tool result")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", type=str, default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = run(args.steps, args.tool_chars, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
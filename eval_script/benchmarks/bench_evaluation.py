@@ -0,0 +1,95 @@
+"""`SimpleEvaluator.run_evaluation` over a synthetic question set.
+
+Writes N questions of the four answer types with their ground-truth CSVs and
+prediction JSONs (a share of them wrong or missing) to a temporary directory
+and times one full evaluation pass, including the reports it writes.
+
+    python benchmarks/bench_evaluation.py --questions 1000 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_evaluation import SimpleEvaluator
+
+ANSWER_TYPES = ("item", "set", "list", "table")
+
+
+def _answer(answer_type: str, rng: random.Random):
+    """(ground-truth CSV, predicted TSV block) of one synthetic question."""
+    if answer_type == "item":
+        values = [[str(rng.randint(1, 10**6))]]
+    elif answer_type in ("set", "list"):
+        values = [[f"entity {rng.randint(1, 500)}"] for _ in range(rng.randint(3, 15))]
+    else:
+        values = [[f"company {i}", str(rng.randint(1990, 2024)), f"{rng.uniform(0, 100):.2f}%"] for i in range(rng.randint(5, 30))]
+
+    predicted = [list(row) for row in values]
+    if rng.random() < 0.3:
+        predicted[rng.randrange(len(predicted))][0] = "wrong value"
+    if answer_type == "table":
+        header = ["name", "year", "share"]
+        gt = "\n".join(",".join(row) for row in [header] + values)
+        pred = "\n".join("\t".join(row) for row in [header] + predicted)
+    else:
+        gt = "\n".join(",".join(row) for row in values)
+        pred = "\n".join("\t".join(row) for row in [["answer"]] + predicted)
+    return gt, f"Final answer:\n```tsv\n{pred}\n```"
+
+
+def make_dataset(root: str, n: int, missing_ratio: float = 0.02, seed: int = 0):
+    rng = random.Random(seed)
+    gt_dir, pred_dir = os.path.join(root, "gt"), os.path.join(root, "pred")
+    os.makedirs(gt_dir)
+    os.makedirs(pred_dir)
+    question_file = os.path.join(root, "question.jsonl")
+    with open(question_file, "w", encoding="utf-8") as f:
+        for i in range(n):
+            qid = str(i)
+            answer_type = ANSWER_TYPES[i % len(ANSWER_TYPES)]
+            f.write(json.dumps({"id": qid, "question": f"Synthetic question {i}", "answer_type": answer_type}) + "\n")
+            gt, prediction = _answer(answer_type, rng)
+            with open(os.path.join(gt_dir, f"{qid}.csv"), "w", encoding="utf-8") as g:
+                g.write(gt + "\n")
+            if rng.random() < missing_ratio:
+                continue
+            with open(os.path.join(pred_dir, f"{qid}.json"), "w", encoding="utf-8") as p:
+                json.dump({"question": f"Synthetic question {i}", "prediction": prediction}, p)
+    return pred_dir, gt_dir, question_file
+
+
+def run(questions=(1000, 10000)):
+    results = []
+    for n in questions:
+        with tempfile.TemporaryDirectory() as tmp:
+            pred_dir, gt_dir, question_file = make_dataset(tmp, n)
+            start = time.perf_counter()
+            summary = SimpleEvaluator().run_evaluation(pred_dir, gt_dir, question_file)
+            elapsed = time.perf_counter() - start
+        row = {
+            "questions": n,
+            "seconds": round(elapsed, 3),
+            "questions_per_sec": round(n / elapsed, 1),
+            "overall_global_em": round(float(summary["overall_global_em"]), 4),
+        }
+        results.append(row)
+        print(f"[bench_evaluation] questions={n:<6} {row['seconds']}s  {row['questions_per_sec']} q/s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--output", type=str, default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = run(args.questions)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
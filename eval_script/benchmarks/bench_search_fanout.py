@@ -0,0 +1,171 @@
+"""`Search.call` / `Search.acall` fan-out against a local Serper stand-in.
+
+A `replay_server` route serves a synthetic result page for every query after a
+fixed latency, so the wall time of one multi-query call shows how much of the
+fan-out actually overlaps. Each call is run with batched Serper requests and
+with one request per query (`batch` 1). The `agents` rows run many concurrent
+`Search.call`s and report the peak number of threads. Queries are unique per
+round and never hit the cache.
+
+    python benchmarks/bench_search_fanout.py --queries 1 5 10 --latency 0.2 --agents 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay_server import ExchangeStore, Route, StandInServer, exchange_key
+
+
+def _serper_body(query: str) -> bytes:
+    """Request body `Search._build_request` sends for an English query."""
+    payload = {"q": query, "location": "United States", "gl": "us", "hl": "en"}
+    return json.dumps(payload).encode("utf-8")
+
+
+def _serper_page(query: str, n_results: int = 10) -> str:
+    organic = [
+        {
+            "title": f"{query} result {i}",
+            "link": f"https://example.com/{query.replace(' ', '-')}/{i}",
+            "snippet": f"Snippet {i} for {query}. " * 5,
+            "date": "2024-01-01",
+        }
+        for i in range(n_results)
+    ]
+    return json.dumps({"organic": organic})
+
+
+def build_store(path: str, queries):
+    store = ExchangeStore(path)
+    for query in queries:
+        store.add({
+            "key": exchange_key("serper", "POST", "/search", _serper_body(query)),
+            "route": "serper",
+            "method": "POST",
+            "path": "/search",
+            "status": 200,
+            "headers": {"Content-Type": "application/json"},
+            "latency": 0.0,
+            "body": _serper_page(query),
+        })
+    return store
+
+
+BATCH_SIZES = (100, 1)
+
+
+def _run_agents(search, agents: int, queries_per_agent: int, tag: str):
+    """Wall time and peak number of search threads of `agents` concurrent `Search.call`s."""
+    peak = 0
+    done = threading.Event()
+
+    def watch():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, sum(t.name.startswith("search") for t in threading.enumerate()))
+            time.sleep(0.005)
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=agents) as pool:
+        outputs = list(pool.map(
+            lambda a: search.call({"query": [f"bench query agents {tag} {a} {i}" for i in range(queries_per_agent)]}),
+            range(agents)
+        ))
+    elapsed = time.perf_counter() - start
+    done.set()
+    watcher.join()
+    assert all(o[0].count("## Web Results") == queries_per_agent for o in outputs)
+    return elapsed, peak
+
+
+def run(queries=(1, 5, 10), latency=0.2, rounds=5, agents=50, queries_per_agent=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        plan = {(n, mode, batch, r): [f"bench query {mode} {batch} {n} {r} {i}" for i in range(n)]
+                for n in queries for mode in ("call", "acall") for batch in BATCH_SIZES for r in range(rounds)}
+        agent_queries = [f"bench query agents {batch} {a} {i}" for batch in BATCH_SIZES
+                         for a in range(agents) for i in range(queries_per_agent)]
+        store = build_store(os.path.join(tmp, "serper.jsonl"), [q for qs in plan.values() for q in qs] + agent_queries)
+        route = Route("serper", 0, None, {"latency": {"dist": "fixed", "value": latency}})
+        server = StandInServer("replay", store, [route])
+        server.serve()
+
+        os.environ["SERPER_BASE_URL"] = f"http://127.0.0.1:{route.port}"
+        os.environ.setdefault("TOOL_CACHE_PATH", os.path.join(tmp, "tool_cache.db"))
+        import tools
+        search = tools.Search()
+
+        results = []
+        for n in queries:
+            for mode, batch in [(m, b) for m in ("call", "acall") for b in BATCH_SIZES]:
+                tools.SERPER_BATCH_SIZE = batch
+                timings = []
+                for r in range(rounds):
+                    params = {"query": plan[(n, mode, batch, r)]}
+                    start = time.perf_counter()
+                    if mode == "call":
+                        output = search.call(params)
+                    else:
+                        output = asyncio.run(search.acall(params))
+                    timings.append(time.perf_counter() - start)
+                    text = output[0] if isinstance(output, tuple) else output
+                    assert text.count("## Web Results") == n, text[:500]
+                best = min(timings)
+                row = {
+                    "mode": mode,
+                    "batch": batch,
+                    "queries": n,
+                    "latency_s": latency,
+                    "best_s": round(best, 4),
+                    "mean_s": round(sum(timings) / len(timings), 4),
+                    # n * latency would be a fully sequential call, latency a fully parallel one
+                    "overlap": round(n * latency / best, 2),
+                }
+                results.append(row)
+                print(f"[bench_search_fanout] {mode:<6} batch={batch:<3} queries={n:<3} best={row['best_s']}s  "
+                      f"mean={row['mean_s']}s  overlap=x{row['overlap']}")
+
+        if agents:
+            for batch in BATCH_SIZES:
+                tools.SERPER_BATCH_SIZE = batch
+                requests_before = server.stats_dict().get("serper", {}).get("requests", 0)
+                elapsed, search_threads = _run_agents(search, agents, queries_per_agent, batch)
+                row = {
+                    "mode": "agents",
+                    "batch": batch,
+                    "agents": agents,
+                    "queries": queries_per_agent,
+                    "latency_s": latency,
+                    "wall_s": round(elapsed, 4),
+                    "peak_search_threads": search_threads,
+                    "serper_requests": server.stats_dict()["serper"]["requests"] - requests_before,
+                }
+                results.append(row)
+                print(f"[bench_search_fanout] agents={agents} x {queries_per_agent} queries batch={batch:<3} "
+                      f"wall={row['wall_s']}s  requests={row['serper_requests']}  peak search threads={search_threads}")
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, nargs="+", default=[1, 5, 10], help="queries per call")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per Serper request")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--agents", type=int, default=50, help="concurrent Search.call()s for the thread-count rows (0 = skip)")
+    parser.add_argument("--output", type=str, default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = run(args.queries, args.latency, args.rounds, args.agents)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
@@ -0,0 +1,107 @@
+"""Page truncation cost: `token_budget` against the previous `truncate_to_tokens`.
+
+Pages are synthetic Jina-style markdown (prose, link lists, tables and some CJK
+text) from 10KB to 10MB. For each size the benchmark times the initial cut to
+95k tokens and the three 70% shrink retries of `Visit.readpage_jina`.
+
+    python benchmarks/bench_token_budget.py --sizes 10000 1000000 10000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tiktoken
+from token_budget import TokenBudget, truncate_to_tokens
+
+
+def legacy_truncate_to_tokens(text: str, max_tokens: int = 95000) -> str:
+    """`truncate_to_tokens` before token_budget: new encoding per call, full-page encode."""
+    encoding = tiktoken.get_encoding("cl100k_base")
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+
+    truncated_tokens = tokens[:max_tokens]
+    return encoding.decode(truncated_tokens)
+
+
+_WORDS = ("the of and to in is was for on that with as by at from revenue table year "
+          "population region company report data market growth percent total annual").split()
+
+
+def make_page(size: int, seed: int = 0) -> str:
+    """Markdown resembling r.jina.ai output, `size` characters long."""
+    rng = random.Random(seed)
+    parts = ["Title: Synthetic page\n\nURL Source: https://example.com/page\n\nMarkdown Content:\n"]
+    length = len(parts[0])
+    while length < size:
+        kind = rng.random()
+        if kind < 0.55:
+            block = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 120))).capitalize() + ".\n\n"
+        elif kind < 0.75:
+            block = "".join(f"*   [{rng.choice(_WORDS)} {i}](https://example.com/{rng.randint(0, 10**6)})\n" for i in range(10)) + "\n"
+        elif kind < 0.9:
+            rows = [f"| {rng.choice(_WORDS)} | {rng.randint(0, 10**6)} | {rng.random():.4f} |" for _ in range(15)]
+            block = "| name | value | ratio |\n| --- | --- | --- |\n" + "\n".join(rows) + "\n\n"
+        else:
+            block = "".join(chr(rng.randint(0x4E00, 0x9FFF)) for _ in range(200)) + "。\n\n"
+        parts.append(block)
+        length += len(block)
+    return "".join(parts)[:size]
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes=(10_000, 100_000, 1_000_000, 10_000_000), max_tokens=95000, repeat=3):
+    results = []
+    for size in sizes:
+        page = make_page(size)
+
+        def legacy():
+            content = legacy_truncate_to_tokens(page, max_tokens)
+            for _ in range(3):
+                content = legacy_truncate_to_tokens(content[:int(0.7 * len(content))], max_tokens)
+
+        def current():
+            budget = TokenBudget(page, max_tokens)
+            for _ in range(3):
+                budget.shrink(0.7)
+
+        assert truncate_to_tokens(page, max_tokens) == legacy_truncate_to_tokens(page, max_tokens)
+        row = {
+            "page_chars": size,
+            "legacy_ms": round(_time(legacy, repeat) * 1000, 2),
+            "current_ms": round(_time(current, repeat) * 1000, 2),
+        }
+        row["speedup"] = round(row["legacy_ms"] / row["current_ms"], 2) if row["current_ms"] else None
+        results.append(row)
+        print(f"[bench_token_budget] {size:>10} chars  legacy={row['legacy_ms']}ms  "
+              f"current={row['current_ms']}ms  x{row['speedup']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--max_tokens", type=int, default=95000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=str, default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.max_tokens, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
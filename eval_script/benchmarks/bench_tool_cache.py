@@ -0,0 +1,129 @@
+"""ToolCache throughput under concurrent agents.
+
+Replays the access pattern of `Search`/`Visit` (mostly lookups, a share of
+inserts with page-sized values) from N threads against the current
+`ToolCache` and against the previous connection-per-call implementation.
+
+    python benchmarks/bench_tool_cache.py --threads 1 8 50 --ops 400
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tool_cache import ToolCache
+
+
+class LegacyToolCache:
+    """The ToolCache before persistent connections: one connect per call and one commit per write."""
+    _lock = threading.Lock()
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path, check_same_thread=False) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with sqlite3.connect(self.db_path, check_same_thread=False) as conn:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            with sqlite3.connect(self.db_path, check_same_thread=False) as conn:
+                conn.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, value))
+                conn.commit()
+
+    def flush(self, timeout=None):
+        return True
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_workload(cache, threads: int, ops: int, write_ratio: float, value_size: int, seed: int = 0):
+    """Run `ops` operations per thread and return throughput/latency numbers."""
+    value = "x" * value_size
+    warm_keys = [f"visit_v1:https://example.com/warm/{i}" for i in range(200)]
+    for key in warm_keys:
+        cache.set(key, value)
+    cache.flush()
+
+    def worker(tid):
+        rng = random.Random(seed + tid)
+        latencies = []
+        for i in range(ops):
+            start = time.perf_counter()
+            if rng.random() < write_ratio:
+                key = f"visit_v1:https://example.com/{threads}/{tid}/{i}"
+                cache.set(key, value)
+                assert cache.get(key) is not None
+            else:
+                cache.get(rng.choice(warm_keys))
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = [lat for lats in executor.map(worker, range(threads)) for lat in lats]
+    cache.flush()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "threads": threads,
+        "ops": len(latencies),
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def run(threads=(1, 8, 50), ops=400, write_ratio=0.2, value_size=20000):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        current = ToolCache(db_path=os.path.join(tmp, "current.db"))
+        legacy = LegacyToolCache(os.path.join(tmp, "legacy.db"))
+        for n in threads:
+            for name, cache in (("legacy", legacy), ("current", current)):
+                row = run_workload(cache, n, ops, write_ratio, value_size)
+                row["impl"] = name
+                results.append(row)
+                print(f"[bench_tool_cache] {name:<8} threads={n:<4} {row['ops_per_sec']:>10} ops/s  "
+                      f"p50={row['p50_ms']}ms  p99={row['p99_ms']}ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 50])
+    parser.add_argument("--ops", type=int, default=400, help="operations per thread")
+    parser.add_argument("--write_ratio", type=float, default=0.2)
+    parser.add_argument("--value_size", type=int, default=20000, help="bytes per cached value")
+    parser.add_argument("--output", type=str, default="", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = run(args.threads, args.ops, args.write_ratio, args.value_size)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
@@ -0,0 +1,121 @@
+"""Run the harness benchmark suite and write one JSON report.
+
+Each benchmark runs in its own process (the tool cache is a per-process
+singleton and the endpoints are read from the environment at import time).
+The report records the git revision so reports of two versions can be
+compared; `--baseline` does that and fails if a timing regressed.
+
+    python benchmarks/run_all.py --output bench_report.json
+    python benchmarks/run_all.py --quick --output new.json --baseline bench_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (full arguments, --quick arguments)
+SUITE = {
+    "tool_cache": (["--threads", "1", "8", "50"], ["--threads", "1", "8", "--ops", "100"]),
+    "token_budget": ([], ["--sizes", "10000", "1000000", "--repeat", "1"]),
+    "search_fanout": ([], ["--queries", "1", "5", "--rounds", "2", "--agents", "20"]),
+    "clean_messages": (["--steps", "10", "30"], ["--steps", "30", "--repeat", "20"]),
+    "evaluation": (["--questions", "1000", "10000"], ["--questions", "1000"]),
+}
+
+# Row fields that are timings (lower is better); everything else is a parameter or an outcome.
+TIMING_SUFFIXES = ("_ms", "_s", "seconds")
+PARAMETER_FIELDS = ("latency_s",)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(name: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, f"{name}.json")
+        env = dict(os.environ, TOOL_CACHE_PATH=os.path.join(tmp, "tool_cache.db"))
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, os.path.join(BENCH_DIR, f"bench_{name}.py"), *args, "--output", output], env=env)
+        elapsed = time.perf_counter() - start
+        if proc.returncode != 0 or not os.path.exists(output):
+            return {"status": "failed", "returncode": proc.returncode, "seconds": round(elapsed, 2), "rows": []}
+        with open(output, "r", encoding="utf-8") as f:
+            return {"status": "ok", "seconds": round(elapsed, 2), "rows": json.load(f)}
+
+
+def _timings(report: dict) -> dict:
+    """{(benchmark, row parameters, field): value} for every timing field of a report."""
+    timings = {}
+    for name, result in report["benchmarks"].items():
+        for row in result["rows"]:
+            is_timing = {k: k.endswith(TIMING_SUFFIXES) and k not in PARAMETER_FIELDS for k in row}
+            params = tuple(sorted((k, str(v)) for k, v in row.items() if not is_timing[k] and isinstance(v, (str, int))))
+            for k, v in row.items():
+                if is_timing[k] and isinstance(v, (int, float)):
+                    timings[(name, params, k)] = v
+    return timings
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    current, previous = _timings(report), _timings(baseline)
+    regressions = []
+    for key, value in sorted(current.items()):
+        base = previous.get(key)
+        if not base:
+            continue
+        ratio = value / base
+        name, params, field = key
+        label = f"{name} {' '.join(f'{k}={v}' for k, v in params)} {field}"
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"[compare] {label:<90} {base:>10} -> {value:<10} x{ratio:.2f} {flag}")
+        if flag:
+            regressions.append({"benchmark": name, "params": dict(params), "field": field, "baseline": base, "current": value, "ratio": round(ratio, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", type=str, nargs="+", default=list(SUITE), choices=list(SUITE))
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a smoke run")
+    parser.add_argument("--output", type=str, default="bench_report.json")
+    parser.add_argument("--baseline", type=str, default="", help="earlier report to compare timings against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a timing counts as a regression")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "benchmarks": {},
+    }
+    for name in args.only:
+        print(f"==== {name} ====")
+        report["benchmarks"][name] = run_benchmark(name, SUITE[name][1 if args.quick else 0])
+
+    exit_code = 0 if all(r["status"] == "ok" for r in report["benchmarks"].values()) else 1
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["baseline_revision"] = baseline.get("revision")
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        if report["regressions"]:
+            exit_code = 1
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"Report saved to {args.output}")
+    sys.exit(exit_code)
@@ -0,0 +1,169 @@
+import math
+import re
+from collections import Counter
+from typing import List
+
+from token_budget import ENCODING_NAME, PRECUT_CHARS_PER_TOKEN, get_encoding
+
+
+# Pages are cut to this many characters before chunking; scoring a longer page costs more than it finds.
+MAX_SCAN_CHARS = 4_000_000
+# Characters per token used to size chunks before they are encoded.
+CHUNK_CHARS_PER_TOKEN = 4
+# Marks the place of dropped chunks in the text sent to the extractor.
+GAP_MARKER = "\n\n[...]\n\n"
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TERM_RE = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+
+
+def terms(text: str) -> List[str]:
+    """Lowercased words and numbers; CJK text is split into single characters."""
+    return _TERM_RE.findall(text.lower())
+
+
+def split_chunks(text: str, chunk_tokens: int) -> List[str]:
+    """Split `text` into consecutive chunks of about `chunk_tokens` tokens.
+
+    Chunks end at a paragraph or line break where there is one. Joining the
+    chunks gives back `text` exactly.
+    """
+    size = max(1, chunk_tokens * CHUNK_CHARS_PER_TOKEN)
+    chunks = []
+    start = 0
+    while len(text) - start > size:
+        end = start + size
+        # Prefer the last paragraph break, then the last line break, in the second half of the chunk.
+        cut = -1
+        for separator in ("\n\n", "\n"):
+            cut = text.rfind(separator, start + size // 2, end)
+            if cut != -1:
+                cut += len(separator)
+                break
+        if cut == -1:
+            cut = text.rfind(" ", start + size // 2, end) + 1 or end
+        chunks.append(text[start:cut])
+        start = cut
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+
+def bm25_scores(query: str, chunks: List[str]) -> List[float]:
+    query_terms = set(terms(query))
+    if not query_terms or not chunks:
+        return [0.0] * len(chunks)
+    counts = [Counter(terms(chunk)) for chunk in chunks]
+    lengths = [sum(c.values()) for c in counts]
+    avg_length = sum(lengths) / len(lengths) or 1.0
+    n = len(chunks)
+    idf = {}
+    for term in query_terms:
+        df = sum(1 for c in counts if term in c)
+        idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    scores = []
+    for c, length in zip(counts, lengths):
+        score = 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+        for term in query_terms:
+            tf = c.get(term)
+            if tf:
+                score += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+class ChunkBudget:
+    """The chunks of a page that best match a goal, within a token budget.
+
+    Has the interface of `TokenBudget`, so the extractor retries can shrink it:
+    a shrink drops the lowest ranked chunks instead of the end of the page.
+    The first chunk (title and lead) is always kept. Chunks keep their page
+    order and a gap marker stands for every run of dropped chunks.
+    """
+
+    def __init__(self, text: str, goal: str, max_tokens: int, chunk_tokens: int = 512,
+                 encoding_name: str = ENCODING_NAME):
+        self.encoding_name = encoding_name
+        self.page_chars = len(text)
+        chunks = split_chunks(text[:MAX_SCAN_CHARS], chunk_tokens)
+        scores = bm25_scores(goal, chunks)
+        # Highest score first, earlier chunks first on ties; a goal without matching terms keeps the page order.
+        order = sorted(range(len(chunks)), key=lambda i: (i != 0, -scores[i], i))
+        encoding = get_encoding(encoding_name)
+        # Shortest chunk from rank k on. A chunk is taken to have at least one token per
+        # `chars_per_token` characters, the most seen in an encoded chunk so far (at first
+        # PRECUT_CHARS_PER_TOKEN), so chunks that cannot fit the rest of the budget are not
+        # encoded, and the scan stops once none of the remaining ones can.
+        min_chars_from = [0] * len(order) + [float("inf")]
+        for k in range(len(order) - 1, -1, -1):
+            min_chars_from[k] = min(min_chars_from[k + 1], len(chunks[order[k]]))
+        chars_per_token = None
+        self._ranked = []
+        total = 0
+        for k, i in enumerate(order):
+            fit_chars = (max_tokens - total) * (chars_per_token or PRECUT_CHARS_PER_TOKEN)
+            if min_chars_from[k] > fit_chars:
+                break
+            if len(chunks[i]) > fit_chars:
+                continue
+            n_tokens = len(encoding.encode(chunks[i], disallowed_special=()))
+            ratio = len(chunks[i]) / max(1, n_tokens)
+            chars_per_token = ratio if chars_per_token is None else max(chars_per_token, ratio)
+            if total + n_tokens > max_tokens:
+                continue
+            self._ranked.append((i, chunks[i], n_tokens))
+            total += n_tokens
+        if not self._ranked and chunks:
+            # A first chunk larger than the budget on its own is cut to the budget.
+            tokens = encoding.encode(chunks[0], disallowed_special=())[:max_tokens]
+            self._ranked.append((0, encoding.decode(tokens), len(tokens)))
+        self.n_chunks = len(chunks)
+        self.truncated = len(self._ranked) < len(chunks) or len(text) > MAX_SCAN_CHARS
+        self._select(len(self._ranked))
+
+    def _select(self, n: int):
+        self._kept = self._ranked[:n]
+        self.tokens = sum(n_tokens for _, _, n_tokens in self._kept)
+        parts = []
+        previous = -1
+        for i, chunk, _ in sorted(self._kept, key=lambda item: item[0]):
+            if i != previous + 1:
+                parts.append(GAP_MARKER)
+            parts.append(chunk)
+            previous = i
+        if previous != self.n_chunks - 1 and self.truncated:
+            parts.append(GAP_MARKER)
+        self.text = "".join(parts)
+
+    def __len__(self) -> int:
+        return self.tokens
+
+    @property
+    def kept_chunks(self) -> int:
+        return len(self._kept)
+
+    def shrink(self, ratio: float) -> str:
+        """Keep the best ranked chunks that fit in `ratio` of the current tokens and return the new text."""
+        limit = int(self.tokens * ratio)
+        n = 0
+        total = 0
+        if not self._kept:
+            return self.text
+        for _, _, n_tokens in self._kept:
+            if total + n_tokens > limit:
+                break
+            total += n_tokens
+            n += 1
+        if n == 0:
+            # Only the first chunk is left: cut it like `TokenBudget.shrink` would.
+            i, chunk, _ = self._kept[0]
+            encoding = get_encoding(self.encoding_name)
+            tokens = encoding.encode(chunk, disallowed_special=())[:limit]
+            self._ranked = [(i, encoding.decode(tokens), len(tokens))]
+            n = 1
+        self.truncated = True
+        self._select(n)
+        return self.text
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from metrics import METRICS, percentile
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease limit on in-flight questions.
+
+    Every `interval` seconds the controller looks at the LLM and tool calls of the
+    last window. If the error rate is above `max_error_rate`, or the p90 latency of
+    LLM or tool calls has grown past `latency_tolerance` times its baseline, the
+    limit is multiplied by `decrease_factor`. Otherwise, if the limit is saturated,
+    it grows by `increase_step`. The limit never leaves [floor, ceiling].
+
+    The baseline is an exponentially weighted average of the window p90s
+    (`baseline_weight` is the weight of the newest window), so latency that rises
+    and stays up, as it does when contexts grow, becomes the new normal after a
+    few windows instead of cutting the limit down to the floor.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        ceiling: int,
+        floor: int = 1,
+        interval: float = 30.0,
+        increase_step: int = 1,
+        decrease_factor: float = 0.7,
+        max_error_rate: float = 0.05,
+        latency_tolerance: float = 2.0,
+        baseline_weight: float = 0.3,
+        min_samples: int = 10,
+        log_path: Optional[str] = None
+    ):
+        self.ceiling = max(1, ceiling)
+        self.floor = max(1, min(floor, self.ceiling))
+        self.limit = max(self.floor, min(initial, self.ceiling))
+        self.interval = interval
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.max_error_rate = max_error_rate
+        self.latency_tolerance = latency_tolerance
+        self.baseline_weight = baseline_weight
+        self.min_samples = min_samples
+        self.log_path = log_path
+        self.baseline_p90 = {}
+
+    def _latency_degraded(self, kind: str, p90: Optional[float], samples: int) -> bool:
+        if p90 is None or samples < self.min_samples:
+            return False
+        baseline = self.baseline_p90.get(kind)
+        if baseline is None:
+            self.baseline_p90[kind] = p90
+            return False
+        self.baseline_p90[kind] = baseline + self.baseline_weight * (p90 - baseline)
+        return p90 > baseline * self.latency_tolerance
+
+    def update(self, in_flight: int) -> int:
+        window = self.interval
+        requests = METRICS.recent_count("llm_requests_total", window) + METRICS.recent_count("tool_calls_total", window)
+        errors = METRICS.recent_count("llm_errors_total", window) + METRICS.recent_count("tool_errors_total", window)
+        error_rate = errors / requests if requests else 0.0
+        llm_latencies = METRICS.recent_values("llm_latency_seconds", window)
+        tool_latencies = METRICS.recent_values("tool_latency_seconds", window)
+        llm_p90 = percentile(llm_latencies, 0.9)
+        tool_p90 = percentile(tool_latencies, 0.9)
+        llm_degraded = self._latency_degraded("llm", llm_p90, len(llm_latencies))
+        tool_degraded = self._latency_degraded("tool", tool_p90, len(tool_latencies))
+
+        previous = self.limit
+        if requests >= self.min_samples and error_rate > self.max_error_rate:
+            reason = "error_rate"
+        elif llm_degraded or tool_degraded:
+            reason = "llm_latency" if llm_degraded else "tool_latency"
+        elif in_flight >= self.limit:
+            reason = "saturated"
+        else:
+            reason = "hold"
+
+        if reason in ("error_rate", "llm_latency", "tool_latency"):
+            self.limit = max(self.floor, int(self.limit * self.decrease_factor))
+        elif reason == "saturated":
+            self.limit = min(self.ceiling, self.limit + self.increase_step)
+
+        decision = {
+            "time": round(time.time(), 3),
+            "limit_before": previous,
+            "limit": self.limit,
+            "ceiling": self.ceiling,
+            "in_flight": in_flight,
+            "reason": reason,
+            "requests": requests,
+            "error_rate": round(error_rate, 4),
+            "llm_p90_seconds": round(llm_p90, 3) if llm_p90 is not None else None,
+            "tool_p90_seconds": round(tool_p90, 3) if tool_p90 is not None else None,
+            "llm_baseline_p90_seconds": round(self.baseline_p90["llm"], 3) if "llm" in self.baseline_p90 else None,
+            "tool_baseline_p90_seconds": round(self.baseline_p90["tool"], 3) if "tool" in self.baseline_p90 else None,
+        }
+        if self.limit != previous:
+            print(f"[Concurrency] {previous} -> {self.limit} ({reason}, error_rate={decision['error_rate']}, "
+                  f"llm_p90_s={decision['llm_p90_seconds']}, tool_p90_s={decision['tool_p90_seconds']})")
+        if self.log_path:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(decision, ensure_ascii=False) + "\n")
+        return self.limit
+
+
+class AdaptiveConcurrency:
+    """Gate on in-flight questions whose size is driven by an `AIMDController`.
+
+    Thread mode: `start()` runs the controller on a daemon thread and questions
+    enter through `slot()`. Async mode: `astart()` runs it as a task on the event
+    loop and questions enter through `aslot()`.
+    """
+
+    def __init__(self, controller: AIMDController):
+        self.controller = controller
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._acond = None
+        self._stopped = threading.Event()
+        self._task = None
+
+    def _control_step(self):
+        self.controller.update(self.in_flight)
+        METRICS.set_gauge("concurrency_limit", self.controller.limit)
+
+    # thread mode
+    def start(self):
+        def loop():
+            while not self._stopped.wait(self.controller.interval):
+                with self._cond:
+                    self._control_step()
+                    self._cond.notify_all()
+        threading.Thread(target=loop, name="AdaptiveConcurrency", daemon=True).start()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < self.controller.limit)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    # async mode
+    async def astart(self):
+        self._acond = asyncio.Condition()
+
+        async def loop():
+            while True:
+                await asyncio.sleep(self.controller.interval)
+                async with self._acond:
+                    self._control_step()
+                    self._acond.notify_all()
+        self._task = asyncio.create_task(loop())
+
+    @asynccontextmanager
+    async def aslot(self):
+        async with self._acond:
+            await self._acond.wait_for(lambda: self.in_flight < self.controller.limit)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._acond:
+                self.in_flight -= 1
+                self._acond.notify_all()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
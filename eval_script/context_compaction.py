@@ -0,0 +1,127 @@
+import re
+from typing import Dict, List, Optional
+
+
+# Rough token estimate for the trigger; it only has to be monotonic in the history size.
+CHARS_PER_TOKEN = 4
+
+ELIDED_PREFIX = "[Earlier tool output elided to save context. Digest:]\n"
+
+
+def _tool_call_arguments(tool_call) -> str:
+    if isinstance(tool_call, dict):
+        return str(tool_call.get("function", tool_call).get("arguments", ""))
+    return str(getattr(getattr(tool_call, "function", None), "arguments", ""))
+
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    total = 0
+    for message in messages:
+        for key in ("content", "reasoning_content"):
+            value = message.get(key)
+            if isinstance(value, str):
+                total += len(value)
+        if message.get("reasoning_details"):
+            total += len(str(message["reasoning_details"]))
+        for tool_call in message.get("tool_calls") or []:
+            total += len(_tool_call_arguments(tool_call))
+    return total // CHARS_PER_TOKEN
+
+
+def digest_tool_output(content: str, max_chars: int = 600) -> str:
+    """Short digest of a search/visit result.
+
+    Visit results keep their header line and the `Summary:` section, search
+    results keep their numbered result titles; anything else keeps its head.
+    """
+    parts = content.split("\n=======\n")
+    budget = max(200, max_chars // len(parts))
+    digests = []
+    for part in parts:
+        if "Summary: \n" in part:
+            header = part.split("\n", 1)[0]
+            summary = part.split("Summary: \n", 1)[1].strip()
+            digest = f"{header}\nSummary: {summary}"
+        elif "## Web Results" in part:
+            header = part.split("\n", 1)[0]
+            titles = re.findall(r"^\d+\. \[.*?\]\(.*?\)", part, flags=re.MULTILINE)
+            digest = "\n".join([header] + titles)
+        else:
+            digest = part
+        if len(digest) > budget:
+            digest = digest[:budget] + " ..."
+        digests.append(digest)
+    return ELIDED_PREFIX + "\n=======\n".join(digests)
+
+
+class HistoryCompactor:
+    """Builds the message list sent to the LLM from the full agent history.
+
+    The agent keeps (and logs) the full history; a compactor only rewrites the
+    view passed to `_call_llm`, and only once the estimated size of the history
+    reaches `trigger_tokens`. Subclasses implement `compact`.
+    """
+    name = ""
+
+    def __init__(self, trigger_tokens: int = 64000):
+        self.trigger_tokens = trigger_tokens
+
+    def __call__(self, messages: List[Dict], token_stats: Optional[dict] = None) -> List[Dict]:
+        estimated = estimate_tokens(messages)
+        if estimated < self.trigger_tokens:
+            return messages
+        compacted = self.compact(messages)
+        if token_stats is not None and compacted is not messages:
+            token_stats["compacted_steps"] = token_stats.get("compacted_steps", 0) + 1
+            token_stats["compaction_saved_tokens"] = token_stats.get("compaction_saved_tokens", 0) + estimated - estimate_tokens(compacted)
+        return compacted
+
+    def compact(self, messages: List[Dict]) -> List[Dict]:
+        raise NotImplementedError
+
+
+class ToolOutputElider(HistoryCompactor):
+    """Replace tool outputs older than the last `keep_recent_steps` steps with digests
+    and clear the reasoning of those steps. The question prompt is never touched."""
+    name = "elide"
+
+    def __init__(self, trigger_tokens: int = 64000, keep_recent_steps: int = 3, digest_chars: int = 600):
+        super().__init__(trigger_tokens)
+        self.keep_recent_steps = keep_recent_steps
+        self.digest_chars = digest_chars
+
+    def compact(self, messages: List[Dict]) -> List[Dict]:
+        assistant_idx = [i for i, message in enumerate(messages) if message.get("role") == "assistant"]
+        if len(assistant_idx) <= self.keep_recent_steps:
+            return messages
+        cutoff = assistant_idx[-self.keep_recent_steps] if self.keep_recent_steps > 0 else len(messages)
+
+        compacted = [messages[0]]
+        for message in messages[1:cutoff]:
+            message = dict(message)
+            if message.get("role") == "tool":
+                content = message.get("content")
+                if isinstance(content, str) and len(content) > self.digest_chars and not content.startswith(ELIDED_PREFIX):
+                    message["content"] = digest_tool_output(content, self.digest_chars)
+            elif message.get("role") == "assistant":
+                # Keep the keys so providers that expect them still get a well-formed message.
+                if "reasoning_content" in message:
+                    message["reasoning_content"] = ""
+                if "reasoning_details" in message:
+                    message["reasoning_details"] = []
+            compacted.append(message)
+        compacted.extend(messages[cutoff:])
+        return compacted
+
+
+COMPACTORS = {
+    ToolOutputElider.name: ToolOutputElider,
+}
+
+
+def build_compactor(name: Optional[str], **kwargs) -> Optional[HistoryCompactor]:
+    if not name or name == "none":
+        return None
+    if name not in COMPACTORS:
+        raise ValueError(f"Unknown compaction strategy: {name}. Available: {list(COMPACTORS)}")
+    return COMPACTORS[name](**kwargs)
@@ -0,0 +1,230 @@
+import bisect
+import os
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Latency buckets in seconds, from a cache hit to a long thinking generation.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+# Longest window `recent_count` can answer; counters keep one bucket per second of it.
+RATE_HORIZON_SECONDS = 600
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra: Tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent observations for percentiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window: int = 2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float, now: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append((now, value))
+
+
+class SecondBuckets:
+    """Per-second sums of a counter over the last `horizon` seconds, in a ring.
+
+    Memory and lookup cost depend on the horizon only, not on the event rate.
+    """
+
+    def __init__(self, horizon: int = RATE_HORIZON_SECONDS):
+        self.seconds = [-1] * horizon
+        self.values = [0.0] * horizon
+
+    def add(self, n: float, now: float):
+        second = int(now)
+        i = second % len(self.seconds)
+        if self.seconds[i] != second:
+            self.seconds[i] = second
+            self.values[i] = 0.0
+        self.values[i] += n
+
+    def total(self, seconds: float, now: float) -> float:
+        """Sum over the current second and the `seconds - 1` before it."""
+        since = int(now) - min(int(seconds), len(self.seconds))
+        return sum(v for s, v in zip(self.seconds, self.values) if s > since)
+
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and latency histograms of a benchmark run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.gauges = {}
+        self.histograms: Dict[Tuple, Histogram] = {}
+        self._rates: Dict[Tuple, SecondBuckets] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, float, dict]]]] = []
+
+    def inc(self, name: str, n: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] += n
+            rate = self._rates.get(key)
+            if rate is None:
+                rate = self._rates[key] = SecondBuckets()
+            rate.add(n, time.time())
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value, time.time())
+
+    def recent_count(self, name: str, seconds: float, **labels) -> float:
+        """Sum of `inc(name)` over the last `seconds` (whole seconds, at most
+        RATE_HORIZON_SECONDS), across all labels unless given."""
+        now = time.time()
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(rate.total(seconds, now) for (key_name, key_labels), rate in self._rates.items()
+                       if key_name == name and wanted <= set(key_labels))
+
+    def recent_values(self, name: str, seconds: float, **labels) -> List[float]:
+        """Observations of histogram `name` over the last `seconds`, across all labels unless given."""
+        since = time.time() - seconds
+        wanted = set(labels.items())
+        with self._lock:
+            return [value
+                    for (key_name, key_labels), histogram in self.histograms.items()
+                    if key_name == name and wanted <= set(key_labels)
+                    for t, value in histogram.recent if t >= since]
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, float, dict]]]):
+        """Add a callable that yields `(name, value, labels)` gauges each time metrics are rendered."""
+        self._collectors.append(collector)
+
+    def render_prometheus(self, prefix: str = "gisa_") -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+        for collector in self._collectors:
+            try:
+                for name, value, labels in collector():
+                    gauges[(name, _label_key(labels))] = value
+            except Exception as e:
+                print(f"[Metrics] Collector {collector} failed: {e}")
+
+        lines = []
+        for kind, samples in (("counter", counters), ("gauge", gauges)):
+            by_name = {}
+            for (name, labels), value in samples.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name in sorted(by_name):
+                lines.append(f"# TYPE {prefix}{name} {kind}")
+                for labels, value in sorted(by_name[name]):
+                    lines.append(f"{prefix}{name}{_format_labels(labels)} {value}")
+
+        by_name = {}
+        for (name, labels), histogram in histograms.items():
+            by_name.setdefault(name, []).append((labels, histogram))
+        for name in sorted(by_name):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for labels, (buckets, counts, total, count) in sorted(by_name[name], key=lambda x: x[0]):
+                cumulative = 0
+                for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                    cumulative += n
+                    lines.append(f"{prefix}{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{prefix}{name}_sum{_format_labels(labels)} {round(total, 6)}")
+                lines.append(f"{prefix}{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, registry: Optional["MetricsRegistry"] = None) -> ThreadingHTTPServer:
+    """Serve `registry.render_prometheus()` on http://0.0.0.0:<port>/metrics from a daemon thread."""
+    registry = registry or METRICS
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            payload = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Metrics served at http://localhost:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_metrics_file(path: str, interval: float = 15.0, registry: Optional["MetricsRegistry"] = None) -> Callable[[], None]:
+    """Rewrite `path` with the Prometheus text every `interval` seconds.
+
+    The file is replaced atomically, so it can be tailed or read by a node_exporter
+    textfile collector. Returns a function that stops the writer after a final flush.
+    """
+    registry = registry or METRICS
+    stop = threading.Event()
+
+    def flush():
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(registry.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def loop():
+        while not stop.wait(interval):
+            flush()
+        flush()
+
+    thread = threading.Thread(target=loop, name="metrics-file", daemon=True)
+    thread.start()
+    print(f"Metrics written to {path} every {interval}s")
+
+    def close():
+        stop.set()
+        thread.join()
+    return close
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+METRICS = MetricsRegistry()
@@ -318,4 +318,20 @@ EXTRACTOR_PROMPT = """Please process the following webpage content and user goal
 3. **Summary Output for Summary**: Organize into a concise paragraph with logical flow, prioritizing clarity and judge the contribution of the information to the goal.
 
 **Final Output Format using JSON format has "rational", "evidence", "summary" feilds**
-"""
\ No newline at end of file
+"""
+
+REDUCE_PROMPT = """The following extracts were taken from consecutive parts of one long webpage, each for the same user goal. Merge them into one extraction:
+
+## **Extracts** 
+{chunk_extractions}
+
+## **User Goal**
+{goal}
+
+## **Task Guidelines**
+1. **Content Scanning for Rationale**: Identify which extracts contain information related to the user's goal and ignore the ones that do not
+2. **Key Extraction for Evidence**: Combine the evidence of the relevant extracts in page order, keep the **full original context** and never drop important information, remove only repetitions.
+3. **Summary Output for Summary**: Organize into a concise paragraph with logical flow, prioritizing clarity and judge the contribution of the information to the goal.
+
+**Final Output Format using JSON format has "rational", "evidence", "summary" feilds**
+"""
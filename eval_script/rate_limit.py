@@ -0,0 +1,174 @@
+import asyncio
+import email.utils
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from tracing import span
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking.
+
+    `reserve` debits the bucket immediately (the level may go negative) and returns
+    how long the caller has to wait for its share, so waiters are served in order
+    and the same bucket serves threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+
+class EndpointLimiter:
+    """Request and token budget of one endpoint, shared by every agent and tool."""
+
+    def __init__(self, name: str, requests_per_sec: Optional[float] = None, tokens_per_min: Optional[float] = None, burst: Optional[float] = None):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_sec, burst or max(1.0, requests_per_sec)) if requests_per_sec else None
+        self.token_bucket = TokenBucket(tokens_per_min / 60.0, tokens_per_min) if tokens_per_min else None
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.acquires = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.retry_after_events = 0
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.request_bucket:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket and tokens:
+                wait = max(wait, self.token_bucket.reserve(tokens, now))
+            self.acquires += 1
+            self.waiting += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def _done_waiting(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until a request (and `tokens` tokens) may be sent; returns the wait."""
+        wait = self._reserve(tokens)
+        try:
+            if wait > 0:
+                with span("rate_limit.wait", cat="retry", endpoint=self.name):
+                    time.sleep(wait)
+        finally:
+            self._done_waiting()
+        return wait
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        wait = self._reserve(tokens)
+        try:
+            if wait > 0:
+                with span("rate_limit.wait", cat="retry", endpoint=self.name):
+                    await asyncio.sleep(wait)
+        finally:
+            self._done_waiting()
+        return wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Charge (or refund) the difference once the real usage of a request is known."""
+        if self.token_bucket and actual_tokens != estimated_tokens:
+            with self._lock:
+                self.token_bucket.reserve(actual_tokens - estimated_tokens, time.monotonic())
+                self.token_bucket.level = min(self.token_bucket.capacity, self.token_bucket.level)
+
+    def penalize(self, retry_after: float):
+        """Hold every caller of this endpoint back for `retry_after` seconds."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.retry_after_events += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "acquires": self.acquires,
+                "in_queue": self.waiting,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "avg_wait_seconds": round(self.total_wait / self.acquires, 4) if self.acquires else 0.0,
+                "max_wait_seconds": round(self.max_wait, 3),
+                "retry_after_events": self.retry_after_events,
+            }
+
+
+# Endpoints are identified by host name, e.g. "google.serper.dev", "r.jina.ai" or the host of
+# an LLM base_url. Limits come from the RATE_LIMITS env var or `configure_rate_limits`, as JSON:
+# {"google.serper.dev": {"requests_per_sec": 5}, "openrouter.ai": {"requests_per_sec": 10, "tokens_per_min": 2000000}}
+# Endpoints without limits still get a limiter so that waits and Retry-After are tracked.
+_limits = json.loads(os.getenv("RATE_LIMITS", "{}"))
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def endpoint_name(url: str) -> str:
+    return urlparse(url).netloc or url
+
+
+def configure_rate_limits(limits: dict):
+    """Set per-endpoint limits; replaces the limiters of the listed endpoints."""
+    with _limiters_lock:
+        for name, limit in limits.items():
+            _limits[name] = limit
+            _limiters.pop(name, None)
+
+
+def get_limiter(endpoint: str) -> EndpointLimiter:
+    name = endpoint_name(endpoint)
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = EndpointLimiter(name, **_limits.get(name, {}))
+                _limiters[name] = limiter
+    return limiter
+
+
+def rate_limit_stats() -> dict:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds requested by a `Retry-After` header (delta-seconds or HTTP date)."""
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_from_error(error: Exception) -> Optional[float]:
+    """Retry-After of an HTTP error raised by openai/requests/httpx, if it is a 429/503."""
+    response = getattr(error, "response", None)
+    if response is None or getattr(response, "status_code", None) not in (429, 503):
+        return None
+    return parse_retry_after(getattr(response, "headers", None))
@@ -8,10 +8,34 @@ from typing import List, Dict, Any, Optional
 # from datetime import datetime
 import datetime
 import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from tools import Search, Visit
 from prompts import FC_REACT_AGENT_PROMPT, TOOLS_DEFINITION
-from utils import build_client, generate_response
+from context_compaction import HistoryCompactor, estimate_tokens
+from rate_limit import get_limiter, retry_after_from_error
+from metrics import METRICS
+from tracing import propagate, set_question, set_step, span
+from step_journal import StepJournal, serialize_tool_call
+from utils import get_client, get_async_client, generate_response, agenerate_response
+
+# Threads shared by every question that run the tool calls of a step concurrently (thread driver);
+# the minimum, `configure_tool_executor` grows it to the number of questions that run at once.
+TOOL_DISPATCH_WORKERS = int(os.getenv("TOOL_DISPATCH_WORKERS", 32))
+TOOL_CALLS_PER_QUESTION = int(os.getenv("TOOL_CALLS_PER_QUESTION", 4))
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_DISPATCH_WORKERS, thread_name_prefix="tool")
+
+
+def configure_tool_executor(concurrent_questions: int) -> int:
+    """Size the shared tool pool for `concurrent_questions` questions; call before the run starts."""
+    global _tool_executor
+    workers = max(TOOL_DISPATCH_WORKERS, concurrent_questions * TOOL_CALLS_PER_QUESTION)
+    _tool_executor.shutdown(wait=False)
+    _tool_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool")
+    return workers
+
 
 class ReActAgent:
     def __init__(
@@ -22,7 +46,11 @@ class ReActAgent:
         temperature: float = 0.7,
         max_tokens: int = 8192,
         max_running_steps: int = 30,
-        enable_thinking: bool = True
+        enable_thinking: bool = True,
+        compactor: Optional[HistoryCompactor] = None,
+        step_journal: bool = True,
+        stream: bool = False,
+        current_date: Optional[str] = None
     ):
         self.model_name = model_name
         self.api_base_url = api_base_url
@@ -31,14 +59,18 @@ class ReActAgent:
         self.max_tokens = max_tokens
         self.enable_thinking = enable_thinking
         self.max_running_steps = max_running_steps
+        self.compactor = compactor
+        self.step_journal = step_journal
+        self.stream = stream
 
-        self.current_date = str(datetime.date.today().strftime("%Y-%m-%d"))
+        # Part of every LLM request, so a replayed run has to use the date it was recorded with.
+        self.current_date = current_date or os.getenv("AGENT_CURRENT_DATE") or str(datetime.date.today().strftime("%Y-%m-%d"))
         self.tools = {"search": Search(), "visit": Visit()} 
         self.is_openrouter = 'openrouter' in self.api_base_url.lower()
 
 
-    def solve(self, question: str):
-        messages = [
+    def _init_messages(self, question: str):
+        return [
             {
                 "role": "user", 
                 "content": FC_REACT_AGENT_PROMPT.format(
@@ -48,48 +80,194 @@ class ReActAgent:
             }
         ]
 
-        token_stats = {
+    def _init_token_stats(self):
+        return {
             "total_input_tokens": 0, 
             "total_output_tokens": 0, 
             'tool_input_token_list': [],
             'tool_output_token_list': [],
             'tool_input_tokens': 0,
-            'tool_output_tokens': 0
+            'tool_output_tokens': 0,
+            'compacted_steps': 0,
+            'compaction_saved_tokens': 0
         }
+
+    def _journal(self, question_item: dict, output_dir: str) -> Optional[StepJournal]:
+        if not self.step_journal:
+            return None
+        return StepJournal(f"{output_dir}/_journal/{question_item['id']}.jsonl", question_item['question'], self.model_name)
+
+    def _restore(self, question: str, journal: Optional[StepJournal]):
+        """Messages, token stats, step, prediction and termination to start from.
+
+        Resumes after the last step recorded in `journal`, if an earlier run left one.
+        """
+        state = journal.load() if journal is not None else None
+        if state is None:
+            messages = self._init_messages(question)
+            if journal is not None:
+                journal.start(messages)
+            return messages, self._init_token_stats(), 0, "No answer found", "max_steps"
+
+        messages = state["messages"]
+        token_stats = self._init_token_stats()
         current_step = 0
         prediction = "No answer found"
         termination = "max_steps"
+        for record in state["steps"]:
+            messages.extend(record["messages"])
+            token_stats = record["token_stats"]
+            current_step = record["step"]
+            termination = record["termination"]
+            prediction = record["prediction"]
+        if state["steps"]:
+            print(f"[Journal] Resuming from step {current_step} ({journal.path})")
+        return messages, token_stats, current_step, prediction, termination
+
+    def _llm_view(self, messages, token_stats):
+        """Messages sent to the LLM; the full history stays in `messages`."""
+        if self.compactor is None:
+            return messages
+        return self.compactor(messages, token_stats)
+
+    def _build_step_message(self, message):
+        step_message = {
+            "role": "assistant",
+            "tool_calls": message.tool_calls,
+            "content": message.content,
+        }
+
+        if self.enable_thinking:
+            if self.is_openrouter:
+                step_message['reasoning_details'] = getattr(message, 'reasoning_details', None)
+            else:
+                step_message['reasoning_content'] = message.reasoning_content
+        return step_message
+
+    def _record_tool_tokens(self, token_stats, input_tokens, output_tokens):
+        METRICS.inc("tool_input_tokens_total", input_tokens)
+        METRICS.inc("tool_output_tokens_total", output_tokens)
+        token_stats['total_input_tokens'] += input_tokens
+        token_stats['total_output_tokens'] += output_tokens
+        token_stats['tool_input_tokens'] += input_tokens
+        token_stats['tool_output_tokens'] += output_tokens
+        token_stats['tool_input_token_list'].append(input_tokens)
+        token_stats['tool_output_token_list'].append(output_tokens)
+
+    def _can_call_tools(self, current_step):
+        return (self.max_running_steps - current_step) > 1
+
+    @staticmethod
+    def _tool_call_key(index, tool):
+        return (index, tool.function.name, tool.function.arguments)
+
+    def _dispatcher(self, dispatched, current_step, start):
+        """`on_tool_call` hook for a streamed LLM call: starts each complete tool call with `start(tool)`
+        and keeps the pending result in `dispatched`, or None when tools are not dispatched early."""
+        if not self.stream or not self._can_call_tools(current_step):
+            return None
+
+        def on_tool_call(index, tool):
+            # A retried LLM call may repeat a tool call that is already running; it is only started once.
+            key = self._tool_call_key(index, tool)
+            if key not in dispatched:
+                METRICS.inc("tool_calls_early_dispatched_total", tool=tool.function.name)
+                dispatched[key] = start(tool)
+        return on_tool_call
+
+    def _start_tool_calls(self, tool_calls, dispatched, start):
+        """Start every tool call of a step that is not running yet, so that they run concurrently."""
+        for index, tool in enumerate(tool_calls):
+            key = self._tool_call_key(index, tool)
+            if key not in dispatched:
+                dispatched[key] = start(tool)
+
+    def _call_tool(self, tool):
+        tool_args = json_repair.loads(tool.function.arguments)
+        return self._run_tool(tool.function.name, tool_args)
+
+    async def _acall_tool(self, tool):
+        tool_args = json_repair.loads(tool.function.arguments)
+        return await self._arun_tool(tool.function.name, tool_args)
+
+    def _run_tool(self, tool_name, tool_args):
+        start_time = time.time()
+        try:
+            with span(f"tool.{tool_name}", cat="tool"):
+                return self.tools[tool_name].call(tool_args)
+        except Exception:
+            METRICS.inc("tool_errors_total", tool=tool_name)
+            raise
+        finally:
+            METRICS.observe("tool_latency_seconds", time.time() - start_time, tool=tool_name)
+            METRICS.inc("tool_calls_total", tool=tool_name)
+
+    async def _arun_tool(self, tool_name, tool_args):
+        start_time = time.time()
+        try:
+            with span(f"tool.{tool_name}", cat="tool"):
+                return await self.tools[tool_name].acall(tool_args)
+        except Exception:
+            METRICS.inc("tool_errors_total", tool=tool_name)
+            raise
+        finally:
+            METRICS.observe("tool_latency_seconds", time.time() - start_time, tool=tool_name)
+            METRICS.inc("tool_calls_total", tool=tool_name)
 
-        while current_step < self.max_running_steps:
+    def _build_result(self, question, prediction, messages, current_step, termination, token_stats):
+        cleaned_messages = self.get_clean_messages(messages)
+
+        return {
+            "question": question,
+            "prediction": prediction,
+            "messages": cleaned_messages,
+            "steps_taken": current_step,
+            "termination_reason": termination,
+            "token_stats": token_stats
+        }
+
+    def _steps(self, question: str, journal: Optional[StepJournal], start_tool):
+        """The agent loop without its I/O, shared by `solve` and `asolve`.
+
+        Yields `("llm", kwargs)` for an LLM call, `("tool", pending)` for the result of
+        a tool call started with `start_tool(tool)` and `("io", fn)` for journal I/O; the
+        driver sends back the outcome, or throws in the exception it raised. Returns the
+        result of the question.
+        """
+        messages, token_stats, current_step, prediction, termination = yield "io", functools.partial(self._restore, question, journal)
+
+        while termination != 'answer' and current_step < self.max_running_steps:
             print(f"Step {current_step} of {self.max_running_steps}")
             current_step += 1
-            message, i_tok, o_tok = self._call_llm(
-                messages, 
-                tools=TOOLS_DEFINITION, 
-                enable_thinking=self.enable_thinking
-            )
+            set_step(current_step)
+            METRICS.inc("agent_steps_total")
+            dispatched = {}
+            try:
+                message, i_tok, o_tok = yield "llm", dict(
+                    msgs=self._llm_view(messages, token_stats), 
+                    tools=TOOLS_DEFINITION, 
+                    enable_thinking=self.enable_thinking,
+                    on_tool_call=self._dispatcher(dispatched, current_step, start_tool)
+                )
+            except BaseException:
+                # Tool calls dispatched while the response streamed are not waited for.
+                for pending in dispatched.values():
+                    pending.cancel()
+                raise
             base_content = message.content
             tool_calls = message.tool_calls
-
-            step_message = {
-                "role": "assistant",
-                "tool_calls": tool_calls,
-                "content": base_content,
-            }
-
-            if self.enable_thinking:
-                if self.is_openrouter:
-                    step_message['reasoning_details'] = message.reasoning_details
-                else:
-                    step_message['reasoning_content'] = message.reasoning_content
-            messages.append(step_message)
+            step_start = len(messages)
+            messages.append(self._build_step_message(message))
 
             token_stats["total_input_tokens"] += i_tok
             token_stats["total_output_tokens"] += o_tok
 
             if tool_calls:
-                for tool in tool_calls:
-                    if (self.max_running_steps - current_step) <= 1:
+                if self._can_call_tools(current_step):
+                    # The tool calls of a step run concurrently; their messages are still added in order.
+                    self._start_tool_calls(tool_calls, dispatched, start_tool)
+                for index, tool in enumerate(tool_calls):
+                    if not self._can_call_tools(current_step):
                         tool = tool_calls[0]
                         result = 'Sorry, the number of llm calls exceeds the limit. You have no chance to call tools. Please directly give the final answer.'
                         messages.append({
@@ -101,15 +279,9 @@ class ReActAgent:
                     try:
                         tool_name = tool.function.name
                         tool_args = tool.function.arguments
-                        tool_args = json_repair.loads(tool_args)
-                        result, input_tokens, output_tokens = self.tools[tool_name].call(tool_args)
-
-                        token_stats['total_input_tokens'] += input_tokens
-                        token_stats['total_output_tokens'] += output_tokens
-                        token_stats['tool_input_tokens'] += input_tokens
-                        token_stats['tool_output_tokens'] += output_tokens
-                        token_stats['tool_input_token_list'].append(input_tokens)
-                        token_stats['tool_output_token_list'].append(output_tokens)
+                        pending = dispatched.pop(self._tool_call_key(index, tool))
+                        result, input_tokens, output_tokens = yield "tool", pending
+                        self._record_tool_tokens(token_stats, input_tokens, output_tokens)
 
                         messages.append({
                             "role": "tool",
@@ -129,18 +301,55 @@ class ReActAgent:
             else:
                 termination = 'answer'
                 prediction = base_content
-                break
-        
-        cleaned_messages = self.get_clean_messages(messages)
+            for pending in dispatched.values():
+                # Dispatched by a failed attempt of the LLM call and not repeated by the one that succeeded.
+                pending.cancel()
 
-        return {
-            "question": question,
-            "prediction": prediction,
-            "messages": cleaned_messages,
-            "steps_taken": current_step,
-            "termination_reason": termination,
-            "token_stats": token_stats
-        }
+            if journal is not None:
+                yield "io", functools.partial(journal.record_step, current_step, messages[step_start:], token_stats, termination, prediction)
+
+        return self._build_result(question, prediction, messages, current_step, termination, token_stats)
+
+    def solve(self, question: str, journal: Optional[StepJournal] = None):
+        start_tool = lambda tool: _tool_executor.submit(propagate(self._call_tool), tool)
+        steps = self._steps(question, journal, start_tool)
+        outcome, error = None, None
+        while True:
+            try:
+                kind, request = steps.throw(error) if error is not None else steps.send(outcome)
+            except StopIteration as stop:
+                return stop.value
+            outcome, error = None, None
+            try:
+                if kind == "llm":
+                    outcome = self._call_llm(**request)
+                elif kind == "tool":
+                    outcome = request.result()
+                else:
+                    outcome = request()
+            except BaseException as e:
+                error = e
+
+    async def asolve(self, question: str, journal: Optional[StepJournal] = None):
+        start_tool = lambda tool: asyncio.ensure_future(self._acall_tool(tool))
+        steps = self._steps(question, journal, start_tool)
+        outcome, error = None, None
+        while True:
+            try:
+                kind, request = steps.throw(error) if error is not None else steps.send(outcome)
+            except StopIteration as stop:
+                return stop.value
+            outcome, error = None, None
+            try:
+                if kind == "llm":
+                    outcome = await self._acall_llm(**request)
+                elif kind == "tool":
+                    outcome = await request
+                else:
+                    # Journal writes are fsynced; they do not hold up the other questions on the loop.
+                    outcome = await asyncio.to_thread(request)
+            except BaseException as e:
+                error = e
     
 
     def get_clean_messages(self,messages):
@@ -148,13 +357,14 @@ class ReActAgent:
         for message in messages:
             clean_msg = message.copy()
             if "tool_calls" in clean_msg and clean_msg["tool_calls"]:
+                # Tool calls are SDK objects, or dicts once restored from a step journal.
                 clean_msg["tool_calls"] = [
                     {
-                        "name": tool_call.function.name,
-                        "arguments": tool_call.function.arguments,
-                        "id": getattr(tool_call, 'id', None) 
+                        "name": tool_call["function"]["name"],
+                        "arguments": tool_call["function"]["arguments"],
+                        "id": tool_call.get("id")
                     }
-                    for tool_call in clean_msg["tool_calls"]
+                    for tool_call in map(serialize_tool_call, clean_msg["tool_calls"])
                 ]
             
             for k in list(clean_msg.keys()):
@@ -165,36 +375,95 @@ class ReActAgent:
             final_messages.append(clean_msg)
         return final_messages
 
-    def _call_llm(self, msgs, tools=None, enable_thinking=False, max_tries=5):
-        client = build_client(model_name=self.model_name, api_key=self.api_key, base_url=self.api_base_url)
-        base_sleep_time = 1 
+    def _llm_kwargs(self, client, msgs, tools=None, enable_thinking=False, on_tool_call=None):
+        basic_kwargs = {
+            'client': client,
+            'messages': msgs,
+            'model': self.model_name,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'tools': tools,
+            'enable_thinking': enable_thinking,
+        }
+        if self.stream:
+            basic_kwargs['stream'] = True
+            basic_kwargs['on_tool_call'] = on_tool_call
+        if 'kimi' in self.model_name.lower():
+            basic_kwargs['presence_penalty'] = 0.0
+            basic_kwargs['temperature'] = 1.0
+        elif 'gpt' in self.model_name.lower():
+            basic_kwargs['parallel_tool_calls'] = False
+        return basic_kwargs
+
+    def _record_llm_response(self, limiter, estimated_tokens, start_time, input_tokens, output_tokens):
+        METRICS.observe("llm_latency_seconds", time.time() - start_time, endpoint=limiter.name)
+        METRICS.inc("llm_requests_total", endpoint=limiter.name)
+        METRICS.inc("llm_input_tokens_total", input_tokens, endpoint=limiter.name)
+        METRICS.inc("llm_output_tokens_total", output_tokens, endpoint=limiter.name)
+        limiter.settle(estimated_tokens, input_tokens + output_tokens)
+
+    def _llm_failure(self, limiter, error, attempt, max_tries, base_sleep_time=1):
+        """Records a failed LLM attempt and returns the seconds to back off before the next one (0 for none)."""
+        print(f"Error: Attempt {attempt + 1} failed: {error}")
+        METRICS.inc("llm_requests_total", endpoint=limiter.name)
+        METRICS.inc("llm_errors_total", endpoint=limiter.name)
+        retry_after = retry_after_from_error(error)
+        if attempt < max_tries - 1:
+            METRICS.inc("llm_retries_total", endpoint=limiter.name)
+
+        if retry_after is not None:
+            # The limiter holds every caller of this endpoint back until Retry-After has passed.
+            limiter.penalize(retry_after)
+        elif attempt < max_tries - 1:
+            return min(base_sleep_time * (2 ** attempt), 30)
+        return 0
+
+    def _call_llm(self, msgs, tools=None, enable_thinking=False, max_tries=5, on_tool_call=None):
+        client = get_client(model_name=self.model_name, api_key=self.api_key, base_url=self.api_base_url)
+        limiter = get_limiter(self.api_base_url)
+        estimated_tokens = estimate_tokens(msgs) + self.max_tokens
         for attempt in range(max_tries):
-            basic_kwargs = {
-                'client': client,
-                'messages': msgs,
-                'model': self.model_name,
-                'max_tokens': self.max_tokens,
-                'temperature': self.temperature,
-                'tools': tools,
-                'enable_thinking': enable_thinking,
-            }
-            if 'kimi' in self.model_name.lower():
-                basic_kwargs['presence_penalty'] = 0.0
-                basic_kwargs['temperature'] = 1.0
-            elif 'gpt' in self.model_name.lower():
-                basic_kwargs['parallel_tool_calls'] = False
-            
+            basic_kwargs = self._llm_kwargs(client, msgs, tools=tools, enable_thinking=enable_thinking, on_tool_call=on_tool_call)
             try:
-                messages, input_tokens, output_tokens = generate_response(**basic_kwargs)
+                limiter.acquire(estimated_tokens)
+                start_time = time.time()
+                with span("llm.generate", cat="llm", model=self.model_name, attempt=attempt + 1):
+                    messages, input_tokens, output_tokens = generate_response(**basic_kwargs)
+                self._record_llm_response(limiter, estimated_tokens, start_time, input_tokens, output_tokens)
                 return messages, input_tokens, output_tokens
             except Exception as e:
-                print(f"Error: Attempt {attempt + 1} failed: {e}")
+                backoff = self._llm_failure(limiter, e, attempt, max_tries)
+            if backoff:
+                with span("llm.backoff", cat="retry", seconds=backoff):
+                    time.sleep(backoff)
+        
+        raise Exception("LLM server error!")
 
-            if attempt < max_tries - 1:
-                time.sleep(min(base_sleep_time * (2 ** attempt), 30))
+    async def _acall_llm(self, msgs, tools=None, enable_thinking=False, max_tries=5, on_tool_call=None):
+        client = get_async_client(model_name=self.model_name, api_key=self.api_key, base_url=self.api_base_url)
+        limiter = get_limiter(self.api_base_url)
+        estimated_tokens = estimate_tokens(msgs) + self.max_tokens
+        for attempt in range(max_tries):
+            basic_kwargs = self._llm_kwargs(client, msgs, tools=tools, enable_thinking=enable_thinking, on_tool_call=on_tool_call)
+            try:
+                await limiter.aacquire(estimated_tokens)
+                start_time = time.time()
+                with span("llm.generate", cat="llm", model=self.model_name, attempt=attempt + 1):
+                    messages, input_tokens, output_tokens = await agenerate_response(**basic_kwargs)
+                self._record_llm_response(limiter, estimated_tokens, start_time, input_tokens, output_tokens)
+                return messages, input_tokens, output_tokens
+            except Exception as e:
+                backoff = self._llm_failure(limiter, e, attempt, max_tries)
+            if backoff:
+                with span("llm.backoff", cat="retry", seconds=backoff):
+                    await asyncio.sleep(backoff)
         
         raise Exception("LLM server error!")
 
+    def _load_result(self, filename: str) -> Dict:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
     def _save_log(self, data: Dict, output_dir: str, idx: int):
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -202,22 +471,59 @@ class ReActAgent:
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=4)
 
+    def _finalize_result(self, result_data: Dict, question_item: dict, total_time: float, output_dir: str):
+        idx = question_item['id']
+        result_data["idx"] = idx
+        result_data['question_item'] = question_item
+        result_data["total_time_seconds"] = total_time
+        result_data["agent_type"] = self.__class__.__name__
+        result_data["model_name"] = self.model_name
+
+        self._save_log(result_data, output_dir, idx)
+        return result_data
+
     def run(self, question_item: dict, output_dir: str):
         idx = question_item['id']
         filename = f"{output_dir}/{idx}.json"
         if os.path.exists(filename):
-            return json.load(open(filename, 'r', encoding='utf-8'))
+            return self._load_result(filename)
 
         start_time = time.time()
-        
-        result_data = self.solve(question_item['question'])
+        set_question(idx)
+        journal = self._journal(question_item, output_dir)
+        METRICS.add_gauge("questions_in_flight", 1)
+        try:
+            with span("question", cat="agent"):
+                result_data = self.solve(question_item['question'], journal)
+        finally:
+            METRICS.add_gauge("questions_in_flight", -1)
+        METRICS.inc("questions_completed_total", termination=result_data["termination_reason"])
         
         total_time = time.time() - start_time
-        result_data["idx"] = idx
-        result_data['question_item'] = question_item
-        result_data["total_time_seconds"] = total_time
-        result_data["agent_type"] = self.__class__.__name__
-        result_data["model_name"] = self.model_name
+        result_data = self._finalize_result(result_data, question_item, total_time, output_dir)
+        if journal is not None:
+            journal.remove()
+        return result_data
 
-        self._save_log(result_data, output_dir, idx)
+    async def arun(self, question_item: dict, output_dir: str):
+        idx = question_item['id']
+        filename = f"{output_dir}/{idx}.json"
+        if os.path.exists(filename):
+            return await asyncio.to_thread(self._load_result, filename)
+
+        start_time = time.time()
+        set_question(idx)
+        journal = self._journal(question_item, output_dir)
+        METRICS.add_gauge("questions_in_flight", 1)
+        try:
+            with span("question", cat="agent"):
+                result_data = await self.asolve(question_item['question'], journal)
+        finally:
+            METRICS.add_gauge("questions_in_flight", -1)
+        METRICS.inc("questions_completed_total", termination=result_data["termination_reason"])
+        
+        total_time = time.time() - start_time
+        result_data = await asyncio.to_thread(self._finalize_result, result_data, question_item, total_time, output_dir)
+        if journal is not None:
+            await asyncio.to_thread(journal.remove)
         return result_data
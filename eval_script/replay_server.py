@@ -0,0 +1,343 @@
+"""Local stand-in for the Serper, Jina and OpenAI-compatible LLM endpoints.
+
+Every route listens on its own port. In `record` mode a route proxies to its
+upstream and appends each exchange to a JSONL store. In `replay` mode it
+answers from that store, after a configurable latency and with injected errors,
+so `run_benchmark.py` can be load-tested without touching the live services.
+
+    python replay_server.py record --store exchanges.jsonl --route llm:8803:https://openrouter.ai/api/v1
+    python replay_server.py replay --store exchanges.jsonl --profile '{"llm": {"latency": {"dist": "lognormal", "median": 2.0, "sigma": 0.5}, "error_rate": 0.01}}'
+
+Point the harness at it with SERPER_BASE_URL=http://127.0.0.1:8801,
+JINA_BASE_URL=http://127.0.0.1:8802 and --base_url / SUMMARY_API_BASE_URL set
+to the LLM routes. Requests are matched on route, method, path and the
+canonical JSON body, so a replayed run with the same inputs sends the same
+requests and gets the same answers.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+# name -> (port, upstream); override or add routes with --route NAME:PORT[:UPSTREAM]
+DEFAULT_ROUTES = {
+    "serper": (8801, "https://google.serper.dev"),
+    "jina": (8802, "https://r.jina.ai"),
+    "llm": (8803, None),
+}
+
+# Replayed exchanges wait as long as they took when recorded, and never fail.
+DEFAULT_PROFILE = {"latency": {"dist": "recorded", "scale": 1.0}, "error_rate": 0.0, "error_status": 503, "retry_after": 1}
+
+# The agent prompt carries the date of the run. It is left out of the key, so a recording
+# replays on any later day; the recorded date is kept with each exchange.
+_CURRENT_DATE_RE = re.compile(r"Current date: (\d{4}-\d{2}-\d{2})")
+
+# Hop-by-hop and client-specific headers that are not forwarded upstream.
+_SKIP_HEADERS = {"host", "content-length", "accept-encoding", "connection", "keep-alive", "transfer-encoding"}
+
+
+def current_date(body: bytes) -> Optional[str]:
+    """Date of the agent prompt in a request body, if it has one."""
+    match = _CURRENT_DATE_RE.search(body.decode("utf-8", errors="replace")) if body else None
+    return match.group(1) if match else None
+
+
+def exchange_key(route: str, method: str, path: str, body: bytes) -> str:
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+        body = _CURRENT_DATE_RE.sub("Current date: *", body.decode("utf-8", errors="surrogateescape")).encode("utf-8", errors="surrogateescape")
+    digest = hashlib.sha256()
+    for part in (route.encode("utf-8"), method.encode("utf-8"), path.encode("utf-8"), body or b""):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ExchangeStore:
+    """Append-only JSONL file of recorded exchanges, indexed by `exchange_key`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exchanges = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.exchanges.setdefault(entry["key"], []).append(entry)
+            print(f"[Replay] Loaded {sum(len(v) for v in self.exchanges.values())} exchanges from {path}")
+            dates = self.current_dates()
+            if dates:
+                print(f"[Replay] Recorded with current date {', '.join(dates)}; pass --current_date {dates[-1]} "
+                      f"to run_benchmark.py to replay the recorded prompts unchanged")
+
+    def current_dates(self):
+        return sorted({e["current_date"] for entries in self.exchanges.values() for e in entries if e.get("current_date")})
+
+    def add(self, entry: dict):
+        with self._lock:
+            self.exchanges.setdefault(entry["key"], []).append(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """First successful recording of `key`, so a retried request replays its final answer."""
+        entries = self.exchanges.get(key)
+        if not entries:
+            return None
+        return next((e for e in entries if e["status"] < 400), entries[0])
+
+
+def sample_latency(spec: dict, recorded: float, rng: random.Random) -> float:
+    dist = spec.get("dist", "recorded")
+    if dist == "none":
+        return 0.0
+    if dist == "recorded":
+        return recorded * spec.get("scale", 1.0)
+    if dist == "fixed":
+        return spec["value"]
+    if dist == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    if dist == "lognormal":
+        return rng.lognormvariate(math.log(spec["median"]), spec.get("sigma", 0.5))
+    raise ValueError(f"Unknown latency distribution: {dist}")
+
+
+class Route:
+    def __init__(self, name: str, port: int, upstream: Optional[str], profile: dict, seed: int = 0):
+        self.name = name
+        self.port = port
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.profile = {**DEFAULT_PROFILE, **profile}
+        self.rng = random.Random(f"{seed}:{name}")
+        self.rng_lock = threading.Lock()
+
+    def draw(self, recorded_latency: float):
+        """(latency, inject_error) of one replayed request."""
+        with self.rng_lock:
+            latency = sample_latency(self.profile["latency"], recorded_latency, self.rng)
+            inject_error = self.rng.random() < self.profile["error_rate"]
+        return max(0.0, latency), inject_error
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Backlog for hundreds of harness connections opening at once.
+    request_queue_size = 1024
+
+
+class StandInServer:
+    def __init__(self, mode: str, store: ExchangeStore, routes):
+        self.mode = mode
+        self.store = store
+        self.routes = routes
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._servers = []
+
+    def count(self, route: str, event: str):
+        with self._stats_lock:
+            self.stats[(route, event)] += 1
+
+    def stats_dict(self) -> dict:
+        with self._stats_lock:
+            report = {}
+            for (route, event), n in sorted(self.stats.items()):
+                report.setdefault(route, {})[event] = n
+            return report
+
+    def record(self, route: Route, method: str, path: str, headers: dict, body: bytes):
+        request = urllib.request.Request(
+            route.upstream + path,
+            data=body or None,
+            method=method,
+            headers={k: v for k, v in headers.items() if k.lower() not in _SKIP_HEADERS}
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                status, response_headers, payload = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            status, response_headers, payload = e.code, e.headers, e.read()
+        latency = time.perf_counter() - start
+
+        entry = {
+            "key": exchange_key(route.name, method, path, body),
+            "route": route.name,
+            "method": method,
+            "path": path,
+            "status": status,
+            "headers": {k: response_headers[k] for k in ("Content-Type", "Content-Encoding", "Retry-After") if response_headers.get(k)},
+            "latency": round(latency, 4),
+            "time": round(time.time(), 3),
+        }
+        if current_date(body):
+            entry["current_date"] = current_date(body)
+        try:
+            entry["body"] = payload.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(payload).decode("ascii")
+        self.store.add(entry)
+        self.count(route.name, "recorded")
+        return status, entry["headers"], payload
+
+    def _lookup_batch(self, route: Route, method: str, path: str, body: bytes) -> Optional[dict]:
+        """Answer a batched request (a JSON array body, as Serper accepts) from the recordings of its
+        items, so stores recorded one query at a time can replay batched clients too."""
+        try:
+            items = json.loads(body) if body else None
+        except ValueError:
+            return None
+        if not isinstance(items, list) or not items:
+            return None
+        entries = []
+        for item in items:
+            entry = self.store.lookup(exchange_key(route.name, method, path, json.dumps(item).encode("utf-8")))
+            if entry is None or entry["status"] >= 400 or "body" not in entry:
+                return None
+            entries.append(entry)
+        return {
+            "status": 200,
+            "headers": {"Content-Type": "application/json"},
+            "latency": max(e["latency"] for e in entries),
+            "body": "[" + ",".join(e["body"] for e in entries) + "]",
+        }
+
+    def replay(self, route: Route, method: str, path: str, body: bytes):
+        entry = self.store.lookup(exchange_key(route.name, method, path, body))
+        if entry is None:
+            entry = self._lookup_batch(route, method, path, body)
+        latency, inject_error = route.draw(entry["latency"] if entry else 0.0)
+        if latency:
+            time.sleep(latency)
+
+        if inject_error:
+            self.count(route.name, "injected_errors")
+            status = route.profile["error_status"]
+            headers = {"Content-Type": "application/json"}
+            if status in (429, 503) and route.profile.get("retry_after") is not None:
+                headers["Retry-After"] = str(route.profile["retry_after"])
+            payload = json.dumps({"error": {"message": "Error injected by replay_server", "type": "replay_error"}})
+            return status, headers, payload.encode("utf-8")
+        if entry is None:
+            self.count(route.name, "misses")
+            print(f"[Replay] Miss on {route.name}: {method} {path[:120]}")
+            payload = json.dumps({"error": {"message": "No recorded exchange for this request", "type": "replay_miss"}})
+            return 404, {"Content-Type": "application/json"}, payload.encode("utf-8")
+
+        self.count(route.name, "hits")
+        if "body_b64" in entry:
+            payload = base64.b64decode(entry["body_b64"])
+        else:
+            payload = entry["body"].encode("utf-8")
+        return entry["status"], entry["headers"], payload
+
+    def handler(self, route: Route):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path == "/_replay_stats":
+                    status, headers, payload = 200, {"Content-Type": "application/json"}, json.dumps(server.stats_dict()).encode("utf-8")
+                else:
+                    server.count(route.name, "requests")
+                    try:
+                        if server.mode == "record":
+                            status, headers, payload = server.record(route, self.command, self.path, dict(self.headers), body)
+                        else:
+                            status, headers, payload = server.replay(route, self.command, self.path, body)
+                    except Exception as e:
+                        server.count(route.name, "upstream_errors")
+                        print(f"[Replay] {route.name}: {self.command} {self.path[:120]} failed: {e}")
+                        status, headers, payload = 502, {"Content-Type": "text/plain"}, str(e).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _handle
+            do_POST = _handle
+
+        return Handler
+
+    def serve(self):
+        for route in self.routes:
+            httpd = _HTTPServer(("127.0.0.1", route.port), self.handler(route))
+            route.port = httpd.server_address[1]
+            self._servers.append(httpd)
+            threading.Thread(target=httpd.serve_forever, name=f"replay-{route.name}", daemon=True).start()
+            target = route.upstream if self.mode == "record" else self.store.path
+            print(f"[Replay] {self.mode} {route.name} on http://127.0.0.1:{route.port} <- {target}")
+
+    def shutdown(self):
+        for httpd in self._servers:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+def parse_routes(specs, mode: str, profiles: dict, seed: int):
+    routes = dict(DEFAULT_ROUTES)
+    for spec in specs or []:
+        parts = spec.split(":", 2)
+        name, port = parts[0], int(parts[1])
+        routes[name] = (port, parts[2] if len(parts) > 2 else routes.get(name, (None, None))[1])
+    result = []
+    for name, (port, upstream) in routes.items():
+        if mode == "record" and not upstream:
+            print(f"[Replay] Skipping route {name}: no upstream to record from")
+            continue
+        result.append(Route(name, port, upstream, profiles.get(name, profiles.get("*", {})), seed))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for Serper, Jina and LLM endpoints")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--store", type=str, default="exchanges.jsonl", help="JSONL file of recorded exchanges")
+    parser.add_argument("--route", action="append", default=[], help="NAME:PORT[:UPSTREAM], e.g. llm:8803:https://openrouter.ai/api/v1")
+    parser.add_argument("--profile", type=str, default="", help='per-route latency/error profile as JSON or a JSON file; "*" applies to every route')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    profiles = {}
+    if args.profile:
+        if os.path.exists(args.profile):
+            with open(args.profile, "r", encoding="utf-8") as f:
+                profiles = json.load(f)
+        else:
+            profiles = json.loads(args.profile)
+
+    server = StandInServer(args.mode, ExchangeStore(args.store), parse_routes(args.route, args.mode, profiles, args.seed))
+    server.serve()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    print(json.dumps(server.stats_dict(), indent=4))
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+
+# Fields of a result copied into the index line; the full result only lives in the JSONL report.
+INDEX_FIELDS = ("termination_reason", "steps_taken", "total_time_seconds")
+
+
+class StreamingReport:
+    """Crash-safe report of a benchmark run, written as questions finish.
+
+    Every result is appended to `_report_all.jsonl` as one line, and a compact
+    line with its id, byte offset, outcome and token usage is appended to
+    `_report_index.jsonl`. Both are single O_APPEND writes, so an interrupted run
+    keeps every finished result and at most a torn last line, which is dropped
+    when the report is reopened. `finalize` builds the sorted `_report_all.json`
+    from the JSONL one result at a time.
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, "_report_all.jsonl")
+        self.index_path = os.path.join(output_dir, "_report_index.jsonl")
+        self.final_path = os.path.join(output_dir, "_report_all.json")
+        self._lock = threading.Lock()
+        self.index: Dict = {}
+        self._size = 0
+        self._load()
+
+    @staticmethod
+    def _index_entry(result: dict, offset: int, length: int) -> dict:
+        entry = {"idx": result.get("idx"), "offset": offset, "length": length}
+        for field in INDEX_FIELDS:
+            entry[field] = result.get(field)
+        token_stats = result.get("token_stats") or {}
+        entry["total_input_tokens"] = token_stats.get("total_input_tokens")
+        entry["total_output_tokens"] = token_stats.get("total_output_tokens")
+        return entry
+
+    @staticmethod
+    def _append_bytes(path: str, data: bytes):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _load(self):
+        """Pick up the report of an earlier, possibly interrupted, run in the same directory."""
+        if not os.path.exists(self.path):
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+
+        size = os.path.getsize(self.path)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if entry["offset"] + entry["length"] > size:
+                        break
+                    self.index[entry["idx"]] = entry
+        indexed_end = max((e["offset"] + e["length"] for e in self.index.values()), default=0)
+
+        # Results written after the last index line (a crash between the two appends) are indexed
+        # again by scanning the tail of the JSONL; a torn last result is cut off.
+        valid_end = indexed_end
+        new_entries = []
+        with open(self.path, "rb") as f:
+            f.seek(indexed_end)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    break
+                new_entries.append(self._index_entry(result, valid_end, len(line)))
+                valid_end += len(line)
+        if valid_end < size:
+            os.truncate(self.path, valid_end)
+        self._size = valid_end
+
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            for entry in list(self.index.values()) + new_entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        for entry in new_entries:
+            self.index[entry["idx"]] = entry
+        if self.index:
+            print(f"[Report] Resuming report with {len(self.index)} finished questions")
+
+    def append(self, result: dict) -> Optional[dict]:
+        """Add a finished question; returns its index entry, or None if it is already in the report."""
+        data = (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if result.get("idx") in self.index:
+                return None
+            entry = self._index_entry(result, self._size, len(data))
+            self._append_bytes(self.path, data)
+            self._size += len(data)
+            self._append_bytes(self.index_path, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.index[entry["idx"]] = entry
+        return entry
+
+    def __len__(self):
+        return len(self.index)
+
+    def finalize(self) -> str:
+        """Write `_report_all.json` sorted by question id, reading one result at a time."""
+        with self._lock:
+            entries = sorted(self.index.values(), key=lambda e: e["idx"])
+        tmp_path = f"{self.final_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            if not entries:
+                out.write("[]")
+            else:
+                out.write("[\n")
+                with open(self.path, "rb") as f:
+                    for i, entry in enumerate(entries):
+                        f.seek(entry["offset"])
+                        result = json.loads(f.read(entry["length"]))
+                        text = json.dumps(result, ensure_ascii=False, indent=4)
+                        # Same layout as json.dump(results, indent=4) of the whole list.
+                        out.write("    " + text.replace("\n", "\n    "))
+                        out.write(",\n" if i < len(entries) - 1 else "\n")
+                out.write("]")
+        os.replace(tmp_path, self.final_path)
+        return self.final_path
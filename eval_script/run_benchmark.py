@@ -11,8 +11,20 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm   
 from typing import List, Dict, Any, Optional
 import argparse
+import asyncio
 
-from react_agent import ReActAgent
+from react_agent import ReActAgent, configure_tool_executor
+from tools import configure_executors
+from context_compaction import COMPACTORS, build_compactor
+from utils import configure_pools, aclose_clients
+from tool_cache import ToolCache
+from rate_limit import configure_rate_limits, rate_limit_stats
+from concurrency import AIMDController, AdaptiveConcurrency
+from contextlib import nullcontext
+from tracing import TRACER
+from report_stream import StreamingReport
+from single_flight import single_flight_stats
+from metrics import METRICS, start_metrics_file, start_metrics_server
 
 
 def process_query(
@@ -21,16 +33,118 @@ def process_query(
     api_key, 
     base_url, 
     model_name,
-    enable_thinking=True
+    enable_thinking=True,
+    compaction_kwargs=None,
+    gate=None,
+    step_journal=True,
+    stream=False,
+    current_date=None
+):
+    with gate.slot() if gate else nullcontext():
+        agent = ReActAgent(api_key=api_key, api_base_url=base_url, model_name=model_name, enable_thinking=enable_thinking,
+                           compactor=build_compactor(**(compaction_kwargs or {})), step_journal=step_journal, stream=stream,
+                           current_date=current_date)
+        return agent.run(question_item=question_item, output_dir=output_dir)
+
+async def aprocess_query(
+    limiter,
+    question_item, 
+    output_dir, 
+    api_key, 
+    base_url, 
+    model_name,
+    enable_thinking=True,
+    compaction_kwargs=None,
+    step_journal=True,
+    stream=False,
+    current_date=None
 ):
-    agent = ReActAgent(api_key=api_key, api_base_url=base_url, model_name=model_name, enable_thinking=enable_thinking)
-    return agent.run(question_item=question_item, output_dir=output_dir)
+    async with limiter.aslot() if isinstance(limiter, AdaptiveConcurrency) else limiter:
+        agent = ReActAgent(api_key=api_key, api_base_url=base_url, model_name=model_name, enable_thinking=enable_thinking,
+                           compactor=build_compactor(**(compaction_kwargs or {})), step_journal=step_journal, stream=stream,
+                           current_date=current_date)
+        return await agent.arun(question_item=question_item, output_dir=output_dir)
 
 def load_benchmark_data(benchmark_data_path):
     with open(benchmark_data_path, 'r', encoding='utf-8') as f:
         data = [json.loads(line) for line in f.readlines()]
     return data
 
+def _prepare_run(output_dir, model_name, enable_thinking, save_note, benchmark_data_path):
+    if save_note != "":
+        save_note = f"_{save_note}"
+    output_dir = os.path.join(output_dir, f"{model_name}_{'thinking' if enable_thinking else 'nothinking'}{save_note}")
+    os.makedirs(output_dir, exist_ok=True)
+    data = load_benchmark_data(benchmark_data_path)
+
+    print(f"Starting Benchmark: Total=[{len(data)}] | Dir=[{output_dir}]")
+    return output_dir, data
+
+def _build_gate(adaptive_concurrency, max_workers, concurrency_ceiling, concurrency_interval, output_dir):
+    """AIMD gate on in-flight questions that starts at `max_workers`, or None for a fixed limit."""
+    if not adaptive_concurrency:
+        return None
+    controller = AIMDController(
+        initial=max_workers,
+        ceiling=concurrency_ceiling or 4 * max_workers,
+        interval=concurrency_interval,
+        log_path=f"{output_dir}/_concurrency_log.jsonl"
+    )
+    print(f"Adaptive concurrency: start={controller.limit}, ceiling={controller.ceiling}, interval={concurrency_interval}s")
+    return AdaptiveConcurrency(controller)
+
+def _live_gauges():
+    """Gauges computed when the live metrics are rendered."""
+    for namespace, counters in ToolCache().stats().items():
+        yield "tool_cache_hit_ratio", counters["hit_ratio"], {"namespace": namespace}
+        for name in ("l1_hits", "l2_hits", "misses"):
+            yield f"tool_cache_{name}", counters.get(name, 0), {"namespace": namespace}
+    for endpoint, stats in rate_limit_stats().items():
+        yield "rate_limit_in_queue", stats["in_queue"], {"endpoint": endpoint}
+        yield "rate_limit_wait_seconds", stats["total_wait_seconds"], {"endpoint": endpoint}
+        yield "rate_limit_retry_after_events", stats["retry_after_events"], {"endpoint": endpoint}
+    for flight, stats in single_flight_stats().items():
+        yield "single_flight_in_flight", stats["in_flight"], {"flight": flight}
+    # One-minute rates for readers of the metrics file; Prometheus can use rate() on the counters instead.
+    yield "agent_steps_per_second", round(METRICS.recent_count("agent_steps_total", 60) / 60, 4), {}
+    llm_tokens = METRICS.recent_count("llm_input_tokens_total", 60) + METRICS.recent_count("llm_output_tokens_total", 60)
+    yield "llm_tokens_per_second", round(llm_tokens / 60, 2), {}
+
+def _start_live_metrics(metrics_port, metrics_file, metrics_interval):
+    """Start the metrics endpoint and/or file; returns the function that stops the file writer."""
+    if not metrics_port and not metrics_file:
+        return None
+    METRICS.register_collector(_live_gauges)
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    if metrics_file:
+        return start_metrics_file(metrics_file, metrics_interval)
+    return None
+
+def _write_report(report, output_dir):
+    report.finalize()
+    print(f"Report of {len(report)} questions saved to {report.final_path}")
+
+    cache_stats = ToolCache().stats()
+    with open(f"{output_dir}/_cache_stats.json", 'w', encoding='utf-8') as f:
+        json.dump(cache_stats, f, ensure_ascii=False, indent=4)
+    print(f"ToolCache stats: {json.dumps(cache_stats, ensure_ascii=False)}")
+
+    limiter_stats = rate_limit_stats()
+    with open(f"{output_dir}/_rate_limit_stats.json", 'w', encoding='utf-8') as f:
+        json.dump(limiter_stats, f, ensure_ascii=False, indent=4)
+    print(f"Rate limit stats: {json.dumps(limiter_stats, ensure_ascii=False)}")
+
+    flight_stats = single_flight_stats()
+    with open(f"{output_dir}/_single_flight_stats.json", 'w', encoding='utf-8') as f:
+        json.dump(flight_stats, f, ensure_ascii=False, indent=4)
+    print(f"Single-flight stats: {json.dumps(flight_stats, ensure_ascii=False)}")
+
+    if TRACER.enabled:
+        TRACER.write_chrome_trace(f"{output_dir}/_trace.json")
+    
+    print(f"\nBenchmark Finished. Results saved to {output_dir}")
+
 def run_benchmark(
     max_workers=5, 
     output_dir=None, 
@@ -39,33 +153,81 @@ def run_benchmark(
     model_name=None,
     enable_thinking=True,
     save_note="",
-    benchmark_data_path="./bench_data/question.jsonl"
+    benchmark_data_path="./bench_data/question.jsonl",
+    compaction_kwargs=None,
+    adaptive_concurrency=False,
+    concurrency_ceiling=None,
+    concurrency_interval=30.0,
+    step_journal=True,
+    stream=False,
+    current_date=None
 ):
-    if save_note != "":
-        save_note = f"_{save_note}"
-    output_dir = os.path.join(output_dir, f"{model_name}_{'thinking' if enable_thinking else 'nothinking'}{save_note}")
-    os.makedirs(output_dir, exist_ok=True)
-    data = load_benchmark_data(benchmark_data_path)
-
-    print(f"Starting Benchmark: Total=[{len(data)}] | Dir=[{output_dir}]")
-    results = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    output_dir, data = _prepare_run(output_dir, model_name, enable_thinking, save_note, benchmark_data_path)
+    gate = _build_gate(adaptive_concurrency, max_workers, concurrency_ceiling, concurrency_interval, output_dir)
+    report = StreamingReport(output_dir)
+    concurrent_questions = gate.controller.ceiling if gate else max_workers
+    # The tool, page and summary pools are shared by all questions; size them so none waits on another.
+    tool_workers = configure_tool_executor(concurrent_questions)
+    page_workers, summary_workers = configure_executors(concurrent_questions)
+    print(f"Shared pools: tool={tool_workers}, visit={page_workers}, summary={summary_workers} threads")
+    if gate:
+        gate.start()
+    with ThreadPoolExecutor(max_workers=concurrent_questions) as executor:
         future_to_idx = {
-            executor.submit(process_query, q, output_dir, api_key, base_url, model_name, enable_thinking): q['id'] 
+            executor.submit(process_query, q, output_dir, api_key, base_url, model_name, enable_thinking, compaction_kwargs, gate, step_journal, stream, current_date): q['id'] 
             for i, q in enumerate(data)
         }
 
         for future in tqdm(as_completed(future_to_idx), total=len(data)):
             try:
-                results.append(future.result())
+                report.append(future.result())
             except Exception as e:
                 print(f"Error: {e}")
 
-    results.sort(key=lambda x: x['idx'])
-    with open(f"{output_dir}/_report_all.json", 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=4)
-    
-    print(f"\nBenchmark Finished. Results saved to {output_dir}")
+    if gate:
+        gate.stop()
+    _write_report(report, output_dir)
+
+async def arun_benchmark(
+    max_workers=5, 
+    output_dir=None, 
+    api_key=None,
+    base_url=None,
+    model_name=None,
+    enable_thinking=True,
+    save_note="",
+    benchmark_data_path="./bench_data/question.jsonl",
+    compaction_kwargs=None,
+    adaptive_concurrency=False,
+    concurrency_ceiling=None,
+    concurrency_interval=30.0,
+    step_journal=True,
+    stream=False,
+    current_date=None
+):
+    """Asyncio driver: every question is a task on one event loop and
+    `max_workers` bounds the number of in-flight questions."""
+    output_dir, data = _prepare_run(output_dir, model_name, enable_thinking, save_note, benchmark_data_path)
+    gate = _build_gate(adaptive_concurrency, max_workers, concurrency_ceiling, concurrency_interval, output_dir)
+    if gate:
+        await gate.astart()
+    limiter = gate or asyncio.Semaphore(max_workers)
+    report = StreamingReport(output_dir)
+    tasks = [
+        asyncio.create_task(aprocess_query(limiter, q, output_dir, api_key, base_url, model_name, enable_thinking, compaction_kwargs, step_journal, stream, current_date))
+        for q in data
+    ]
+
+    for future in tqdm(asyncio.as_completed(tasks), total=len(data)):
+        try:
+            report.append(await future)
+        except Exception as e:
+            print(f"Error: {e}")
+
+    if gate:
+        gate.stop()
+    await aclose_clients()
+    _write_report(report, output_dir)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -75,12 +237,37 @@ if __name__ == "__main__":
     parser.add_argument("--model_name", type=str, default="qwen")
     parser.add_argument("--enable_thinking", type=bool, default=True)
     parser.add_argument("--save_note", type=str, default="")
+    parser.add_argument("--llm_pool_size", type=int, default=None, help="keep-alive connections per LLM endpoint (default: $LLM_POOL_SIZE or 100)")
+    parser.add_argument("--http_pool_size", type=int, default=None, help="keep-alive connections per tool endpoint (default: $HTTP_POOL_SIZE or 100)")
+    parser.add_argument("--compaction", type=str, default="none", choices=["none"] + list(COMPACTORS), help="history compaction applied before each LLM call")
+    parser.add_argument("--compaction_trigger_tokens", type=int, default=64000, help="estimated history size that triggers compaction")
+    parser.add_argument("--rate_limits", type=str, default="", help='per-endpoint limits as JSON or a JSON file, e.g. {"google.serper.dev": {"requests_per_sec": 5}}')
+    parser.add_argument("--adaptive_concurrency", action="store_true", help="let an AIMD controller adjust the number of in-flight questions, starting at --num_workers")
+    parser.add_argument("--concurrency_ceiling", type=int, default=None, help="hard ceiling for adaptive concurrency (default: 4 * --num_workers)")
+    parser.add_argument("--concurrency_interval", type=float, default=30.0, help="seconds between adaptive concurrency decisions")
+    parser.add_argument("--metrics_port", type=int, default=0, help="serve live Prometheus metrics on this port (0 = off)")
+    parser.add_argument("--metrics_file", type=str, default="", help="periodically rewrite this file with the live metrics in Prometheus text format")
+    parser.add_argument("--metrics_interval", type=float, default=15.0, help="seconds between metrics file flushes")
+    parser.add_argument("--no_step_journal", action="store_true", help="do not journal completed steps under <output_dir>/_journal for resuming interrupted questions")
+    parser.add_argument("--stream", action="store_true", help="stream LLM responses and start each tool call as soon as its arguments are complete")
+    parser.add_argument("--current_date", type=str, default=None, help="date in the agent prompt, YYYY-MM-DD (default: $AGENT_CURRENT_DATE or today); fix it to replay recorded runs")
+    parser.add_argument("--trace", action="store_true", help="record LLM/tool/cache/retry spans and write them to _trace.json (Chrome trace format)")
+    parser.add_argument("--async_mode", action="store_true", help="run every question as a coroutine on one event loop; --num_workers bounds in-flight questions")
     
     parser.add_argument("--output_dir", type=str, default="./benchmark_results")
     parser.add_argument("--benchmark_data_path", type=str, default="./bench_data/question.jsonl")
     args = parser.parse_args()
+    configure_pools(llm_pool_size=args.llm_pool_size, http_pool_size=args.http_pool_size)
+    if args.trace:
+        TRACER.enable()
+    if args.rate_limits:
+        if os.path.exists(args.rate_limits):
+            with open(args.rate_limits, 'r', encoding='utf-8') as f:
+                configure_rate_limits(json.load(f))
+        else:
+            configure_rate_limits(json.loads(args.rate_limits))
     
-    run_benchmark(
+    benchmark_kwargs = dict(
         max_workers=args.num_workers, 
         output_dir=args.output_dir, 
         api_key=args.api_key, 
@@ -88,5 +275,19 @@ if __name__ == "__main__":
         model_name=args.model_name, 
         enable_thinking=args.enable_thinking,
         save_note=args.save_note, 
-        benchmark_data_path=args.benchmark_data_path
-    )
\ No newline at end of file
+        benchmark_data_path=args.benchmark_data_path,
+        compaction_kwargs={"name": args.compaction, "trigger_tokens": args.compaction_trigger_tokens} if args.compaction != "none" else None,
+        adaptive_concurrency=args.adaptive_concurrency,
+        concurrency_ceiling=args.concurrency_ceiling,
+        concurrency_interval=args.concurrency_interval,
+        step_journal=not args.no_step_journal,
+        stream=args.stream,
+        current_date=args.current_date
+    )
+    metrics_stop = _start_live_metrics(args.metrics_port, args.metrics_file, args.metrics_interval)
+    if args.async_mode:
+        asyncio.run(arun_benchmark(**benchmark_kwargs))
+    else:
+        run_benchmark(**benchmark_kwargs)
+    if metrics_stop is not None:
+        metrics_stop()
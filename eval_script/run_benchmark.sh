@@ -9,6 +9,7 @@ BENCHMARK_DATA_PATH="./bench_data/question.jsonl"
 
 WORKERS=4
 ENABLE_THINKING=true # if use thinking mode 
+ASYNC_MODE=false # if true, run questions as coroutines on one event loop
 
 
 
@@ -18,7 +19,12 @@ export SUMMARY_MODEL_NAME=$MODEL_NAME
 export JINA_API_KEY=$JINA_API_KEY
 export SERPER_API_KEY=$SERPER_API_KEY
 
-D:/anaconda3/python.exe run_benchmark.py \
+EXTRA_ARGS=""
+if [ "$ASYNC_MODE" = true ]; then
+    EXTRA_ARGS="--async_mode"
+fi
+
+D:/anaconda3/python.exe run_benchmark.py $EXTRA_ARGS \
     --num_workers "$WORKERS" \
     --output_dir ./benchmark_results \
     --api_key "$API_KEY" \
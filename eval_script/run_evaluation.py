@@ -326,7 +326,43 @@ class SimpleEvaluator:
         print(json.dumps(summary, ensure_ascii=False, indent=4))
         return summary
 
-
+    def gather_token_usage(self, pred_dir_path: str) -> dict:
+        usage_keys = ['total_input_tokens', 'total_output_tokens', 'compacted_steps', 'compaction_saved_tokens']
+        totals = Counter()
+        num_preds = 0
+        for file in os.listdir(pred_dir_path):
+            if file.endswith('.json') and not file.startswith('_'):
+                with open(os.path.join(pred_dir_path, file), 'r', encoding='utf-8') as f:
+                    token_stats = json.load(f).get('token_stats') or {}
+                num_preds += 1
+                for k in usage_keys:
+                    totals[k] += token_stats.get(k, 0)
+        return {f"avg_{k}": round(totals[k] / num_preds, 2) if num_preds else 0.0 for k in usage_keys}
+
+    def compare_with_baseline(self, pred_dir_path: str, baseline_pred_dir_path: str, gt_dir_path: str, question_file_path: str):
+        """Score a run against a baseline run of the same questions, e.g. with and without
+        history compaction, and report the metric and token deltas (run - baseline)."""
+        run_summary = self.run_evaluation(pred_dir_path, gt_dir_path, question_file_path)
+        baseline_summary = self.run_evaluation(baseline_pred_dir_path, gt_dir_path, question_file_path)
+
+        def delta(run, base):
+            if isinstance(run, dict):
+                return {k: delta(v, base[k]) for k, v in run.items() if k in base}
+            if isinstance(run, (int, float)) and isinstance(base, (int, float)):
+                return round(run - base, 4)
+            return run
+
+        run_usage = self.gather_token_usage(pred_dir_path)
+        baseline_usage = self.gather_token_usage(baseline_pred_dir_path)
+        comparison = {
+            'baseline_pred_dir_path': baseline_pred_dir_path,
+            'metric_delta': delta(run_summary, baseline_summary),
+            'token_usage': {'run': run_usage, 'baseline': baseline_usage, 'delta': delta(run_usage, baseline_usage)},
+        }
+        print(json.dumps(comparison, ensure_ascii=False, indent=4))
+        with open(os.path.join(pred_dir_path, '_baseline_comparison.json'), 'w', encoding='utf-8') as f:
+            json.dump(comparison, f, ensure_ascii=False, indent=4)
+        return comparison
 
 
 if __name__ == "__main__":
@@ -334,12 +370,21 @@ if __name__ == "__main__":
     parser.add_argument("--pred_dir_path", type=str, required=True)
     parser.add_argument("--gt_dir_path", type=str, required=True)
     parser.add_argument("--question_file_path", type=str, required=True)
+    parser.add_argument("--baseline_pred_dir_path", type=str, default=None, help="optional baseline run (e.g. without compaction) to compare against")
     args = parser.parse_args()
 
     evaluator = SimpleEvaluator()
-    evaluator.run_evaluation(
-        pred_dir_path=args.pred_dir_path,
-        gt_dir_path=args.gt_dir_path,
-        question_file_path=args.question_file_path
-    )
+    if args.baseline_pred_dir_path:
+        evaluator.compare_with_baseline(
+            pred_dir_path=args.pred_dir_path,
+            baseline_pred_dir_path=args.baseline_pred_dir_path,
+            gt_dir_path=args.gt_dir_path,
+            question_file_path=args.question_file_path
+        )
+    else:
+        evaluator.run_evaluation(
+            pred_dir_path=args.pred_dir_path,
+            gt_dir_path=args.gt_dir_path,
+            question_file_path=args.question_file_path
+        )
     
\ No newline at end of file
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Dict, Tuple
+
+from metrics import METRICS
+
+
+class SingleFlight:
+    """Coalesces concurrent fetches of the same key.
+
+    The first caller of a key (the leader) runs the fetch; callers that arrive
+    while it is in flight wait for its result instead of repeating the request.
+    Threads and asyncio tasks, on any event loop, share the same in-flight
+    calls. A key is forgotten as soon as its fetch finishes, so later callers
+    go through the cache as usual.
+
+    Cancellation never reaches the shared call: in asyncio the fetch runs as
+    its own task, so a cancelled leader detaches like any waiter, and a call
+    interrupted by a `BaseException` fails its waiters with a `RuntimeError`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def begin(self, key: str) -> Tuple[Future, bool]:
+        """(future of the call in flight for `key`, whether the caller is its leader and must `finish` it)."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                METRICS.inc("single_flight_coalesced_total", flight=self.name)
+                return future, False
+            future = self._calls[key] = Future()
+            self._stats["leaders"] += 1
+            return future, True
+
+    def finish(self, key: str, result=None, error: BaseException = None):
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None and not isinstance(error, Exception):
+            # CancelledError, KeyboardInterrupt: the waiters were not interrupted, their call failed.
+            error = RuntimeError(f"{self.name} call for {key} was interrupted ({type(error).__name__})")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn, *args):
+        future, leader = self.begin(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result
+
+    async def ado(self, key: str, fn, *args):
+        future, leader = self.begin(key)
+        if leader:
+            task = spawn(fn(*args))
+            task.add_done_callback(lambda task: self._finish_task(key, task))
+        # Shielded: a cancelled caller, the leader included, must not cancel the call for everyone else.
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _finish_task(self, key: str, task: asyncio.Future):
+        if task.cancelled():
+            self.finish(key, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self.finish(key, error=task.exception())
+        else:
+            self.finish(key, task.result())
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, in_flight=len(self._calls))
+        calls = stats.get("leaders", 0) + stats.get("coalesced", 0)
+        stats["coalesced_ratio"] = round(stats.get("coalesced", 0) / calls, 4) if calls else 0.0
+        return stats
+
+
+# The event loop only keeps weak references to tasks; shared calls that no caller holds on to
+# are kept here until they finish, so their waiters are not left on a collected task.
+_background_tasks = set()
+
+
+def spawn(coro) -> asyncio.Future:
+    """`asyncio.ensure_future(coro)` for a task that is awaited through a flight, not by its creator."""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    flight = _flights.get(name)
+    if flight is None:
+        with _flights_lock:
+            flight = _flights.setdefault(name, SingleFlight(name))
+    return flight
+
+
+def single_flight_stats() -> dict:
+    """Leader and coalesced (suppressed duplicate) call counts per flight."""
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.stats() for name, flight in sorted(flights.items())}
@@ -0,0 +1,113 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+
+def _json_default(value):
+    """SDK objects (tool calls, reasoning details) are stored as their plain dict form."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "__dict__"):
+        return vars(value)
+    return str(value)
+
+
+def serialize_tool_call(tool_call) -> dict:
+    """Tool call in the OpenAI request format, whether it is an SDK object or already a dict."""
+    if isinstance(tool_call, dict):
+        return tool_call
+    return {
+        "id": getattr(tool_call, "id", None),
+        "type": "function",
+        "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments},
+    }
+
+
+def serialize_message(message: Dict) -> Dict:
+    message = dict(message)
+    if message.get("tool_calls"):
+        message["tool_calls"] = [serialize_tool_call(tool_call) for tool_call in message["tool_calls"]]
+    return json.loads(json.dumps(message, ensure_ascii=False, default=_json_default))
+
+
+class StepJournal:
+    """Append-only JSONL journal of the completed steps of one question.
+
+    The first line is a header with the question, the model and the initial
+    messages; every further line holds the messages a step added and the token
+    stats after it. Each line goes out in a single `os.write` on an O_APPEND
+    descriptor and is fsynced, so a crash leaves at most a torn last line, which
+    `load` drops. One journal belongs to one question and is only written by
+    the worker running that question.
+    """
+
+    def __init__(self, path: str, question: str, model_name: str, fsync: bool = True):
+        self.path = path
+        self.question = question
+        self.model_name = model_name
+        self.fsync = fsync
+
+    def _append(self, record: Dict):
+        data = (json.dumps(record, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def load(self) -> Optional[Dict]:
+        """`{"messages", "steps"}` of a journal left by an earlier run of this question, or None."""
+        if not os.path.exists(self.path):
+            return None
+        records = []
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_end += len(line)
+        if valid_end < os.path.getsize(self.path):
+            # Drop the torn tail so later appends start on a clean line.
+            os.truncate(self.path, valid_end)
+        if not records or records[0].get("type") != "header":
+            self.remove()
+            return None
+        header = records[0]
+        if header.get("question") != self.question or header.get("model_name") != self.model_name:
+            print(f"[Journal] {self.path} belongs to another question or model, starting over")
+            self.remove()
+            return None
+        steps = [r for r in records[1:] if r.get("type") == "step"]
+        return {"messages": header["messages"], "steps": steps}
+
+    def start(self, messages: List[Dict]):
+        self._append({
+            "type": "header",
+            "question": self.question,
+            "model_name": self.model_name,
+            "messages": [serialize_message(m) for m in messages],
+        })
+
+    def record_step(self, step: int, new_messages: List[Dict], token_stats: Dict,
+                    termination: Optional[str] = None, prediction: Optional[str] = None):
+        self._append({
+            "type": "step",
+            "step": step,
+            "messages": [serialize_message(m) for m in new_messages],
+            "token_stats": token_stats,
+            "termination": termination,
+            "prediction": prediction,
+        })
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ToolCache is a process-wide singleton; keep the tests away from the working tool_cache.db.
+os.environ.setdefault("TOOL_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="gisa_tests_"), "tool_cache.db"))
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import tools
+from react_agent import ReActAgent
+
+
+def _tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def _scripted_agent(monkeypatch):
+    agent = ReActAgent("model", "http://llm.example", "key", enable_thinking=False, step_journal=False,
+                       current_date="2025-01-01")
+    replies = [
+        (SimpleNamespace(content="", tool_calls=[_tool_call("a", "search", '{"query": ["x"]}'),
+                                                 _tool_call("b", "visit", "not json")]), 10, 1),
+        (SimpleNamespace(content="the answer", tool_calls=None), 20, 2),
+    ]
+
+    def call_llm(msgs, **kwargs):
+        return replies[sum(1 for m in msgs if m["role"] == "assistant")]
+
+    async def acall_llm(msgs, **kwargs):
+        return call_llm(msgs)
+
+    def run_tool(tool_name, tool_args):
+        return f"{tool_name} result for {tool_args['query']}", 3, 4
+
+    async def arun_tool(tool_name, tool_args):
+        return run_tool(tool_name, tool_args)
+
+    monkeypatch.setattr(agent, "_call_llm", call_llm)
+    monkeypatch.setattr(agent, "_acall_llm", acall_llm)
+    monkeypatch.setattr(agent, "_run_tool", run_tool)
+    monkeypatch.setattr(agent, "_arun_tool", arun_tool)
+    return agent
+
+
+def test_solve_and_asolve_share_the_step_logic(monkeypatch):
+    agent = _scripted_agent(monkeypatch)
+    sync_result = agent.solve("question?")
+    async_result = asyncio.run(agent.asolve("question?"))
+
+    assert sync_result["prediction"] == async_result["prediction"] == "the answer"
+    assert sync_result["token_stats"] == async_result["token_stats"]
+    assert sync_result["messages"] == async_result["messages"]
+    tool_messages = [m["content"] for m in sync_result["messages"] if m["role"] == "tool"]
+    assert tool_messages[0] == "search result for ['x']"
+    assert tool_messages[1].startswith("Error: Tool call is not a valid JSON")
+
+
+def test_async_page_summary_runs_off_the_event_loop(monkeypatch):
+    visit = tools.Visit()
+    threads = []
+
+    def summarize_page(url, goal, content, summary_key):
+        threads.append(threading.get_ident())
+        raw, _, _ = yield [{"role": "user", "content": content}]
+        threads.append(threading.get_ident())
+        return raw, 1, 1
+
+    async def page_content(url):
+        return "page text"
+
+    async def summary_calls(messages, max_retries=2):
+        return "summary", 1, 1
+
+    monkeypatch.setattr(visit, "_summarize_page", summarize_page)
+    monkeypatch.setattr(visit, "_apage_content", page_content)
+    monkeypatch.setattr(visit, "_asummary_calls", summary_calls)
+
+    async def main():
+        return await visit.areadpage_jina("https://off-loop.example/page", "goal"), threading.get_ident()
+
+    result, loop_thread = asyncio.run(main())
+    assert result == ("summary", 1, 1)
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+class _ThreadRecordingJournal:
+    def __init__(self):
+        self.threads = []
+        self.steps = []
+
+    def load(self):
+        self.threads.append(threading.get_ident())
+        return None
+
+    def start(self, messages):
+        self.threads.append(threading.get_ident())
+
+    def record_step(self, step, messages, token_stats, termination, prediction):
+        self.threads.append(threading.get_ident())
+        self.steps.append(step)
+
+
+def test_asolve_writes_the_journal_off_the_event_loop(monkeypatch):
+    agent = _scripted_agent(monkeypatch)
+    journal = _ThreadRecordingJournal()
+
+    async def main():
+        return await agent.asolve("question?", journal), threading.get_ident()
+
+    result, loop_thread = asyncio.run(main())
+    assert result["prediction"] == "the answer"
+    assert journal.steps == [1, 2]
+    assert journal.threads and loop_thread not in journal.threads
@@ -0,0 +1,60 @@
+import chunk_filter
+from chunk_filter import GAP_MARKER, ChunkBudget, split_chunks
+from token_budget import get_encoding
+
+
+def make_page(paragraphs: int) -> str:
+    return "".join(f"Paragraph {i} about revenue and the annual report of the company.\n\n" for i in range(paragraphs))
+
+
+def test_split_chunks_round_trip():
+    page = make_page(2000)
+    chunks = split_chunks(page, 64)
+    assert len(chunks) > 1
+    assert "".join(chunks) == page
+
+
+def test_page_within_budget_is_unchanged():
+    page = make_page(20)
+    assert ChunkBudget(page, "revenue", max_tokens=10000).text == page
+
+
+def chunk_tokens_of(page: str, chunk_tokens: int) -> int:
+    encoding = get_encoding("cl100k_base")
+    return max(len(encoding.encode(chunk)) for chunk in split_chunks(page, chunk_tokens)[:3])
+
+
+def test_relevant_chunk_late_in_the_page_is_kept():
+    page = make_page(5000) + "The Zanzibar lighthouse was completed in 1887.\n\n" + make_page(500)
+    # Room for about four chunks: the first one, the match and two more.
+    max_tokens = 4 * chunk_tokens_of(page, 128)
+    budget = ChunkBudget(page, "When was the Zanzibar lighthouse completed?", max_tokens=max_tokens, chunk_tokens=128)
+    assert "Zanzibar" in budget.text
+    assert budget.text.startswith("Paragraph 0")
+    assert GAP_MARKER in budget.text
+    assert len(budget) <= max_tokens
+    budget.shrink(0.7)
+    assert "Zanzibar" in budget.text
+
+
+def test_stops_tokenizing_once_the_budget_is_full(monkeypatch):
+    encoded = []
+
+    class CountingEncoding:
+        def __init__(self, encoding):
+            self.encoding = encoding
+
+        def encode(self, text, **kwargs):
+            encoded.append(len(text))
+            return self.encoding.encode(text, **kwargs)
+
+        def decode(self, tokens):
+            return self.encoding.decode(tokens)
+
+    page = make_page(50000)
+    max_tokens = int(10.5 * chunk_tokens_of(page, 128))
+    monkeypatch.setattr(chunk_filter, "get_encoding", lambda name: CountingEncoding(get_encoding(name)))
+    budget = ChunkBudget(page, "revenue", max_tokens=max_tokens, chunk_tokens=128)
+    assert budget.n_chunks > 1000
+    assert budget.kept_chunks >= 10
+    assert len(encoded) < 20
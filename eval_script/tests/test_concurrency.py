@@ -0,0 +1,44 @@
+import concurrency
+from concurrency import AIMDController
+
+
+class FakeMetrics:
+    """One window of LLM calls with a fixed latency and no errors."""
+
+    def __init__(self):
+        self.latency = 1.0
+
+    def recent_count(self, name, seconds, **labels):
+        return 50 if name == "llm_requests_total" else 0
+
+    def recent_values(self, name, seconds, **labels):
+        return [self.latency] * 50 if name == "llm_latency_seconds" else []
+
+
+def run_windows(monkeypatch, latencies, initial=21):
+    metrics = FakeMetrics()
+    monkeypatch.setattr(concurrency, "METRICS", metrics)
+    controller = AIMDController(initial=initial, ceiling=100)
+    limits = []
+    for latency in latencies:
+        metrics.latency = latency
+        # Saturated: every window may grow the limit unless latency says otherwise.
+        limits.append(controller.update(in_flight=controller.limit))
+    return limits
+
+
+def test_latency_step_up_recovers(monkeypatch):
+    limits = run_windows(monkeypatch, [5.0] + [12.0] * 10)
+    # One cut when latency jumps, then the higher latency becomes the baseline.
+    assert limits[1] < limits[0]
+    assert limits[2:] == list(range(limits[1] + 1, limits[1] + 10))
+
+
+def test_latency_spike_still_cuts(monkeypatch):
+    limits = run_windows(monkeypatch, [5.0, 5.0, 5.0, 30.0])
+    assert limits[3] < limits[2]
+
+
+def test_steady_latency_grows_to_ceiling(monkeypatch):
+    limits = run_windows(monkeypatch, [5.0] * 5, initial=98)
+    assert limits[-1] == 100
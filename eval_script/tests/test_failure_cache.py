@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+
+import tools
+from tool_cache import STATUS_PERMANENT, STATUS_TRANSIENT
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+
+class FakeSession:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.requests = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests += 1
+        return FakeResponse(self.status_code, "error")
+
+
+@pytest.fixture
+def jina(monkeypatch):
+    def install(status_code):
+        session = FakeSession(status_code)
+        monkeypatch.setattr(tools, "get_http_session", lambda *args: session)
+        monkeypatch.setattr(tools.time, "sleep", lambda seconds: None)
+        return session
+    return install
+
+
+@pytest.mark.parametrize("status_code, expected", [
+    (404, STATUS_PERMANENT),
+    (410, STATUS_PERMANENT),
+    (451, STATUS_PERMANENT),
+    (400, STATUS_TRANSIENT),
+    (408, STATUS_TRANSIENT),
+    (429, STATUS_TRANSIENT),
+    (503, STATUS_TRANSIENT),
+    (None, STATUS_TRANSIENT),
+    (401, None),
+    (402, None),
+    (403, None),
+])
+def test_failure_status(status_code, expected):
+    assert tools.failure_status(status_code) == expected
+
+
+def test_not_found_page_is_cached_as_permanent(jina):
+    session = jina(404)
+    visit = tools.Visit()
+    url = f"https://example.com/{uuid.uuid4()}"
+    visit._page_content(url)
+    assert session.requests == 1
+    assert visit.cache.get_entry(f"visit_v1:{url}")[1] == STATUS_PERMANENT
+    visit._page_content(url)
+    assert session.requests == 1
+
+
+@pytest.mark.parametrize("status_code", [401, 402, 403])
+def test_account_errors_are_not_cached(jina, status_code):
+    session = jina(status_code)
+    visit = tools.Visit()
+    url = f"https://example.com/{uuid.uuid4()}"
+    visit._page_content(url)
+    # Not retried: another attempt with the same key fails the same way.
+    assert session.requests == 1
+    assert visit.cache.get_entry(f"visit_v1:{url}") is None
+    # The next visit asks again, so the page is read once the account works again.
+    visit._page_content(url)
+    assert session.requests == 2
+
+
+@pytest.mark.parametrize("status_code", [401, 402, 403])
+def test_account_errors_do_not_cache_searches(monkeypatch, status_code):
+    class Error(Exception):
+        response = FakeResponse(status_code)
+
+    class FailingSession:
+        def post(self, *args, **kwargs):
+            raise Error(f"{status_code} Client Error")
+
+    monkeypatch.setattr(tools, "get_http_session", lambda *args: FailingSession())
+    search = tools.Search()
+    query = f"query {uuid.uuid4()}"
+    assert "Google search failed" in search._fetch_search(query)
+    assert search.cache.get_entry(f"search_v1:{query}") is None
@@ -0,0 +1,37 @@
+import metrics
+from metrics import MetricsRegistry
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def test_recent_count_is_not_capped(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(metrics, "time", clock)
+    registry = MetricsRegistry()
+    # 100k events in one minute, far more than a capped event log would hold.
+    for i in range(100_000):
+        clock.now = 1_000_000.0 + i * 0.0006
+        registry.inc("agent_steps_total", tool="search" if i % 2 else "visit")
+    assert registry.recent_count("agent_steps_total", 60) == 100_000
+    assert registry.recent_count("agent_steps_total", 60, tool="search") == 50_000
+
+
+def test_recent_count_window(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(metrics, "time", clock)
+    registry = MetricsRegistry()
+    for second in range(120):
+        clock.now = 1_000_000.0 + second + 0.5
+        registry.inc("llm_requests_total", 2)
+    assert registry.recent_count("llm_requests_total", 30) == 60
+    assert registry.recent_count("llm_requests_total", 60) == 120
+    # Buckets that the ring has reused or that fell out of the window are not counted.
+    clock.now += metrics.RATE_HORIZON_SECONDS
+    assert registry.recent_count("llm_requests_total", 60) == 0
+    assert registry.counters[("llm_requests_total", ())] == 240
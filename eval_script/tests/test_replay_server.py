@@ -0,0 +1,63 @@
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prompts import FC_REACT_AGENT_PROMPT
+from replay_server import ExchangeStore, Route, StandInServer
+
+
+class Upstream(BaseHTTPRequestHandler):
+    """An LLM endpoint that answers with the date it was asked on."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][0]["content"]
+        payload = json.dumps({"answer": prompt[prompt.index("Current date:"):][:24]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def agent_request(port: int, date: str):
+    body = {
+        "model": "m",
+        "messages": [{"role": "user", "content": FC_REACT_AGENT_PROMPT.format(question="Who?", current_date=date)}],
+    }
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/chat/completions", data=json.dumps(body).encode("utf-8"),
+                                     method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status, response.read()
+
+
+def start(mode, store, upstream=None):
+    profile = {"latency": {"dist": "none"}}
+    server = StandInServer(mode, store, [Route("llm", 0, upstream, profile)])
+    server.serve()
+    return server, server.routes[0].port
+
+
+def test_replay_on_a_later_date(tmp_path):
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    path = str(tmp_path / "exchanges.jsonl")
+    try:
+        recorder, port = start("record", ExchangeStore(path), f"http://127.0.0.1:{upstream.server_address[1]}")
+        recorded = agent_request(port, "2026-10-18")
+        recorder.shutdown()
+    finally:
+        upstream.shutdown()
+
+    store = ExchangeStore(path)
+    assert store.current_dates() == ["2026-10-18"]
+    replayer, port = start("replay", store)
+    try:
+        assert agent_request(port, "2027-01-05") == recorded
+        assert replayer.stats_dict()["llm"] == {"requests": 1, "hits": 1}
+    finally:
+        replayer.shutdown()
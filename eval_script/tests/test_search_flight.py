@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import tools
+
+
+def test_cancelled_batch_leader_does_not_cancel_waiters(monkeypatch):
+    search = tools.Search()
+    query = f"query {uuid.uuid4()}"
+    requests = []
+
+    async def fetch_batch(batch):
+        requests.append(batch)
+        await asyncio.sleep(0.05)
+        return {q: f"results for {q}" for q in batch}
+
+    monkeypatch.setattr(search, "_afetch_batch", fetch_batch)
+
+    async def main():
+        leader = asyncio.ensure_future(search.agoogle_search_batch([query]))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(search.agoogle_search_batch([query]))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        return await waiter
+
+    assert asyncio.run(main()) == {query: f"results for {query}"}
+    assert requests == [[query]]
+
+
+def test_visit_deadline_reports_cancelled_pages(monkeypatch):
+    visit = tools.Visit()
+
+    async def read_page(url, goal):
+        await asyncio.sleep(0.5 if url.endswith("slow") else 0)
+        return f"summary of {url}", 1, 1
+
+    monkeypatch.setattr(visit, "areadpage_jina", read_page)
+    monkeypatch.setattr(tools, "VISIT_TIMEOUT", 0.1)
+    response, _, _ = asyncio.run(visit._avisit_pages(["https://a.example/fast", "https://a.example/slow"], "goal"))
+    assert "summary of https://a.example/fast" in response
+    assert "could not be accessed" in response
+
+
+def test_sync_visit_deadline_reports_unfinished_pages(monkeypatch):
+    visit = tools.Visit()
+
+    def read_page(url, goal, deadline):
+        time.sleep(0.5 if url.endswith("slow") else 0)
+        return f"summary of {url}", 1, 1
+
+    monkeypatch.setattr(visit, "readpage_jina", read_page)
+    monkeypatch.setattr(tools, "VISIT_TIMEOUT", 0.1)
+    response, _, _ = visit._visit_pages(["https://a.example/fast", "https://a.example/slow"], "goal")
+    assert "summary of https://a.example/fast" in response
+    assert "could not be accessed" in response
+
+
+def test_submit_bounded_runs_at_most_limit_on_shared_pool():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def work(i):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return i
+
+    threads_before = threading.active_count()
+    futures = tools._submit_bounded(tools._summary_executor, work, list(range(20)), 3)
+    assert [f.result() for f in futures] == list(range(20))
+    assert peak[0] <= 3
+    # Repeated calls reuse the shared pool instead of starting threads of their own.
+    for _ in range(5):
+        tools._submit_bounded(tools._summary_executor, work, list(range(3)), 3)
+    assert threading.active_count() <= threads_before + tools.SUMMARY_MAX_PARALLEL
+
+
+def test_tokens_of_pages_past_the_deadline_are_counted(monkeypatch):
+    visit = tools.Visit()
+    slow_call_started = threading.Event()
+
+    def summarize_page(url, goal, content, summary_key):
+        yield [{"role": "user", "content": "first"}]
+        yield [{"role": "user", "content": "second"}]
+        yield [{"role": "user", "content": "third"}]
+        return "never reached", 30, 3
+
+    def summary_calls(messages, max_retries=2):
+        if messages[0]["content"] == "second":
+            slow_call_started.set()
+            time.sleep(0.3)
+        return "{}", 10, 1
+
+    monkeypatch.setattr(visit, "_summarize_page", summarize_page)
+    monkeypatch.setattr(visit, "_page_content", lambda url: "page text")
+    monkeypatch.setattr(visit, "_summary_calls", summary_calls)
+    monkeypatch.setattr(visit, "_cached_summary", lambda *args: None)
+    monkeypatch.setattr(tools, "VISIT_TIMEOUT", 0.1)
+    unaccounted = []
+    monkeypatch.setattr(tools, "_record_unaccounted_tokens", lambda *tokens: unaccounted.append(tokens))
+
+    response, input_tokens, _ = visit._visit_pages(["https://late.example/page"], "goal")
+    assert "could not be accessed" in response and input_tokens == 0
+    assert slow_call_started.is_set()
+    time.sleep(0.5)
+    # Two calls ran; the page stopped at the deadline check before the third one.
+    assert (20, 2) in unaccounted
+
+
+def test_pools_are_sized_from_the_run_concurrency(monkeypatch):
+    import react_agent
+
+    monkeypatch.setattr(tools, "_page_executor", tools._page_executor)
+    monkeypatch.setattr(tools, "_summary_executor", tools._summary_executor)
+    monkeypatch.setattr(react_agent, "_tool_executor", react_agent._tool_executor)
+    monkeypatch.setattr(tools, "VISIT_MAP_REDUCE_TOKENS", 1000)
+
+    pages, summaries = tools.configure_executors(100)
+    assert pages == 100 * tools.VISIT_MAX_PARALLEL
+    assert summaries == pages * tools.VISIT_MAP_FANOUT
+    assert tools._page_executor._max_workers == pages
+    assert react_agent.configure_tool_executor(100) == 100 * react_agent.TOOL_CALLS_PER_QUESTION
+    # A small run keeps the configured minimum.
+    assert tools.configure_executors(1)[0] == tools.VISIT_PAGE_WORKERS
@@ -0,0 +1,98 @@
+import asyncio
+import gc
+
+import pytest
+
+import single_flight
+from single_flight import SingleFlight
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    flight = SingleFlight("test_cancel_leader")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "page"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("url", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.ado("url", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == "page"
+    assert calls == [1]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_only_detaches():
+    flight = SingleFlight("test_cancel_waiter")
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "page"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("url", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.ado("url", fetch))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return await leader
+
+    assert asyncio.run(main()) == "page"
+
+
+def test_cancelled_fetch_fails_waiters_with_an_exception():
+    flight = SingleFlight("test_cancel_fetch")
+
+    async def fetch():
+        raise asyncio.CancelledError()
+
+    async def main():
+        leader = asyncio.ensure_future(flight.ado("url", fetch))
+        waiter = asyncio.ensure_future(flight.ado("url", fetch))
+        return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+    results = asyncio.run(main())
+    # An Exception, which the agents' `except Exception` handlers turn into a tool error.
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_interrupted_sync_leader_fails_waiters_with_an_exception():
+    flight = SingleFlight("test_interrupt")
+    future, leader = flight.begin("url")
+    assert leader
+    flight.finish("url", error=KeyboardInterrupt())
+    with pytest.raises(RuntimeError):
+        future.result()
+
+
+def test_shared_call_is_kept_alive_until_it_finishes():
+    flight = SingleFlight("keepalive")
+
+    async def main():
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "result"
+
+        waiter = asyncio.ensure_future(flight.ado("key", fetch))
+        await asyncio.sleep(0)
+        assert len(single_flight._background_tasks) == 1
+        gc.collect()
+        release.set()
+        result = await waiter
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "result"
+    assert not single_flight._background_tasks
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+from react_agent import ReActAgent
+from utils import StreamedMessage
+
+
+def _chunk(content=None, reasoning_details=None, usage=None):
+    delta = SimpleNamespace(content=content, reasoning_content=None, reasoning_details=reasoning_details, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=usage)
+
+
+def test_streamed_openrouter_turn_without_reasoning_builds_step_message():
+    assembler = StreamedMessage()
+    assembler.add(_chunk(content="the "))
+    assembler.add(_chunk(content="answer", usage=SimpleNamespace(prompt_tokens=5, completion_tokens=2)))
+    message, input_tokens, output_tokens = assembler.finish([])
+
+    agent = ReActAgent("model", "https://openrouter.ai/api/v1", "key", enable_thinking=True, stream=True,
+                       step_journal=False, current_date="2025-01-01")
+    step_message = agent._build_step_message(message)
+    assert step_message["content"] == "the answer"
+    assert not step_message["reasoning_details"]
+    assert (input_tokens, output_tokens) == (5, 2)
+
+
+def test_streamed_reasoning_details_are_merged():
+    assembler = StreamedMessage()
+    assembler.add(_chunk(reasoning_details=[{"type": "reasoning.text", "index": 0, "text": "think"}]))
+    assembler.add(_chunk(reasoning_details=[{"type": "reasoning.text", "index": 0, "text": "ing"}]))
+    assembler.add(_chunk(content="done"))
+    message, _, _ = assembler.finish([])
+    assert [detail["text"] for detail in message.reasoning_details] == ["thinking"]
@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+
+from tool_cache import ToolCache
+
+
+def _fresh_cache(tmp_path):
+    # ToolCache is a singleton; build a second instance around its own database.
+    cache = object.__new__(ToolCache)
+    cache.db_path = str(tmp_path / "cache.db")
+    cache._init_db()
+    return cache
+
+
+def _stored(cache, key):
+    with sqlite3.connect(cache.db_path) as conn:
+        return conn.execute("SELECT key FROM cache WHERE key = ?", (key,)).fetchone() is not None
+
+
+def test_failed_commit_is_retried(tmp_path, monkeypatch):
+    cache = _fresh_cache(tmp_path)
+    monkeypatch.setattr(cache, "retry_interval", 0.0)
+    write = cache._write
+    failures = [1]
+
+    def flaky_write(conn, rows, touched):
+        if failures[0]:
+            failures[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        write(conn, rows, touched)
+
+    monkeypatch.setattr(cache, "_write", flaky_write)
+    cache.set("search_v1:kept", "value")
+    assert cache.flush(5)
+    assert cache.get("search_v1:kept") == "value"
+    assert cache.flush(5)
+    assert _stored(cache, "search_v1:kept")
+    assert not cache._pending
+
+
+def test_failed_commit_does_not_overwrite_newer_value(tmp_path, monkeypatch):
+    cache = _fresh_cache(tmp_path)
+    monkeypatch.setattr(cache, "retry_interval", 0.0)
+    write = cache._write
+    failures = [1]
+
+    def flaky_write(conn, rows, touched):
+        if failures[0]:
+            failures[0] -= 1
+            cache.set("search_v1:key", "new")
+            raise sqlite3.OperationalError("database is locked")
+        write(conn, rows, touched)
+
+    monkeypatch.setattr(cache, "_write", flaky_write)
+    cache.set("search_v1:key", "old")
+    assert cache.flush(5) and cache.flush(5)
+    cache.l1.discard("search_v1:key")
+    assert cache.get("search_v1:key") == "new"
+
+
+def test_reads_during_writes_keep_every_write(tmp_path):
+    cache = _fresh_cache(tmp_path)
+    keys = [f"search_v1:{i}" for i in range(300)]
+    for key in keys[:50]:
+        cache.set(key, key)
+    cache.flush(5)
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            for key in keys[:50]:
+                cache.get_entry(key)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for key in keys[50:]:
+            cache.set(key, key)
+        assert cache.flush(10)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert all(_stored(cache, key) for key in keys)
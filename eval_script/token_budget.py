@@ -0,0 +1,56 @@
+import functools
+from typing import List, Tuple
+
+import tiktoken
+
+
+ENCODING_NAME = "cl100k_base"
+# Pre-cut before encoding: a page longer than max_tokens * PRECUT_CHARS_PER_TOKEN characters
+# is cut to that length first. cl100k averages ~4 characters per token on web text, so the
+# cut keeps enough text for the budget; if it does not, the full text is encoded instead.
+PRECUT_CHARS_PER_TOKEN = 8
+# Tokens near the pre-cut boundary may merge differently than in the full text, so the
+# pre-cut is only trusted when it yields at least this many tokens beyond the budget.
+PRECUT_MARGIN_TOKENS = 64
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME):
+    """tiktoken encodings are expensive to build; share one per process."""
+    return tiktoken.get_encoding(name)
+
+
+def encode_prefix(text: str, max_tokens: int, encoding_name: str = ENCODING_NAME) -> Tuple[List[int], bool]:
+    """Return the first `max_tokens` tokens of `text` and whether the text was longer,
+    without encoding the whole text."""
+    encoding = get_encoding(encoding_name)
+    precut = max_tokens * PRECUT_CHARS_PER_TOKEN
+    if len(text) > precut:
+        tokens = encoding.encode(text[:precut], disallowed_special=())
+        if len(tokens) >= max_tokens + PRECUT_MARGIN_TOKENS:
+            return tokens[:max_tokens], True
+    tokens = encoding.encode(text, disallowed_special=())
+    return tokens[:max_tokens], len(tokens) > max_tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int = 95000, encoding_name: str = ENCODING_NAME) -> str:
+    return TokenBudget(text, max_tokens, encoding_name).text
+
+
+class TokenBudget:
+    """A text cut to a token budget that can be shrunk further without re-encoding it."""
+
+    def __init__(self, text: str, max_tokens: int, encoding_name: str = ENCODING_NAME):
+        self.encoding_name = encoding_name
+        self.tokens, self.truncated = encode_prefix(text, max_tokens, encoding_name)
+        self.text = get_encoding(encoding_name).decode(self.tokens) if self.truncated else text
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def shrink(self, ratio: float) -> str:
+        """Keep the first `ratio` of the current tokens and return the new text."""
+        self.tokens = self.tokens[:int(len(self.tokens) * ratio)]
+        self.text = get_encoding(self.encoding_name).decode(self.tokens)
+        self.truncated = True
+        return self.text
@@ -0,0 +1,584 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+import argparse
+from collections import Counter, OrderedDict
+from typing import Optional, Tuple
+
+from tracing import traced
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Per-namespace bounds of the SQLite tier. `max_bytes` caps the namespace and evicts the
+# least recently used rows beyond it, `ttl_seconds` expires rows by `created_at`.
+# Either can be None. `codec` is how values are stored on disk: "zstd" (falls back to
+# zlib when `zstandard` is not installed), "zlib" or None for plain text.
+# Failed fetches are cached with a short TTL of their own (see FAILURE_POLICY), which a
+# namespace can override with the same keys.
+# Override with the TOOL_CACHE_POLICIES env var (same JSON layout).
+DEFAULT_POLICIES = {
+    "search_v1": {"max_bytes": 512 * 1024 ** 2, "ttl_seconds": 7 * 24 * 3600, "codec": "zlib"},
+    "visit_v1": {"max_bytes": 4 * 1024 ** 3, "ttl_seconds": 30 * 24 * 3600, "codec": "zstd"},
+    "visit_summary_v1": {"max_bytes": 1024 ** 3, "ttl_seconds": 30 * 24 * 3600, "codec": "zlib"},
+    "visit_chunk_v1": {"max_bytes": 1024 ** 3, "ttl_seconds": 30 * 24 * 3600, "codec": "zlib"},
+}
+
+# Status of a cached value. Transient failures (timeouts, 5xx, 429) expire after
+# `failure_ttl_seconds`, doubled for every consecutive failure of the key up to
+# `max_failure_ttl_seconds`; permanent failures (404, 410, 451, empty pages) after
+# `permanent_failure_ttl_seconds`. Until then the failure is served from the cache,
+# so an outage is neither stored for good nor retried on every step.
+STATUS_OK = "ok"
+STATUS_TRANSIENT = "transient"
+STATUS_PERMANENT = "permanent"
+FAILURE_POLICY = {
+    "failure_ttl_seconds": 60,
+    "max_failure_ttl_seconds": 3600,
+    "permanent_failure_ttl_seconds": 24 * 3600,
+}
+# Failed page reads that older versions cached as regular values.
+LEGACY_FAILURES = {"visit_v1": "[visit] Failed to read page."}
+
+
+def key_namespace(key: str) -> str:
+    return key.split(":", 1)[0] if ":" in key else ""
+
+
+class ValueCodec:
+    """Compression of cache values.
+
+    Every row records the codec (and zstd dictionary) it was written with, so rows
+    written with another codec, or before compression existed (codec NULL), stay
+    readable. zstd dictionaries live in the `cache_dicts` table.
+    """
+    min_size = 64
+    zlib_level = 6
+    zstd_level = 3
+
+    def __init__(self, policies: dict):
+        self.policies = policies
+        self._dicts = {}
+        self._latest_dict = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def codec_for(self, namespace: str) -> Optional[str]:
+        codec = self.policies.get(namespace, {}).get("codec")
+        if codec == "zstd" and zstandard is None:
+            return "zlib"
+        return codec
+
+    def load_dicts(self, conn: sqlite3.Connection):
+        with self._lock:
+            for dict_id, namespace, data in conn.execute("SELECT id, namespace, data FROM cache_dicts ORDER BY id"):
+                self._dicts[dict_id] = data
+                self._latest_dict[namespace] = dict_id
+
+    def add_dict(self, dict_id: int, namespace: str, data: bytes):
+        with self._lock:
+            self._dicts[dict_id] = data
+            self._latest_dict[namespace] = dict_id
+
+    def _zstd(self, kind: str, dict_id: Optional[int]):
+        # zstd (de)compressor objects are not thread-safe, so each thread keeps its own.
+        cache = self._local.__dict__.setdefault(kind, {})
+        if dict_id not in cache:
+            zdict = zstandard.ZstdCompressionDict(self._dicts[dict_id]) if dict_id is not None else None
+            if kind == "compressor":
+                cache[dict_id] = zstandard.ZstdCompressor(level=self.zstd_level, dict_data=zdict)
+            else:
+                cache[dict_id] = zstandard.ZstdDecompressor(dict_data=zdict)
+        return cache[dict_id]
+
+    def encode(self, namespace: str, value: str) -> Tuple[object, Optional[str], Optional[int]]:
+        """Return `(payload, codec, dict_id)` for storing `value`."""
+        codec = self.codec_for(namespace)
+        if codec is None or len(value) < self.min_size:
+            return value, None, None
+        data = value.encode("utf-8")
+        if codec == "zstd":
+            dict_id = self._latest_dict.get(namespace)
+            return self._zstd("compressor", dict_id).compress(data), "zstd", dict_id
+        return zlib.compress(data, self.zlib_level), "zlib", None
+
+    def decode(self, payload, codec: Optional[str], dict_id: Optional[int], conn: sqlite3.Connection = None) -> str:
+        if codec is None:
+            return payload
+        if codec == "zlib":
+            return zlib.decompress(payload).decode("utf-8")
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd compressed cache rows")
+            if dict_id is not None and dict_id not in self._dicts and conn is not None:
+                self.load_dicts(conn)
+            return self._zstd("decompressor", dict_id).decompress(payload).decode("utf-8")
+        raise ValueError(f"Unknown cache codec: {codec}")
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU bounded by entry count and total value size."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data.move_to_end(key)
+            return item
+
+    def put(self, key, item, size: int) -> int:
+        """Insert `item` and return how many entries were evicted to make room."""
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[-1]
+            self._data[key] = item + (size,)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, dropped = self._data.popitem(last=False)
+                self._bytes -= dropped[-1]
+                evicted += 1
+        return evicted
+
+    def discard(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[-1]
+
+
+class ToolCache:
+    """Process-wide two-tier cache for tool results.
+
+    The L1 tier is a bounded in-process LRU, so repeated lookups from concurrent
+    agents never reach SQLite. The L2 tier is SQLite: every thread reads through
+    its own persistent connection, the database runs in WAL mode so readers never
+    block the writer, and `set` only enqueues the write: a background thread drains
+    the queue, group-commits it, records access times for LRU and periodically
+    enforces the per-namespace size caps and TTLs. Values that are queued but not
+    yet committed are served from `_pending`, so a `get` always sees the latest `set`;
+    the writes of a failed commit stay there and are retried with the next batch.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    max_batch_size = 256
+    maintenance_interval = 30.0
+    retry_interval = 1.0
+
+    def __new__(cls, db_path=None):
+        if not cls._instance:
+            with cls._lock:
+                if not cls._instance:
+                    cls._instance = super(ToolCache, cls).__new__(cls)
+                    cls._instance.db_path = db_path or os.getenv("TOOL_CACHE_PATH", "tool_cache.db")
+                    cls._instance._init_db()
+        return cls._instance
+
+    def _init_db(self):
+        self._local = threading.local()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._touched = {}
+
+        self.policies = {k: dict(v) for k, v in DEFAULT_POLICIES.items()}
+        for namespace, policy in json.loads(os.getenv("TOOL_CACHE_POLICIES", "{}")).items():
+            self.policies.setdefault(namespace, {}).update(policy)
+        self.codec = ValueCodec(self.policies)
+        self.l1 = LRUCache(
+            max_entries=int(os.getenv("TOOL_CACHE_L1_ENTRIES", 4096)),
+            max_bytes=int(os.getenv("TOOL_CACHE_L1_MB", 512)) * 1024 ** 2,
+        )
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+        conn = self._get_conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self._migrate(conn)
+        conn.commit()
+        self.codec.load_dicts(conn)
+
+        self._writer = threading.Thread(target=self._writer_loop, name="ToolCacheWriter", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Add the bookkeeping columns to databases created before eviction existed."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+        if "namespace" not in columns:
+            conn.execute("ALTER TABLE cache ADD COLUMN namespace TEXT")
+            conn.execute("UPDATE cache SET namespace = CASE WHEN instr(key, ':') > 0 THEN substr(key, 1, instr(key, ':') - 1) ELSE '' END")
+        if "size" not in columns:
+            conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER")
+            conn.execute("UPDATE cache SET size = length(CAST(value AS BLOB))")
+        if "last_access" not in columns:
+            conn.execute("ALTER TABLE cache ADD COLUMN last_access REAL")
+            conn.execute("UPDATE cache SET last_access = CAST(strftime('%s', created_at) AS REAL)")
+        if "codec" not in columns:
+            conn.execute("ALTER TABLE cache ADD COLUMN codec TEXT")
+            conn.execute("ALTER TABLE cache ADD COLUMN dict_id INTEGER")
+        if "status" not in columns:
+            conn.execute("ALTER TABLE cache ADD COLUMN status TEXT")
+            conn.execute("ALTER TABLE cache ADD COLUMN failures INTEGER")
+            # Short values are stored uncompressed, so failed reads cached by older versions can be
+            # found in SQL; they become transient failures and are retried after the failure TTL.
+            for namespace, value in LEGACY_FAILURES.items():
+                conn.execute(
+                    "UPDATE cache SET status = ?, failures = 1 WHERE namespace = ? AND codec IS NULL AND value = ?",
+                    (STATUS_TRANSIENT, namespace, value)
+                )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache (namespace, last_access)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_dicts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT,
+                data BLOB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _get_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def record_stat(self, namespace: str, name: str, n: int = 1):
+        """Add `n` to a per-namespace counter reported by `stats`."""
+        if n:
+            with self._stats_lock:
+                self._stats[(namespace, name)] += n
+
+    def _ttl(self, namespace: str, status: Optional[str], failures: Optional[int]) -> Optional[float]:
+        policy = self.policies.get(namespace, {})
+        ttl = policy.get("ttl_seconds")
+        if status in (None, STATUS_OK):
+            return ttl
+        policy = {**FAILURE_POLICY, **policy}
+        if status == STATUS_PERMANENT:
+            failure_ttl = policy["permanent_failure_ttl_seconds"]
+        else:
+            failure_ttl = min(policy["failure_ttl_seconds"] * 2 ** max(0, (failures or 1) - 1), policy["max_failure_ttl_seconds"])
+        return min(ttl, failure_ttl) if ttl else failure_ttl
+
+    def _expired(self, namespace: str, created_at: float, status: Optional[str] = None, failures: Optional[int] = None) -> bool:
+        ttl = self._ttl(namespace, status, failures)
+        return bool(ttl) and created_at is not None and time.time() - created_at > ttl
+
+    def _count_lookup(self, namespace: str, tier: str, status: str):
+        self.record_stat(namespace, tier if status == STATUS_OK else "negative_hits")
+
+    def _touch(self, key: str):
+        # The writer swaps `_touched` out under the same lock.
+        with self._pending_lock:
+            self._touched[key] = time.time()
+
+    @traced("cache.get", cat="cache")
+    def get_entry(self, key: str) -> Optional[Tuple[str, str]]:
+        """`(value, status)` of a live entry, including cached failures, or None."""
+        namespace = key_namespace(key)
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            value, status, _ = pending
+            self._count_lookup(namespace, "l1_hits", status)
+            return value, status
+
+        item = self.l1.get(key)
+        if item is not None:
+            value, created_at, status, failures, _ = item
+            if not self._expired(namespace, created_at, status, failures):
+                self._count_lookup(namespace, "l1_hits", status)
+                self._touch(key)
+                return value, status
+            self.l1.discard(key)
+
+        try:
+            conn = self._get_conn()
+            cursor = conn.execute(
+                "SELECT value, CAST(strftime('%s', created_at) AS REAL), codec, dict_id, status, failures FROM cache WHERE key = ?", (key,)
+            )
+            row = cursor.fetchone()
+            if row is None or self._expired(namespace, row[1], row[4], row[5]):
+                self.record_stat(namespace, "misses")
+                return None
+            value = self.codec.decode(row[0], row[2], row[3], conn)
+        except Exception as e:
+            print(f"[Cache Read Error] {e}")
+            return None
+
+        status = row[4] or STATUS_OK
+        self._count_lookup(namespace, "l2_hits", status)
+        self._touch(key)
+        self.record_stat(namespace, "l1_evictions", self.l1.put(key, (value, row[1], status, row[5]), len(value)))
+        return value, status
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached value of `key`; cached failures are not returned."""
+        entry = self.get_entry(key)
+        if entry is None or entry[1] != STATUS_OK:
+            return None
+        return entry[0]
+
+    def _failure_count(self, key: str) -> int:
+        """Consecutive failures recorded for `key` so far, expired or not."""
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            return pending[2] or 0
+        try:
+            row = self._get_conn().execute("SELECT status, failures FROM cache WHERE key = ?", (key,)).fetchone()
+        except Exception as e:
+            print(f"[Cache Read Error] {e}")
+            return 0
+        if row is None or row[0] in (None, STATUS_OK):
+            return 0
+        return row[1] or 0
+
+    def set(self, key: str, value: str, status: str = STATUS_OK):
+        """Store `value`; a failure (`STATUS_TRANSIENT` / `STATUS_PERMANENT`) is kept for its short TTL."""
+        namespace = key_namespace(key)
+        failures = None if status == STATUS_OK else self._failure_count(key) + 1
+        entry = (value, status, failures)
+        with self._pending_lock:
+            self._pending[key] = entry
+        self.record_stat(namespace, "sets" if status == STATUS_OK else "negative_sets")
+        self.record_stat(namespace, "l1_evictions", self.l1.put(key, (value, time.time(), status, failures), len(value)))
+        self._queue.put((key, entry))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every write queued before this call is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters per namespace, with the L1 / overall hit ratios."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        report = {}
+        for (namespace, name), value in snapshot.items():
+            report.setdefault(namespace or "<none>", Counter())[name] += value
+        for namespace, counters in report.items():
+            lookups = counters["l1_hits"] + counters["l2_hits"] + counters["misses"]
+            counters = dict(counters)
+            counters["hit_ratio"] = round((counters.get("l1_hits", 0) + counters.get("l2_hits", 0)) / lookups, 4) if lookups else 0.0
+            report[namespace] = counters
+        return report
+
+    def _writer_loop(self):
+        conn = self._connect()
+        last_maintenance = 0.0
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.maintenance_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [item for item in batch if isinstance(item, tuple)]
+            with self._pending_lock:
+                touched, self._touched = self._touched, {}
+            try:
+                self._write(conn, rows, touched)
+            except Exception as e:
+                print(f"[Cache Write Error] {e}, retrying {len(rows)} writes with the next batch")
+                conn.rollback()
+                self._requeue(rows, touched)
+                time.sleep(self.retry_interval)
+            else:
+                if rows:
+                    with self._pending_lock:
+                        for key, entry in rows:
+                            # A newer value for the same key may already be queued behind this batch.
+                            if self._pending.get(key) is entry:
+                                del self._pending[key]
+
+            if time.time() - last_maintenance >= self.maintenance_interval:
+                self._evict(conn)
+                last_maintenance = time.time()
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, conn: sqlite3.Connection, rows, touched: dict):
+        if rows:
+            now = time.time()
+            records = []
+            for key, (value, status, failures) in rows:
+                payload, codec, dict_id = self.codec.encode(key_namespace(key), value)
+                size = len(payload) if codec else len(value.encode("utf-8"))
+                records.append((key, payload, key_namespace(key), size, now, codec, dict_id, status, failures))
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, namespace, size, last_access, codec, dict_id, status, failures) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+        if touched:
+            conn.executemany("UPDATE cache SET last_access = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+        conn.commit()
+
+    def _requeue(self, rows, touched: dict):
+        """Put the writes of a failed commit back; they stay in `_pending` until one succeeds."""
+        with self._pending_lock:
+            for key, t in touched.items():
+                self._touched.setdefault(key, t)
+            # Rows that a newer `set` replaced are not written again, so they cannot overwrite it.
+            rows = [(key, entry) for key, entry in rows if self._pending.get(key) is entry]
+        for row in rows:
+            self._queue.put(row)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Apply the TTL and LRU size cap of every namespace that has a policy."""
+        for namespace, policy in self.policies.items():
+            try:
+                evicted = []
+                ttl = policy.get("ttl_seconds")
+                if ttl:
+                    evicted += [row[0] for row in conn.execute(
+                        "SELECT key FROM cache WHERE namespace = ? AND created_at < datetime('now', ?)",
+                        (namespace, f"-{int(ttl)} seconds")
+                    )]
+                max_bytes = policy.get("max_bytes")
+                if max_bytes:
+                    total = conn.execute(
+                        "SELECT COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (namespace,)
+                    ).fetchone()[0]
+                    # Evict down to 90% of the cap so the next writes do not trigger another pass.
+                    excess = total - int(max_bytes * 0.9) if total > max_bytes else 0
+                    expired = set(evicted)
+                    for key, size in conn.execute(
+                        "SELECT key, size FROM cache WHERE namespace = ? ORDER BY last_access ASC", (namespace,)
+                    ):
+                        if excess <= 0:
+                            break
+                        if key not in expired:
+                            evicted.append(key)
+                        excess -= size or 0
+                if evicted:
+                    conn.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in evicted])
+                    conn.commit()
+                    for key in evicted:
+                        self.l1.discard(key)
+                    self.record_stat(namespace, "evictions", len(evicted))
+                    print(f"[Cache] Evicted {len(evicted)} entries from {namespace}")
+            except Exception as e:
+                print(f"[Cache Evict Error] {e}")
+                conn.rollback()
+
+    def train_dictionary(self, namespace: str, dict_size: int = 112640, max_samples: int = 2000) -> Optional[int]:
+        """Train a zstd dictionary on cached values of `namespace`; new writes use it."""
+        if self.codec.codec_for(namespace) != "zstd":
+            print(f"[Cache] {namespace} does not use zstd, skip dictionary training")
+            return None
+        self.flush()
+        conn = self._connect()
+        samples = []
+        for payload, codec, dict_id in conn.execute(
+            "SELECT value, codec, dict_id FROM cache WHERE namespace = ? ORDER BY RANDOM() LIMIT ?", (namespace, max_samples)
+        ):
+            samples.append(self.codec.decode(payload, codec, dict_id, conn).encode("utf-8"))
+        if len(samples) < 10:
+            print(f"[Cache] Not enough samples in {namespace} to train a dictionary")
+            return None
+        data = zstandard.train_dictionary(dict_size, samples).as_bytes()
+        cursor = conn.execute("INSERT INTO cache_dicts (namespace, data) VALUES (?, ?)", (namespace, data))
+        conn.commit()
+        self.codec.add_dict(cursor.lastrowid, namespace, data)
+        print(f"[Cache] Trained a {len(data)} byte dictionary for {namespace} on {len(samples)} samples")
+        return cursor.lastrowid
+
+    def recompress(self, namespace: Optional[str] = None, train: bool = True, batch_size: int = 500) -> dict:
+        """Re-encode stored rows with the current codec of their namespace, then VACUUM the file."""
+        namespaces = [namespace] if namespace else list(self.policies)
+        if train:
+            for ns in namespaces:
+                self.train_dictionary(ns)
+        self.flush()
+        conn = self._connect()
+        report = {}
+        for ns in namespaces:
+            before = after = rows = 0
+            last_rowid = 0
+            while True:
+                batch = conn.execute(
+                    "SELECT rowid, value, codec, dict_id, size FROM cache WHERE namespace = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                    (ns, last_rowid, batch_size)
+                ).fetchall()
+                if not batch:
+                    break
+                updates = []
+                for rowid, payload, codec, dict_id, size in batch:
+                    value = self.codec.decode(payload, codec, dict_id, conn)
+                    new_payload, new_codec, new_dict_id = self.codec.encode(ns, value)
+                    new_size = len(new_payload) if new_codec else len(value.encode("utf-8"))
+                    before += size or 0
+                    after += new_size
+                    updates.append((new_payload, new_codec, new_dict_id, new_size, rowid))
+                conn.executemany("UPDATE cache SET value = ?, codec = ?, dict_id = ?, size = ? WHERE rowid = ?", updates)
+                conn.commit()
+                rows += len(batch)
+                last_rowid = batch[-1][0]
+            report[ns] = {"rows": rows, "bytes_before": before, "bytes_after": after}
+            print(f"[Cache] Recompressed {rows} rows of {ns}: {before} -> {after} bytes")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ToolCache maintenance")
+    parser.add_argument("command", choices=["recompress", "train-dict", "stats"])
+    parser.add_argument("--db_path", type=str, default=os.getenv("TOOL_CACHE_PATH", "tool_cache.db"))
+    parser.add_argument("--namespace", type=str, default=None, help="limit to one namespace, e.g. visit_v1")
+    parser.add_argument("--no_train", action="store_true", help="recompress without training a new zstd dictionary")
+    args = parser.parse_args()
+
+    cache = ToolCache(db_path=args.db_path)
+    if args.command == "recompress":
+        print(json.dumps(cache.recompress(namespace=args.namespace, train=not args.no_train), indent=4))
+    elif args.command == "train-dict":
+        for ns in ([args.namespace] if args.namespace else list(cache.policies)):
+            cache.train_dictionary(ns)
+    else:
+        conn = cache._connect()
+        rows = conn.execute("SELECT namespace, codec, COUNT(*), SUM(size) FROM cache GROUP BY namespace, codec").fetchall()
+        for namespace, codec, count, size in rows:
+            print(f"{namespace or '<none>'}\t{codec or 'plain'}\t{count} rows\t{size} bytes")
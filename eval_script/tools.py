@@ -7,78 +7,221 @@ import requests
 import asyncio
 import uuid
 import http.client
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from typing import List, Union
 import requests
+import httpx
 from openai import OpenAI
 import random
 from urllib.parse import urlparse, unquote
 import time 
-import tiktoken
-from utils import build_client, generate_response
-from prompts import EXTRACTOR_PROMPT 
+from utils import get_client, get_async_client, get_http_session, get_async_http_client, generate_response, agenerate_response
+from prompts import EXTRACTOR_PROMPT, REDUCE_PROMPT
+from tool_cache import ToolCache, STATUS_OK, STATUS_PERMANENT, STATUS_TRANSIENT
+from token_budget import TokenBudget, encode_prefix, truncate_to_tokens
+from chunk_filter import MAX_SCAN_CHARS, ChunkBudget, bm25_scores, split_chunks
+from rate_limit import get_limiter, parse_retry_after, retry_after_from_error
+from context_compaction import estimate_tokens
+from tracing import propagate, span, traced
+from single_flight import get_flight, spawn
+from metrics import METRICS
 from dotenv import load_dotenv
 import io
 import sys
-import sqlite3
 import threading
 import hashlib
 import re
 import json_repair
 
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+# Reconfigured in place rather than rewrapped, so redirected or captured streams keep working.
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
 
 JINA_API_KEYS = os.getenv("JINA_API_KEY", "")
 SERPER_KEY = os.getenv('SERPER_API_KEY', "")
+# Point these at replay_server.py to run without the live services.
+SERPER_BASE_URL = os.getenv('SERPER_BASE_URL', "https://google.serper.dev").rstrip("/")
+JINA_BASE_URL = os.getenv('JINA_BASE_URL', "https://r.jina.ai").rstrip("/")
 SUMMARY_API_KEY = os.getenv('SUMMARY_API_KEY', "")
 SUMMARY_API_BASE_URL = os.getenv('SUMMARY_API_BASE_URL', "")
 SUMMARY_MODEL_NAME = os.getenv('SUMMARY_MODEL_NAME', "")
+# Queries per batched Serper request (Serper accepts up to 100); 1 sends one request per query.
+SERPER_BATCH_SIZE = int(os.getenv('SERPER_BATCH_SIZE', 100))
+# Threads shared by every agent for searches that are not batched.
+SEARCH_MAX_PARALLEL = int(os.getenv('SEARCH_MAX_PARALLEL', 32))
+# Fan-out and wall-clock budget of one multi-URL visit call.
+VISIT_MAX_PARALLEL = int(os.getenv('VISIT_MAX_PARALLEL', 5))
+VISIT_TIMEOUT = float(os.getenv('VISIT_TIMEOUT', 900))
+# Threads shared by every agent for the pages of visit calls, and for their chunk extractions; the
+# minimum, `configure_executors` grows them to the number of questions that run at once.
+VISIT_PAGE_WORKERS = int(os.getenv('VISIT_PAGE_WORKERS', 32))
+SUMMARY_MAX_PARALLEL = int(os.getenv('SUMMARY_MAX_PARALLEL', 32))
+# Token budget of the page chunks that best match the goal, sent to the extractor instead of
+# the first 95k tokens of the page (0, the default, keeps the first 95k tokens).
+VISIT_CHUNK_BUDGET_TOKENS = int(os.getenv('VISIT_CHUNK_BUDGET_TOKENS', 0))
+VISIT_CHUNK_TOKENS = int(os.getenv('VISIT_CHUNK_TOKENS', 512))
+# Pages longer than this many tokens are extracted chunk by chunk and merged by a reduce call (0 = off).
+VISIT_MAP_REDUCE_TOKENS = int(os.getenv('VISIT_MAP_REDUCE_TOKENS', 0))
+VISIT_MAP_CHUNK_TOKENS = int(os.getenv('VISIT_MAP_CHUNK_TOKENS', 32000))
+# Concurrent chunk extractions per page, and chunks per page (the best matches for the goal beyond that).
+VISIT_MAP_FANOUT = int(os.getenv('VISIT_MAP_FANOUT', 4))
+VISIT_MAP_MAX_CHUNKS = int(os.getenv('VISIT_MAP_MAX_CHUNKS', 16))
+# Summaries cached under visit_summary_v1 are only reused with the same extractor prompt.
+EXTRACTOR_PROMPT_VERSION = hashlib.sha256(EXTRACTOR_PROMPT.encode('utf-8')).hexdigest()[:12]
+REDUCE_PROMPT_VERSION = hashlib.sha256(REDUCE_PROMPT.encode('utf-8')).hexdigest()[:12]
 
+# Structured output requested from the summary model: "json_schema", "json_object" or "none".
+# Endpoints that reject it are remembered and asked without it.
+SUMMARY_RESPONSE_FORMAT = os.getenv('SUMMARY_RESPONSE_FORMAT', "json_schema")
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rational": {"type": "string"},
+        "evidence": {"type": "string"},
+        "summary": {"type": "string"}
+    },
+    "required": ["rational", "evidence", "summary"],
+    "additionalProperties": False
+}
 
-class ToolCache:
-    _instance = None
-    _lock = threading.Lock()
-
-    def __new__(cls, db_path="tool_cache.db"):
-        if not cls._instance:
-            with cls._lock:
-                if not cls._instance:
-                    cls._instance = super(ToolCache, cls).__new__(cls)
-                    cls._instance.db_path = db_path
-                    cls._instance._init_db()
-        return cls._instance
-
-    def _init_db(self):
-        with sqlite3.connect(self.db_path, check_same_thread=False) as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS cache (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
+_search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_PARALLEL, thread_name_prefix="search")
+# Pages and summaries have pools of their own: a page waits on its summaries, so they cannot share one.
+_page_executor = ThreadPoolExecutor(max_workers=VISIT_PAGE_WORKERS, thread_name_prefix="visit")
+_summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_MAX_PARALLEL, thread_name_prefix="summary")
+_response_format_unsupported = set()
 
-    def get(self, key: str) -> Optional[str]:
-        try:
-            with sqlite3.connect(self.db_path, check_same_thread=False) as conn:
-                cursor = conn.execute("SELECT value FROM cache WHERE key = ?", (key,))
-                row = cursor.fetchone()
-                return row[0] if row else None
-        except Exception as e:
-            print(f"[Cache Read Error] {e}")
-            return None
 
-    def set(self, key: str, value: str):
-        with self._lock:
-            try:
-                with sqlite3.connect(self.db_path, check_same_thread=False) as conn:
-                    conn.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, value))
-                    conn.commit()
-            except Exception as e:
-                print(f"[Cache Write Error] {e}")
+def configure_executors(concurrent_questions: int):
+    """Size the shared page and summary pools for `concurrent_questions` questions, each of which
+    can visit VISIT_MAX_PARALLEL pages at once. Call before the run starts; returns the sizes."""
+    global _page_executor, _summary_executor
+    pages = max(VISIT_PAGE_WORKERS, concurrent_questions * VISIT_MAX_PARALLEL)
+    summaries = SUMMARY_MAX_PARALLEL
+    if VISIT_MAP_REDUCE_TOKENS > 0:
+        # Only map-reduce pages fan their summary calls out to the pool.
+        summaries = max(summaries, pages * VISIT_MAP_FANOUT)
+    # Threads are started on demand, so a large pool costs nothing until it is used.
+    _page_executor.shutdown(wait=False)
+    _summary_executor.shutdown(wait=False)
+    _page_executor = ThreadPoolExecutor(max_workers=pages, thread_name_prefix="visit")
+    _summary_executor = ThreadPoolExecutor(max_workers=summaries, thread_name_prefix="summary")
+    return pages, summaries
+
+
+def _advance(steps, value=None):
+    """`steps.send(value)` as `(finished, yielded or returned value)`, which can be run in a thread."""
+    try:
+        return False, steps.send(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def _submit_bounded(executor, fn, items, limit, timeout=None):
+    """Run `fn(item)` for every item on a shared `executor`, at most `limit` at a time.
+
+    Returns one future per item, None for items not started within `timeout`.
+    Futures still pending at the timeout are cancelled if they have not started.
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    futures = [None] * len(items)
+    running = set()
+    next_idx = 0
+    while next_idx < len(items) or running:
+        while next_idx < len(items) and len(running) < max(1, limit):
+            futures[next_idx] = executor.submit(propagate(fn), items[next_idx])
+            running.add(futures[next_idx])
+            next_idx += 1
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+            break
+        done, running = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+    for future in running:
+        future.cancel()
+    return futures
+
+
+class VisitDeadlineExceeded(TimeoutError):
+    """A page stopped at the visit deadline, with the summary tokens it had spent until then."""
+
+    def __init__(self, url: str, input_tokens: int, output_tokens: int):
+        super().__init__(f"visit deadline exceeded for {url}")
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+def _summary_tokens(outcome):
+    """`(input_tokens, output_tokens)` of a summary call, or of the calls of a `SummaryBatch`."""
+    results = outcome if isinstance(outcome, list) else [outcome]
+    return sum(r[1] for r in results), sum(r[2] for r in results)
+
+
+def _record_unaccounted_tokens(input_tokens: int, output_tokens: int):
+    # Spent by pages that finished after their visit call returned, so not in any step's token_stats.
+    METRICS.inc("visit_unaccounted_input_tokens_total", input_tokens)
+    METRICS.inc("visit_unaccounted_output_tokens_total", output_tokens)
+
+
+def _count_late_page(future):
+    """Done-callback of a page still running at the visit deadline."""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        _, input_tokens, output_tokens = future.result()
+    elif isinstance(error, VisitDeadlineExceeded):
+        input_tokens, output_tokens = error.input_tokens, error.output_tokens
+    else:
+        return
+    _record_unaccounted_tokens(input_tokens, output_tokens)
+
+
+class SummaryBatch(list):
+    """Extractor messages of several calls that the driver of `Visit._summarize_page` runs concurrently."""
+
+
+# Statuses that say the URL or query itself is bad, and will be again on the next request.
+PERMANENT_STATUS_CODES = (404, 410, 451)
+# Statuses about the account (bad key, no credits, blocked) rather than the request.
+ACCOUNT_STATUS_CODES = (401, 402, 403)
+
+
+def _serper_json(response, limiter):
+    """JSON body of a Serper response; a 429 holds back every caller of the endpoint."""
+    if response.status_code == 429:
+        limiter.penalize(parse_retry_after(response.headers) or 1.0)
+    response.raise_for_status()
+    return response.json()
+
+
+def failure_status(status_code: Optional[int]) -> Optional[str]:
+    """Cache status of a failed request, or None when the failure is not to be cached.
+
+    Account errors say nothing about the URL or query, so caching them would
+    turn one outage of the key into failures of every page touched meanwhile.
+    """
+    if status_code in ACCOUNT_STATUS_CODES:
+        return None
+    if status_code in PERMANENT_STATUS_CODES:
+        return STATUS_PERMANENT
+    return STATUS_TRANSIENT
+
+
+def _error_status_code(error: Exception) -> Optional[int]:
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+def summary_response_format(base_url: str) -> Optional[dict]:
+    """`response_format` of extractor calls to `base_url`, None when it is not to be sent."""
+    if base_url in _response_format_unsupported:
+        return None
+    if SUMMARY_RESPONSE_FORMAT == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": "page_extraction", "schema": EXTRACTION_SCHEMA, "strict": True}}
+    if SUMMARY_RESPONSE_FORMAT == "json_object":
+        return {"type": "json_object"}
+    return None
 
 
 class BaseTool(ABC):
@@ -109,6 +252,13 @@ class BaseTool(ABC):
         """
         raise NotImplementedError
 
+    async def acall(self, params: Union[str, dict], **kwargs) -> Union[str, list, dict, List]:
+        """Coroutine version of `call`, used by the async agent.
+
+        Tools without a native async workflow fall back to running `call` in a worker thread.
+        """
+        return await asyncio.to_thread(self.call, params, **kwargs)
+
     def _verify_json_format_args(self, params: Union[str, dict], strict_json: bool = False) -> dict:
         """Verify the parameters of the function call"""
         if isinstance(params, str):
@@ -182,19 +332,13 @@ class Search(BaseTool):
         super().__init__(cfg)
         self.api_key = SERPER_KEY
         self.cache = ToolCache()  
+        self.flight = get_flight("search")
 
-    def google_search_with_serp(self, query: str):
-        cache_key = f"search_v1:{query.strip()}"
-        
-        cached_result = self.cache.get(cache_key)
-        if cached_result:
-            print(f"[Search] Cache hit for: {query[:20]}...")
-            return cached_result
-
+    def _build_request(self, query: str):
         def contains_chinese_basic(text: str) -> bool:
             return any('\u4E00' <= char <= '\u9FFF' for char in text)
 
-        url = "https://google.serper.dev/search"
+        url = f"{SERPER_BASE_URL}/search"
         
         payload_dict = {"q": query}
         if contains_chinese_basic(query):
@@ -206,18 +350,14 @@ class Search(BaseTool):
             'X-API-KEY': self.api_key, 
             'Content-Type': 'application/json'
         }
+        return url, headers, payload_dict
 
-        try:
-            response = requests.post(url, headers=headers, json=payload_dict, timeout=(3, 10))
-            response.raise_for_status() 
-            results = response.json()
-        except Exception as e:
-            print(f"Error searching for '{query}': {e}")
-            return f"Google search failed for '{query}'. Error: {e}"
-
+    def _format_results(self, query: str, results: dict, cache_key: str) -> str:
         try:
             if "organic" not in results:
-                return f"No organic results found for query: '{query}'."
+                content = f"No organic results found for query: '{query}'."
+                self.cache.set(cache_key, content, STATUS_PERMANENT)
+                return content
 
             web_snippets = []
             idx = 0
@@ -241,7 +381,225 @@ class Search(BaseTool):
         except Exception as e:
             return f"Error parsing results for '{query}'. {e}"
 
-    def call(self, params: Union[str, dict], **kwargs) -> str:
+    def _cached_search(self, query: str) -> Optional[str]:
+        entry = self.cache.get_entry(f"search_v1:{query.strip()}")
+        if entry is None or not entry[0]:
+            return None
+        cached_result, status = entry
+        if status == STATUS_OK:
+            print(f"[Search] Cache hit for: {query[:20]}...")
+        else:
+            print(f"[Search] Cached {status} failure for: {query[:20]}...")
+        return cached_result
+
+    def _search_failed(self, query: str, error: Exception) -> str:
+        print(f"Error searching for '{query}': {error}")
+        content = f"Google search failed for '{query}'. Error: {error}"
+        status = failure_status(_error_status_code(error))
+        if status is not None:
+            self.cache.set(f"search_v1:{query.strip()}", content, status)
+        return content
+
+    def _search_uncoalesced(self, query: str):
+        return self._cached_search(query) or self._fetch_search(query)
+
+    async def _asearch_uncoalesced(self, query: str):
+        return await asyncio.to_thread(self._cached_search, query) or await self._afetch_search(query)
+
+    def google_search_with_serp(self, query: str):
+        # Concurrent searches for the same query, from any agent, share one lookup and request.
+        return self.flight.do(f"search_v1:{query.strip()}", self._search_uncoalesced, query)
+
+    @traced("search.query", cat="tool")
+    def _fetch_search(self, query: str):
+        url, headers, payload_dict = self._build_request(query)
+        try:
+            session = get_http_session(SERPER_BASE_URL, self.api_key)
+            limiter = get_limiter(url)
+            limiter.acquire()
+            results = _serper_json(session.post(url, headers=headers, json=payload_dict, timeout=(3, 10)), limiter)
+        except Exception as e:
+            return self._search_failed(query, e)
+        return self._format_results(query, results, f"search_v1:{query.strip()}")
+
+    async def agoogle_search_with_serp(self, query: str):
+        return await self.flight.ado(f"search_v1:{query.strip()}", self._asearch_uncoalesced, query)
+
+    @traced("search.query", cat="tool")
+    async def _afetch_search(self, query: str):
+        url, headers, payload_dict = self._build_request(query)
+        try:
+            client = get_async_http_client(SERPER_BASE_URL, self.api_key)
+            limiter = get_limiter(url)
+            await limiter.aacquire()
+            response = await client.post(url, headers=headers, json=payload_dict, timeout=httpx.Timeout(10, connect=3))
+            results = _serper_json(response, limiter)
+        except Exception as e:
+            return await asyncio.to_thread(self._search_failed, query, e)
+        return await asyncio.to_thread(self._format_results, query, results, f"search_v1:{query.strip()}")
+
+    def _build_batch_request(self, queries: List[str]):
+        url, headers, _ = self._build_request(queries[0])
+        return url, headers, [self._build_request(q)[2] for q in queries]
+
+    def _batch_results(self, queries: List[str], results) -> Dict[str, str]:
+        if not isinstance(results, list) or len(results) != len(queries):
+            raise ValueError(f"expected {len(queries)} results, got {type(results).__name__}")
+        return {q: self._format_results(q, r, f"search_v1:{q.strip()}") for q, r in zip(queries, results)}
+
+    def _batch_failed(self, batch: List[str], error: Exception):
+        print(f"[Search] Batched request for {len(batch)} queries failed, searching one by one: {error}")
+        METRICS.inc("search_batch_fallbacks_total")
+
+    def _fetch_batch(self, batch: List[str]) -> Dict[str, str]:
+        if len(batch) == 1:
+            return self._search_each(batch, self._fetch_search)
+        url, headers, payload = self._build_batch_request(batch)
+        try:
+            session = get_http_session(SERPER_BASE_URL, self.api_key)
+            limiter = get_limiter(url)
+            limiter.acquire()
+            results = _serper_json(session.post(url, headers=headers, json=payload, timeout=(3, 10)), limiter)
+            results_map = self._batch_results(batch, results)
+        except Exception as e:
+            self._batch_failed(batch, e)
+            return self._search_each(batch, self._fetch_search)
+        METRICS.inc("search_batches_total")
+        return results_map
+
+    async def _afetch_batch(self, batch: List[str]) -> Dict[str, str]:
+        if len(batch) == 1:
+            return await self._asearch_each(batch, self._afetch_search)
+        url, headers, payload = self._build_batch_request(batch)
+        try:
+            client = get_async_http_client(SERPER_BASE_URL, self.api_key)
+            limiter = get_limiter(url)
+            await limiter.aacquire()
+            response = await client.post(url, headers=headers, json=payload, timeout=httpx.Timeout(10, connect=3))
+            results_map = await asyncio.to_thread(self._batch_results, batch, _serper_json(response, limiter))
+        except Exception as e:
+            self._batch_failed(batch, e)
+            return await self._asearch_each(batch, self._afetch_search)
+        METRICS.inc("search_batches_total")
+        return results_map
+
+    def _begin(self, queries: List[str]):
+        """The queries this caller leads (it looks them up and fetches them), and the flight future of every query."""
+        leads = []
+        in_flight = {}
+        for q in queries:
+            future, leader = self.flight.begin(f"search_v1:{q.strip()}")
+            in_flight[q] = future
+            if leader:
+                leads.append(q)
+        return leads, in_flight
+
+    def _lookup(self, queries: List[str]) -> Dict[str, str]:
+        results_map = {}
+        for q in queries:
+            cached_result = self._cached_search(q)
+            if cached_result:
+                results_map[q] = cached_result
+        return results_map
+
+    def _release(self, leads: List[str], results_map: Dict[str, str], error: Optional[BaseException] = None):
+        for q in leads:
+            if q in results_map:
+                self.flight.finish(f"search_v1:{q.strip()}", results_map[q])
+            else:
+                self.flight.finish(f"search_v1:{q.strip()}", error=error or RuntimeError(f"no result for '{q}'"))
+
+    def _fetch_claimed(self, leads: List[str]):
+        """Look up the queries this caller leads, fetch the misses and finish their flights with the results."""
+        results_map = {}
+        try:
+            results_map.update(self._lookup(leads))
+            misses = [q for q in leads if q not in results_map]
+            for start in range(0, len(misses), SERPER_BATCH_SIZE):
+                results_map.update(self._fetch_batch(misses[start:start + SERPER_BATCH_SIZE]))
+        except BaseException as e:
+            self._release(leads, results_map, e)
+            raise
+        self._release(leads, results_map)
+
+    async def _afetch_claimed(self, leads: List[str]):
+        results_map = {}
+        try:
+            results_map.update(await asyncio.to_thread(self._lookup, leads))
+            misses = [q for q in leads if q not in results_map]
+            for start in range(0, len(misses), SERPER_BATCH_SIZE):
+                results_map.update(await self._afetch_batch(misses[start:start + SERPER_BATCH_SIZE]))
+        except Exception as e:
+            self._release(leads, results_map, e)
+            return
+        except BaseException as e:
+            self._release(leads, results_map, e)
+            raise
+        self._release(leads, results_map)
+
+    @traced("search.batch", cat="tool")
+    def google_search_batch(self, queries: List[str]) -> Dict[str, str]:
+        """Results of several distinct queries; cache misses go to Serper in one batched request.
+
+        If the batched request fails, the missed queries are searched one by one, so every query
+        ends up with the same output as `google_search_with_serp` would give it. Queries that
+        another agent is fetching at the same moment are not sent again; their result is shared.
+        """
+        leads, in_flight = self._begin(queries)
+        self._fetch_claimed(leads)
+
+        results_map = {}
+        for q, future in in_flight.items():
+            try:
+                results_map[q] = future.result()
+            except Exception as exc:
+                results_map[q] = f"Search generated an exception: {exc}"
+        return results_map
+
+    @traced("search.batch", cat="tool")
+    async def agoogle_search_batch(self, queries: List[str]) -> Dict[str, str]:
+        leads, in_flight = self._begin(queries)
+        if leads:
+            # Its own task, awaited through the flights below: a cancelled caller only
+            # detaches, and the agents waiting on the same queries still get their results.
+            spawn(self._afetch_claimed(leads))
+
+        results_map = {}
+        for q, future in in_flight.items():
+            try:
+                results_map[q] = await asyncio.shield(asyncio.wrap_future(future))
+            except Exception as exc:
+                results_map[q] = f"Search generated an exception: {exc}"
+        return results_map
+
+    def _search_each(self, queries: List[str], search) -> Dict[str, str]:
+        """`search(query)` for every query, on the executor shared by all agents."""
+        if len(queries) == 1:
+            futures = None
+        else:
+            futures = {q: _search_executor.submit(propagate(search), q) for q in queries}
+        results_map = {}
+        for q in queries:
+            try:
+                results_map[q] = futures[q].result() if futures else search(q)
+            except Exception as exc:
+                results_map[q] = f"Search generated an exception: {exc}"
+        return results_map
+
+    async def _asearch_each(self, queries: List[str], search) -> Dict[str, str]:
+        outcomes = await asyncio.gather(
+            *(search(q) for q in queries),
+            return_exceptions=True
+        )
+        results_map = {}
+        for original_q, data in zip(queries, outcomes):
+            if isinstance(data, Exception):
+                results_map[original_q] = f"Search generated an exception: {data}"
+            else:
+                results_map[original_q] = data
+        return results_map
+
+    def _parse_queries(self, params: Union[str, dict]):
         query = None
         if isinstance(params, str):
             try:
@@ -261,18 +619,18 @@ class Search(BaseTool):
             queries = query
         else:
             return "[Search] Invalid query format."
+        return queries
 
-        results_map = {}
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_query = {executor.submit(self.google_search_with_serp, q): q for q in queries}
-            
-            for future in as_completed(future_to_query):
-                original_q = future_to_query[future]
-                try:
-                    data = future.result()
-                    results_map[original_q] = data
-                except Exception as exc:
-                    results_map[original_q] = f"Search generated an exception: {exc}"
+    def call(self, params: Union[str, dict], **kwargs) -> str:
+        queries = self._parse_queries(params)
+        if isinstance(queries, str):
+            return queries
+
+        unique_queries = list(dict.fromkeys(queries))
+        if SERPER_BATCH_SIZE > 1 and len(unique_queries) > 1:
+            results_map = self.google_search_batch(unique_queries)
+        else:
+            results_map = self._search_each(unique_queries, self.google_search_with_serp)
 
         final_responses = []
         for q in queries:
@@ -280,17 +638,22 @@ class Search(BaseTool):
 
         return "\n=======\n".join(final_responses), 0, 0
 
+    async def acall(self, params: Union[str, dict], **kwargs) -> str:
+        queries = self._parse_queries(params)
+        if isinstance(queries, str):
+            return queries
 
-@staticmethod
-def truncate_to_tokens(text: str, max_tokens: int = 95000) -> str:
-    encoding = tiktoken.get_encoding("cl100k_base")
-    
-    tokens = encoding.encode(text)
-    if len(tokens) <= max_tokens:
-        return text
-    
-    truncated_tokens = tokens[:max_tokens]
-    return encoding.decode(truncated_tokens)
+        unique_queries = list(dict.fromkeys(queries))
+        if SERPER_BATCH_SIZE > 1 and len(unique_queries) > 1:
+            results_map = await self.agoogle_search_batch(unique_queries)
+        else:
+            results_map = await self._asearch_each(unique_queries, self.agoogle_search_with_serp)
+
+        final_responses = []
+        for q in queries:
+            final_responses.append(results_map.get(q, "Error retrieval"))
+
+        return "\n=======\n".join(final_responses), 0, 0
 
 
 class Visit(BaseTool):
@@ -318,6 +681,70 @@ class Visit(BaseTool):
     def __init__(self, cfg: Optional[dict] = None):
         super().__init__(cfg)
         self.cache = ToolCache() 
+        # Concurrent visits of the same URL share one cache lookup and Jina fetch.
+        self.page_flight = get_flight("visit")
+
+    def _failed_page_info(self, url, goal) -> str:
+        useful_information = "The useful information in {url} for user goal {goal} as follows: \n\n".format(url=url, goal=goal)
+        useful_information += "Evidence in page: \n" + "The provided webpage content could not be accessed. Please check the URL or file format." + "\n\n"
+        useful_information += "Summary: \n" + "The webpage content could not be processed, and therefore, no information is available." + "\n\n"
+        return useful_information
+
+    def _format_summary(self, url, goal, raw: dict) -> str:
+        useful_information = "The useful information in {url} for user goal {goal} as follows: \n\n".format(url=url, goal=goal)
+        useful_information += "Evidence in page: \n" + str(raw["evidence"]) + "\n\n"
+        useful_information += "Summary: \n" + str(raw["summary"]) + "\n\n"
+        return useful_information
+
+    def _normalize_goal(self, goal: str) -> str:
+        return " ".join(goal.lower().split()).rstrip(" .?!。？！")
+
+    def _summary_cache_key(self, url: str, goal: str) -> str:
+        parts = [url, self._normalize_goal(goal), SUMMARY_MODEL_NAME, EXTRACTOR_PROMPT_VERSION]
+        if VISIT_CHUNK_BUDGET_TOKENS > 0:
+            # The extractor sees different text with another chunk budget.
+            parts.append(f"chunks:{VISIT_CHUNK_BUDGET_TOKENS}:{VISIT_CHUNK_TOKENS}")
+        if VISIT_MAP_REDUCE_TOKENS > 0:
+            parts.append(f"map:{VISIT_MAP_REDUCE_TOKENS}:{VISIT_MAP_CHUNK_TOKENS}:{VISIT_MAP_MAX_CHUNKS}:{REDUCE_PROMPT_VERSION}")
+        digest = hashlib.sha256(
+            "\x1f".join(parts).encode('utf-8')
+        ).hexdigest()
+        return f"visit_summary_v1:{digest}"
+
+    def _cached_summary(self, summary_key: str, url: str, goal: str) -> Optional[str]:
+        cached = self.cache.get(summary_key)
+        if not cached:
+            return None
+        try:
+            record = json.loads(cached)
+            useful_information = self._format_summary(url, goal, record)
+        except Exception as e:
+            print(f"[Visit] Broken summary cache entry for {url}: {e}")
+            return None
+        print(f"[Visit] Summary cache hit for URL: {url}")
+        self.cache.record_stat("visit_summary_v1", "saved_input_tokens", record.get("input_tokens", 0))
+        self.cache.record_stat("visit_summary_v1", "saved_output_tokens", record.get("output_tokens", 0))
+        return useful_information
+
+    def _chunk_cache_key(self, chunk: str, goal: str) -> str:
+        # Keyed by chunk content rather than URL: a re-visited page only redoes the chunks that changed.
+        digest = hashlib.sha256(
+            "\x1f".join([chunk, self._normalize_goal(goal), SUMMARY_MODEL_NAME, EXTRACTOR_PROMPT_VERSION]).encode('utf-8')
+        ).hexdigest()
+        return f"visit_chunk_v1:{digest}"
+
+    def _cached_chunk_extraction(self, chunk_key: str) -> Optional[dict]:
+        cached = self.cache.get(chunk_key)
+        if not cached:
+            return None
+        try:
+            record = json.loads(cached)
+        except Exception as e:
+            print(f"[Visit] Broken chunk cache entry {chunk_key}: {e}")
+            return None
+        self.cache.record_stat("visit_chunk_v1", "saved_input_tokens", record.get("input_tokens", 0))
+        self.cache.record_stat("visit_chunk_v1", "saved_output_tokens", record.get("output_tokens", 0))
+        return record
 
     def call(self, params: Union[str, dict], **kwargs) -> str:
         try:
@@ -326,8 +753,6 @@ class Visit(BaseTool):
         except:
             return "[Visit] Invalid request format: Input must be a JSON object containing 'url' and 'goal' fields"
 
-        start_time = time.time()
-        
         total_input_tokens = 0
         total_output_tokens = 0
 
@@ -336,23 +761,101 @@ class Visit(BaseTool):
             total_input_tokens += input_tokens
             total_output_tokens += output_tokens
         else:
-            response = []
             assert isinstance(url, List)
-            start_time = time.time()
-            for u in url: 
-                if time.time() - start_time > 900:
-                    cur_response = "The useful information in {url} for user goal {goal} as follows: \n\n".format(url=url, goal=goal)
-                    cur_response += "Evidence in page: \n" + "The provided webpage content could not be accessed. Please check the URL or file format." + "\n\n"
-                    cur_response += "Summary: \n" + "The webpage content could not be processed, and therefore, no information is available." + "\n\n"
-                else:
-                    try:
-                        cur_response, input_tokens, output_tokens = self.readpage_jina(u, goal)
-                        total_input_tokens += input_tokens
-                        total_output_tokens += output_tokens
-                    except Exception as e:
-                        cur_response = f"Error fetching {u}: {str(e)}"
-                response.append(cur_response)
-            response = "\n=======\n".join(response)
+            response, total_input_tokens, total_output_tokens = self._visit_pages(url, goal)
+        
+        print(f'Summary Length {len(response)}; Summary Content {response}')
+        return response.strip(), total_input_tokens, total_output_tokens
+
+    def _collect_pages(self, urls, goal, outcomes):
+        """Join per-page outcomes in the original URL order.
+
+        `outcomes[i]` is the `(summary, input_tokens, output_tokens)` of a finished page,
+        an exception, or None when the page did not finish before the deadline. A page
+        stopped at the deadline still counts the tokens it spent.
+        """
+        response = []
+        total_input_tokens = 0
+        total_output_tokens = 0
+        for u, outcome in zip(urls, outcomes):
+            if outcome is None:
+                cur_response = self._failed_page_info(u, goal)
+            elif isinstance(outcome, BaseException):
+                cur_response = f"Error fetching {u}: {str(outcome)}"
+                if isinstance(outcome, VisitDeadlineExceeded):
+                    total_input_tokens += outcome.input_tokens
+                    total_output_tokens += outcome.output_tokens
+            else:
+                cur_response, input_tokens, output_tokens = outcome
+                total_input_tokens += input_tokens
+                total_output_tokens += output_tokens
+            response.append(cur_response)
+        return "\n=======\n".join(response), total_input_tokens, total_output_tokens
+
+    def _visit_pages(self, urls, goal):
+        deadline = time.time() + VISIT_TIMEOUT
+        # Queued pages are dropped at the deadline; running ones stop at their next summary call.
+        futures = _submit_bounded(_page_executor, lambda u: self.readpage_jina(u, goal, deadline),
+                                  urls, VISIT_MAX_PARALLEL, timeout=VISIT_TIMEOUT)
+        outcomes = [None] * len(urls)
+        unfinished = 0
+        for idx, future in enumerate(futures):
+            if future is None or not future.done() or future.cancelled():
+                unfinished += 1
+                if future is not None:
+                    # Its tokens arrive after this call returns; they are counted in the metrics instead.
+                    future.add_done_callback(_count_late_page)
+                continue
+            try:
+                outcomes[idx] = future.result()
+            except Exception as e:
+                outcomes[idx] = e
+        if unfinished:
+            print(f"[visit] Deadline of {VISIT_TIMEOUT}s reached, {unfinished}/{len(urls)} pages unfinished")
+        return self._collect_pages(urls, goal, outcomes)
+
+    async def _avisit_pages(self, urls, goal):
+        semaphore = asyncio.Semaphore(max(1, VISIT_MAX_PARALLEL))
+
+        async def visit_one(u):
+            async with semaphore:
+                return await self.areadpage_jina(u, goal)
+
+        tasks = [asyncio.create_task(visit_one(u)) for u in urls]
+        done, pending = await asyncio.wait(tasks, timeout=VISIT_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"[visit] Deadline of {VISIT_TIMEOUT}s reached, {len(pending)}/{len(urls)} pages unfinished")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        outcomes = []
+        for task in tasks:
+            if task not in done or task.cancelled():
+                outcomes.append(None)
+            elif task.exception() is not None:
+                outcomes.append(task.exception())
+            else:
+                outcomes.append(task.result())
+        return self._collect_pages(urls, goal, outcomes)
+
+    async def acall(self, params: Union[str, dict], **kwargs) -> str:
+        try:
+            url = params["url"]
+            goal = params["goal"]
+        except:
+            return "[Visit] Invalid request format: Input must be a JSON object containing 'url' and 'goal' fields"
+
+        total_input_tokens = 0
+        total_output_tokens = 0
+
+        if isinstance(url, str):
+            response, input_tokens, output_tokens = await self.areadpage_jina(url, goal)
+            total_input_tokens += input_tokens
+            total_output_tokens += output_tokens
+        else:
+            assert isinstance(url, List)
+            response, total_input_tokens, total_output_tokens = await self._avisit_pages(url, goal)
         
         print(f'Summary Length {len(response)}; Summary Content {response}')
         return response.strip(), total_input_tokens, total_output_tokens
@@ -386,35 +889,121 @@ class Visit(BaseTool):
         
         raise ValueError("Could not extract valid JSON from response")
         
+    def _summary_request(self, msgs, model_name, base_url, with_response_format=True) -> dict:
+        response_format = summary_response_format(base_url) if with_response_format else None
+        kwargs = {"response_format": response_format} if response_format else {}
+        return dict(messages=msgs, model=model_name, temperature=0.7, max_tokens=8192, tools=None,
+                    enable_thinking=False, **kwargs)
+
+    def _response_format_rejected(self, request: dict, error: Exception) -> bool:
+        """Whether a failed summary request is worth repeating without its response_format."""
+        if "response_format" not in request or _error_status_code(error) not in (400, 422):
+            return False
+        print(f"[visit] Summary request with response_format failed ({error}), retrying without it")
+        return True
+
+    def _mark_response_format_unsupported(self, base_url):
+        # The plain request went through, so it was response_format that the endpoint rejected.
+        _response_format_unsupported.add(base_url)
+        METRICS.inc("summary_response_format_unsupported_total")
+
+    def _generate_summary(self, client, msgs, model_name, base_url):
+        request = self._summary_request(msgs, model_name, base_url)
+        try:
+            return generate_response(client=client, **request)
+        except Exception as e:
+            if not self._response_format_rejected(request, e):
+                raise
+        response = generate_response(client=client, **self._summary_request(msgs, model_name, base_url, False))
+        self._mark_response_format_unsupported(base_url)
+        return response
+
+    async def _agenerate_summary(self, client, msgs, model_name, base_url):
+        request = self._summary_request(msgs, model_name, base_url)
+        try:
+            return await agenerate_response(client=client, **request)
+        except Exception as e:
+            if not self._response_format_rejected(request, e):
+                raise
+        response = await agenerate_response(client=client, **self._summary_request(msgs, model_name, base_url, False))
+        self._mark_response_format_unsupported(base_url)
+        return response
+
+    def _summary_failed(self, limiter, error: Exception, attempt: int, max_retries: int) -> bool:
+        """Records a failed summary attempt; True when it was the last one."""
+        print(error)
+        retry_after = retry_after_from_error(error)
+        if retry_after is not None:
+            limiter.penalize(retry_after)
+        if attempt == (max_retries - 1):
+            return True
+        METRICS.inc("tool_retries_total", tool="summary_llm")
+        return False
+
+    @traced("visit.summary_llm", cat="llm")
     def call_server(self, msgs, max_retries=2):
-        api_key = SUMMARY_API_KEY
-        url_llm = SUMMARY_API_BASE_URL
-        model_name = SUMMARY_MODEL_NAME
-        client = build_client(
-            model_name=model_name,
-            api_key=api_key,
-            base_url=url_llm
-        )
+        client = get_client(model_name=SUMMARY_MODEL_NAME, api_key=SUMMARY_API_KEY, base_url=SUMMARY_API_BASE_URL)
+        limiter = get_limiter(SUMMARY_API_BASE_URL)
+        estimated_tokens = estimate_tokens(msgs) + 8192
         for attempt in range(max_retries):
             try:
-                messages, input_tokens, output_tokens = generate_response(
-                    client=client,
-                    messages=msgs,
-                    model=model_name,
-                    temperature=0.7,
-                    max_tokens=8192,
-                    tools=None,
-                    enable_thinking=False
-                )
-                content = messages.content
-                return content, input_tokens, output_tokens
+                limiter.acquire(estimated_tokens)
+                messages, input_tokens, output_tokens = self._generate_summary(client, msgs, SUMMARY_MODEL_NAME, SUMMARY_API_BASE_URL)
+                limiter.settle(estimated_tokens, input_tokens + output_tokens)
+                return messages.content, input_tokens, output_tokens
             except Exception as e:
-                print(e)
-                if attempt == (max_retries - 1):
+                if self._summary_failed(limiter, e, attempt, max_retries):
                     return "", 0, 0
-                continue
 
+    @traced("visit.summary_llm", cat="llm")
+    async def acall_server(self, msgs, max_retries=2):
+        client = get_async_client(model_name=SUMMARY_MODEL_NAME, api_key=SUMMARY_API_KEY, base_url=SUMMARY_API_BASE_URL)
+        limiter = get_limiter(SUMMARY_API_BASE_URL)
+        estimated_tokens = estimate_tokens(msgs) + 8192
+        for attempt in range(max_retries):
+            try:
+                await limiter.aacquire(estimated_tokens)
+                messages, input_tokens, output_tokens = await self._agenerate_summary(client, msgs, SUMMARY_MODEL_NAME, SUMMARY_API_BASE_URL)
+                limiter.settle(estimated_tokens, input_tokens + output_tokens)
+                return messages.content, input_tokens, output_tokens
+            except Exception as e:
+                if self._summary_failed(limiter, e, attempt, max_retries):
+                    return "", 0, 0
+
+
+    def _summary_calls(self, messages, max_retries=2):
+        """`call_server` for one message list, or for every message list of a `SummaryBatch`, VISIT_MAP_FANOUT at a time."""
+        if not isinstance(messages, SummaryBatch):
+            return self.call_server(messages, max_retries=max_retries)
+        futures = _submit_bounded(_summary_executor, lambda msgs: self.call_server(msgs, max_retries=max_retries),
+                                  messages, VISIT_MAP_FANOUT)
+        return [future.result() for future in futures]
+
+    async def _asummary_calls(self, messages, max_retries=2):
+        if not isinstance(messages, SummaryBatch):
+            return await self.acall_server(messages, max_retries=max_retries)
+        semaphore = asyncio.Semaphore(max(1, VISIT_MAP_FANOUT))
+
+        async def call(msgs):
+            async with semaphore:
+                return await self.acall_server(msgs, max_retries=max_retries)
+
+        return list(await asyncio.gather(*(call(msgs) for msgs in messages)))
 
+    def _jina_page(self, response, limiter):
+        """`(content, cache status)` of a Jina response; raises for a failure worth retrying."""
+        if response.status_code == 200:
+            return response.text, STATUS_OK
+        if response.status_code == 429:
+            limiter.penalize(parse_retry_after(response.headers) or 1.0)
+        print(response.text)
+        status = failure_status(response.status_code)
+        if status != STATUS_TRANSIENT:
+            # Retrying a 404 or a rejected key only adds load.
+            return "[visit] Failed to read page.", status
+        raise ValueError("jina readpage error")
+
+    @traced("visit.jina_fetch", cat="http")
     def jina_readpage(self, url: str) -> str:
         max_retries = 3
         timeout = 50
@@ -424,103 +1013,290 @@ class Visit(BaseTool):
                 "Authorization": f"Bearer {JINA_API_KEYS}",
             }
             try:
-                response = requests.get(
-                    f"https://r.jina.ai/{url}",
+                session = get_http_session(JINA_BASE_URL, JINA_API_KEYS)
+                limiter = get_limiter(JINA_BASE_URL)
+                limiter.acquire()
+                response = session.get(
+                    f"{JINA_BASE_URL}/{url}",
                     headers=headers,
                     timeout=timeout
                 )
-                if response.status_code == 200:
-                    webpage_content = response.text
-                    return webpage_content
-                else:
-                    print(response.text)
-                    raise ValueError("jina readpage error")
+                return self._jina_page(response, limiter)
             except Exception as e:
-                time.sleep(0.5)
-                if attempt == max_retries - 1:
-                    return "[visit] Failed to read page."
+                METRICS.inc("tool_retries_total", tool="jina")
+                with span("visit.jina_backoff", cat="retry", seconds=0.5):
+                    time.sleep(0.5)
                 
-        return "[visit] Failed to read page."
+        return "[visit] Failed to read page.", STATUS_TRANSIENT
 
-    def html_readpage_jina(self, url: str) -> str:
+    @traced("visit.jina_fetch", cat="http")
+    async def ajina_readpage(self, url: str) -> str:
+        max_retries = 3
+        timeout = 50
+        
+        for attempt in range(max_retries):
+            headers = {
+                "Authorization": f"Bearer {JINA_API_KEYS}",
+            }
+            try:
+                client = get_async_http_client(JINA_BASE_URL, JINA_API_KEYS)
+                limiter = get_limiter(JINA_BASE_URL)
+                await limiter.aacquire()
+                response = await client.get(
+                    f"{JINA_BASE_URL}/{url}",
+                    headers=headers,
+                    timeout=timeout
+                )
+                return self._jina_page(response, limiter)
+            except Exception as e:
+                METRICS.inc("tool_retries_total", tool="jina")
+                with span("visit.jina_backoff", cat="retry", seconds=0.5):
+                    await asyncio.sleep(0.5)
+                
+        return "[visit] Failed to read page.", STATUS_TRANSIENT
+
+    def _is_valid_content(self, content: str) -> bool:
+        return bool(content) and not content.startswith("[visit] Failed to read page.") and content != "[visit] Empty content." and not content.startswith("[document_parser]")
+
+    def _cached_page(self, url: str) -> Optional[str]:
+        entry = self.cache.get_entry(f'visit_v1:{url}')
+        if entry is None or not entry[0]:
+            return None
+        cached_result, status = entry
+        if status == STATUS_OK:
+            print(f"[Visit] Cache hit for URL: {url}")
+        else:
+            print(f"[Visit] Cached {status} failure for URL: {url}, not fetching it again yet")
+        return cached_result
+
+    def _store_page(self, url: str, content: str, status: Optional[str]) -> str:
+        if status is not None:
+            self.cache.set(f'visit_v1:{url}', content, status)
+        return content
+
+    def _page_content(self, url: str) -> str:
+        cached_result = self._cached_page(url)
+        if cached_result is not None:
+            return cached_result
+        return self._store_page(url, *self.html_readpage_jina(url))
+
+    async def _apage_content(self, url: str) -> str:
+        cached_result = await asyncio.to_thread(self._cached_page, url)
+        if cached_result is not None:
+            return cached_result
+        return await asyncio.to_thread(self._store_page, url, *await self.ahtml_readpage_jina(url))
+
+    def html_readpage_jina(self, url: str):
+        """`(content, cache status)` of a page; the status is None when the failure is not to be cached."""
         max_attempts = 3
         for attempt in range(max_attempts):
-            content = self.jina_readpage(url)
+            content, status = self.jina_readpage(url)
             service = "jina"     
-            if content and not content.startswith("[visit] Failed to read page.") and content != "[visit] Empty content." and not content.startswith("[document_parser]"):
-                return content
-        return "[visit] Failed to read page."
+            if self._is_valid_content(content):
+                return content, STATUS_OK
+            if status not in (STATUS_OK, STATUS_TRANSIENT):
+                break
+        # A page that Jina serves without usable content is not going to change soon either.
+        return "[visit] Failed to read page.", STATUS_PERMANENT if status == STATUS_OK else status
+
+    async def ahtml_readpage_jina(self, url: str):
+        max_attempts = 3
+        for attempt in range(max_attempts):
+            content, status = await self.ajina_readpage(url)
+            if self._is_valid_content(content):
+                return content, STATUS_OK
+            if status not in (STATUS_OK, STATUS_TRANSIENT):
+                break
+        return "[visit] Failed to read page.", STATUS_PERMANENT if status == STATUS_OK else status
 
-    def readpage_jina(self, url: str, goal: str) -> str:
-        cache_key = f'visit_v1:{url}'
+    @traced("visit.chunk_filter", cat="tool")
+    def _page_budget(self, content: str, goal: str):
+        """The part of the page sent to the extractor: the chunks that best match `goal` or the first 95k tokens."""
+        if VISIT_CHUNK_BUDGET_TOKENS <= 0:
+            return TokenBudget(content, max_tokens=95000)
+        budget = ChunkBudget(content, goal, max_tokens=min(VISIT_CHUNK_BUDGET_TOKENS, 95000), chunk_tokens=VISIT_CHUNK_TOKENS)
+        METRICS.inc("visit_chunks_total", budget.n_chunks)
+        METRICS.inc("visit_chunks_kept_total", budget.kept_chunks)
+        return budget
 
-        cached_result = self.cache.get(cache_key)
-        if cached_result:
-            print(f"[Visit] Cache hit for URL: {url}")
-            content = cached_result
+    def _is_long_page(self, content: str) -> bool:
+        return VISIT_MAP_REDUCE_TOKENS > 0 and encode_prefix(content, VISIT_MAP_REDUCE_TOKENS)[1]
+
+    def _repair_json(self, raw: str):
+        try:
+            return self._extract_json(raw)
+        except ValueError:
+            pass
+        try:
+            return json_repair.loads(raw)
+        except Exception:
+            return None
+
+    def _parse_extraction(self, raw: str) -> Optional[dict]:
+        """Evidence and summary of an extractor response, None when it has none.
+
+        A response that is not plain JSON is repaired locally (code fences, text
+        around the object, broken quoting) before the caller re-calls the extractor.
+        """
+        if not isinstance(raw, str) or not raw.strip():
+            return None
+        try:
+            record = json.loads(raw.replace("```json", "").replace("```", "").strip())
+        except Exception:
+            record = self._repair_json(raw)
+            if isinstance(record, dict) and "evidence" in record and "summary" in record:
+                METRICS.inc("visit_repair_calls_avoided_total")
+                self.cache.record_stat("visit_summary_v1", "repair_calls_avoided")
+        if not isinstance(record, dict) or "evidence" not in record or "summary" not in record:
+            return None
+        return {"evidence": record["evidence"], "summary": record["summary"]}
+
+    def _map_reduce_page(self, url: str, goal: str, content: str, summary_key: str):
+        """`_summarize_page` for pages longer than VISIT_MAP_REDUCE_TOKENS.
+
+        The page is split into chunks of VISIT_MAP_CHUNK_TOKENS, at most
+        VISIT_MAP_MAX_CHUNKS of them (the best matches for the goal when there are
+        more). Uncached chunks are extracted in one `SummaryBatch`, and the chunk
+        extractions are merged by a REDUCE_PROMPT call.
+        """
+        total_input_tokens = 0
+        total_output_tokens = 0
+
+        chunks = split_chunks(content[:MAX_SCAN_CHARS], VISIT_MAP_CHUNK_TOKENS)
+        if len(chunks) > VISIT_MAP_MAX_CHUNKS:
+            scores = bm25_scores(goal, chunks)
+            best = sorted(range(len(chunks)), key=lambda i: (i != 0, -scores[i], i))[:VISIT_MAP_MAX_CHUNKS]
+            chunks = [chunks[i] for i in sorted(best)]
+        chunk_keys = [self._chunk_cache_key(chunk, goal) for chunk in chunks]
+        extractions = [self._cached_chunk_extraction(key) for key in chunk_keys]
+        missing = [i for i, extraction in enumerate(extractions) if extraction is None]
+        print(f"[visit] Map-reduce url[{url}]: {len(chunks)} chunks, {len(chunks) - len(missing)} cached")
+        METRICS.inc("visit_map_chunks_total", len(chunks))
+        METRICS.inc("visit_map_chunks_cached_total", len(chunks) - len(missing))
+
+        if missing:
+            batch = SummaryBatch(
+                [{"role": "user", "content": EXTRACTOR_PROMPT.format(
+                    webpage_content=TokenBudget(chunks[i], max_tokens=95000).text, goal=goal)}]
+                for i in missing
+            )
+            results = yield batch
+            for i, (raw, input_tokens, output_tokens) in zip(missing, results):
+                total_input_tokens += input_tokens
+                total_output_tokens += output_tokens
+                extraction = self._parse_extraction(raw)
+                if extraction is None:
+                    # Not cached: the next visit retries this chunk.
+                    continue
+                extraction.update(input_tokens=input_tokens, output_tokens=output_tokens)
+                self.cache.set(chunk_keys[i], json.dumps(extraction, ensure_ascii=False))
+                extractions[i] = extraction
+
+        found = [extraction for extraction in extractions if extraction is not None]
+        if not found:
+            return self._failed_page_info(url, goal), total_input_tokens, total_output_tokens
+        # A summary cache hit saves the cached chunk extractions as well.
+        summary_input_tokens = sum(e.get("input_tokens", 0) for e in found)
+        summary_output_tokens = sum(e.get("output_tokens", 0) for e in found)
+
+        merged = found[0] if len(found) == 1 else None
+        if merged is None:
+            chunk_extractions = "\n\n".join(
+                f"### Extract {n} of {len(found)}\nEvidence: {e['evidence']}\nSummary: {e['summary']}"
+                for n, e in enumerate(found, 1)
+            )
+            messages = [{"role": "user", "content": REDUCE_PROMPT.format(
+                chunk_extractions=TokenBudget(chunk_extractions, max_tokens=95000).text, goal=goal)}]
+            raw, input_tokens, output_tokens = yield messages
+            total_input_tokens += input_tokens
+            total_output_tokens += output_tokens
+            summary_input_tokens += input_tokens
+            summary_output_tokens += output_tokens
+            merged = self._parse_extraction(raw)
+
+        if merged is None:
+            print(f"[visit] Reduce failed for url[{url}], joining {len(found)} chunk extractions")
+            merged = {
+                "evidence": "\n\n".join(str(e["evidence"]) for e in found),
+                "summary": "\n\n".join(str(e["summary"]) for e in found),
+            }
         else:
-            content = self.html_readpage_jina(url)
-            self.cache.set(cache_key, content)
-   
-        summary_page_func = self.call_server
-        max_retries = int(os.getenv('VISIT_SERVER_MAX_RETRIES', 1))
+            self.cache.set(summary_key, json.dumps({
+                "evidence": merged["evidence"],
+                "summary": merged["summary"],
+                "input_tokens": summary_input_tokens,
+                "output_tokens": summary_output_tokens
+            }, ensure_ascii=False))
+        return self._format_summary(url, goal, merged), total_input_tokens, total_output_tokens
+
+    def _summarize_page(self, url: str, goal: str, content: str, summary_key: str):
+        """Extraction workflow shared by `readpage_jina` and `areadpage_jina`.
 
+        A generator that yields the extractor messages and expects the
+        `(raw, input_tokens, output_tokens)` of the summary call to be sent back.
+        A yielded `SummaryBatch` expects the list of results of its calls instead.
+        Returns `(useful_information, total_input_tokens, total_output_tokens)`;
+        parsed summaries are also stored under `summary_key`.
+        """
         total_input_tokens = 0
         total_output_tokens = 0
 
-        if content and not content.startswith("[visit] Failed to read page.") and content != "[visit] Empty content." and not content.startswith("[document_parser]"):
-            content = truncate_to_tokens(content, max_tokens=95000)
+        if self._is_valid_content(content) and self._is_long_page(content):
+            return (yield from self._map_reduce_page(url, goal, content, summary_key))
+
+        if self._is_valid_content(content):
+            budget = self._page_budget(content, goal)
+            content = budget.text
             messages = [{"role":"user","content": EXTRACTOR_PROMPT.format(webpage_content=content, goal=goal)}]
             parse_retry_times = 0
-            raw, input_tokens, output_tokens = summary_page_func(messages, max_retries=max_retries)
+            raw, input_tokens, output_tokens = yield messages
             total_input_tokens += input_tokens
             total_output_tokens += output_tokens
             summary_retries = 3
             while len(raw) < 10 and summary_retries >= 0:
-                truncate_length = int(0.7 * len(content)) if summary_retries > 0 else 25000
                 status_msg = (
                     f"[visit] Summary url[{url}] " 
                     f"attempt {3 - summary_retries + 1}/3, "
-                    f"content length: {len(content)}, "
-                    f"truncating to {truncate_length} chars"
+                    f"content length: {len(budget)} tokens, "
+                    f"truncating to {int(0.7 * len(budget))} tokens"
                 ) if summary_retries > 0 else (
                     f"[visit] Summary url[{url}] failed after 3 attempts, "
                     f"final truncation to 25000 chars"
                 )
                 print(status_msg)
-                content = content[:truncate_length]
+                # Shrink the already encoded tokens instead of re-encoding the page.
+                content = budget.shrink(0.7) if summary_retries > 0 else content[:25000]
                 extraction_prompt = EXTRACTOR_PROMPT.format(
                     webpage_content=content,
                     goal=goal
                 )
                 messages = [{"role": "user", "content": extraction_prompt}]
-                raw, input_tokens, output_tokens = summary_page_func(messages, max_retries=max_retries)
+                raw, input_tokens, output_tokens = yield messages
                 total_input_tokens += input_tokens
                 total_output_tokens += output_tokens
                 summary_retries -= 1
 
             parse_retry_times = 0
-            if isinstance(raw, str):
-                raw = raw.replace("```json", "").replace("```", "").strip()
-            while parse_retry_times < 3:
-                try:
-                    raw = json.loads(raw)
-                    break
-                except:
-                    print("have error in readpage jina")
-                    raw, input_tokens, output_tokens = summary_page_func(messages, max_retries=max_retries)
-                    total_input_tokens += input_tokens
-                    total_output_tokens += output_tokens
-                    parse_retry_times += 1
-            
-            if parse_retry_times >= 3:
-                useful_information = "The useful information in {url} for user goal {goal} as follows: \n\n".format(url=url, goal=goal)
-                useful_information += "Evidence in page: \n" + "The provided webpage content could not be accessed. Please check the URL or file format." + "\n\n"
-                useful_information += "Summary: \n" + "The webpage content could not be processed, and therefore, no information is available." + "\n\n"
+            extraction = self._parse_extraction(raw)
+            while extraction is None and parse_retry_times < 3:
+                print("have error in readpage jina")
+                METRICS.inc("visit_repair_calls_total")
+                raw, input_tokens, output_tokens = yield messages
+                total_input_tokens += input_tokens
+                total_output_tokens += output_tokens
+                parse_retry_times += 1
+                extraction = self._parse_extraction(raw)
+
+            if extraction is None:
+                useful_information = self._failed_page_info(url, goal)
             else:
-                useful_information = "The useful information in {url} for user goal {goal} as follows: \n\n".format(url=url, goal=goal)
-                useful_information += "Evidence in page: \n" + str(raw["evidence"]) + "\n\n"
-                useful_information += "Summary: \n" + str(raw["summary"]) + "\n\n"
+                useful_information = self._format_summary(url, goal, extraction)
+                self.cache.set(summary_key, json.dumps({
+                    "evidence": extraction["evidence"],
+                    "summary": extraction["summary"],
+                    "input_tokens": total_input_tokens,
+                    "output_tokens": total_output_tokens
+                }, ensure_ascii=False))
 
             if len(useful_information) < 10 and summary_retries < 0:
                 print("[visit] Could not generate valid summary after maximum retries")
@@ -529,8 +1305,56 @@ class Visit(BaseTool):
             return useful_information, total_input_tokens, total_output_tokens
 
         else:
-            useful_information = "The useful information in {url} for user goal {goal} as follows: \n\n".format(url=url, goal=goal)
-            useful_information += "Evidence in page: \n" + "The provided webpage content could not be accessed. Please check the URL or file format." + "\n\n"
-            useful_information += "Summary: \n" + "The webpage content could not be processed, and therefore, no information is available." + "\n\n"
+            useful_information = self._failed_page_info(url, goal)
             return useful_information, total_input_tokens, total_output_tokens
 
+    @traced("visit.page", cat="tool")
+    def readpage_jina(self, url: str, goal: str, deadline: Optional[float] = None) -> str:
+        summary_key = self._summary_cache_key(url, goal)
+        cached_summary = self._cached_summary(summary_key, url, goal)
+        if cached_summary is not None:
+            return cached_summary, 0, 0
+
+        content = self.page_flight.do(f'visit_v1:{url}', self._page_content, url)
+   
+        summary_page_func = self._summary_calls
+        max_retries = int(os.getenv('VISIT_SERVER_MAX_RETRIES', 1))
+
+        steps = self._summarize_page(url, goal, content, summary_key)
+        spent = (0, 0)
+        finished, messages = _advance(steps)
+        while not finished:
+            if deadline is not None and time.time() > deadline:
+                steps.close()
+                raise VisitDeadlineExceeded(url, *spent)
+            outcome = summary_page_func(messages, max_retries=max_retries)
+            spent = tuple(map(sum, zip(spent, _summary_tokens(outcome))))
+            finished, messages = _advance(steps, outcome)
+        return messages
+
+    @traced("visit.page", cat="tool")
+    async def areadpage_jina(self, url: str, goal: str) -> str:
+        summary_key = self._summary_cache_key(url, goal)
+        cached_summary = await asyncio.to_thread(self._cached_summary, summary_key, url, goal)
+        if cached_summary is not None:
+            return cached_summary, 0, 0
+
+        content = await self.page_flight.ado(f'visit_v1:{url}', self._apage_content, url)
+   
+        summary_page_func = self._asummary_calls
+        max_retries = int(os.getenv('VISIT_SERVER_MAX_RETRIES', 1))
+
+        # Chunking, tokenizing and the cache lookups between the summary calls run off the event loop.
+        steps = self._summarize_page(url, goal, content, summary_key)
+        spent = (0, 0)
+        try:
+            finished, messages = await asyncio.to_thread(_advance, steps)
+            while not finished:
+                outcome = await summary_page_func(messages, max_retries=max_retries)
+                spent = tuple(map(sum, zip(spent, _summary_tokens(outcome))))
+                finished, messages = await asyncio.to_thread(_advance, steps, outcome)
+        except asyncio.CancelledError:
+            # Cancelled at the visit deadline: the calls made so far are not in the step's accounting.
+            _record_unaccounted_tokens(*spent)
+            raise
+        return messages
@@ -0,0 +1,155 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+
+# Question and step of the code that is running; asyncio tasks inherit them,
+# pool threads get them through `propagate`.
+_question = contextvars.ContextVar("trace_question", default=None)
+_step = contextvars.ContextVar("trace_step", default=None)
+
+_NULL_SPAN = nullcontext()
+
+
+def set_question(question_id):
+    _question.set(question_id)
+    _step.set(None)
+
+
+def set_step(step: int):
+    _step.set(step)
+
+
+def propagate(fn):
+    """Run `fn` in a copy of the caller's context, e.g. when submitting it to a thread pool.
+
+    Call it once per submission: a context can only be entered by one thread at a time.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class Tracer:
+    """Collects spans and writes them in the Chrome trace event format.
+
+    Each question is shown as a process and each thread (or asyncio task) that
+    worked on it as a track, so the trace opens in Perfetto (ui.perfetto.dev)
+    or chrome://tracing. Spans are only recorded after `enable()`; until then
+    `span` returns a shared no-op context manager.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._processes = {}
+        self._tracks = {}
+
+    def enable(self):
+        self.enabled = True
+        self._origin = time.perf_counter()
+
+    def _process(self, question) -> int:
+        pid = self._processes.get(question)
+        if pid is None:
+            pid = self._processes[question] = len(self._processes) + 1
+        return pid
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = ("task", id(task)) if task is not None else ("thread", threading.get_ident())
+        tid = self._tracks.get(key)
+        if tid is None:
+            tid = self._tracks[key] = len(self._tracks) + 1
+            self.events.append({"name": "thread_name", "ph": "M", "pid": 0, "tid": tid,
+                                "args": {"name": f"{key[0]} {tid}"}})
+        return tid
+
+    def record(self, name: str, start: float, end: float, cat: str = "harness", **args):
+        """Add a span that was timed by the caller (`time.perf_counter()` values)."""
+        if not self.enabled:
+            return
+        question, step = _question.get(), _step.get()
+        if question is not None:
+            args["question"] = question
+        if step is not None:
+            args["step"] = step
+        with self._lock:
+            self.events.append({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": round((start - self._origin) * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": self._process(question),
+                "tid": self._track(),
+                "args": args,
+            })
+
+    @contextmanager
+    def _span(self, name: str, cat: str, args: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, start, time.perf_counter(), cat, **args)
+
+    def span(self, name: str, cat: str = "harness", **args):
+        """Time the `with` block as a span tagged with `args` and the current question and step."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, cat, args)
+
+    def write_chrome_trace(self, path: str, metadata: Optional[dict] = None):
+        with self._lock:
+            events = list(self.events)
+            processes = dict(self._processes)
+        names = [
+            {"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+             "args": {"name": f"question {question}" if question is not None else "harness"}}
+            for question, pid in processes.items()
+        ]
+        # Track names were recorded before the process of their first span was known; repeat them per process.
+        tracks = [e for e in events if e["ph"] == "M"]
+        spans = [e for e in events if e["ph"] != "M"]
+        used = {(e["pid"], e["tid"]) for e in spans}
+        names += [dict(t, pid=pid) for t in tracks for pid, tid in used if tid == t["tid"]]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": names + spans, "displayTimeUnit": "ms", "otherData": metadata or {}}, f, ensure_ascii=False)
+        print(f"Trace with {len(spans)} spans saved to {path}")
+
+
+TRACER = Tracer()
+span = TRACER.span
+
+
+def traced(name: str, cat: str = "harness"):
+    """Decorator that records every call of a function or coroutine function as a span."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with TRACER.span(name, cat):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(name, cat):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
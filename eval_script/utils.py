@@ -1,6 +1,41 @@
-from typing import Any, Dict, List
-from openai import OpenAI
+import os
+import json
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from openai.types.chat import ChatCompletionMessage
 
+from context_compaction import CHARS_PER_TOKEN, estimate_tokens
+
+
+# Connection pool sizes shared by every client of the registry below.
+POOL_SIZES = {
+    "llm": int(os.getenv("LLM_POOL_SIZE", 100)),
+    "http": int(os.getenv("HTTP_POOL_SIZE", 100)),
+}
+
+_registry_lock = threading.Lock()
+_llm_clients = {}
+_http_sessions = {}
+# Async clients are bound to the event loop they were first used on.
+_async_llm_clients = weakref.WeakKeyDictionary()
+_async_http_clients = weakref.WeakKeyDictionary()
+
+
+def configure_pools(llm_pool_size: int = None, http_pool_size: int = None):
+    """Override the pool sizes; only affects clients created afterwards."""
+    if llm_pool_size:
+        POOL_SIZES["llm"] = llm_pool_size
+    if http_pool_size:
+        POOL_SIZES["http"] = http_pool_size
+
+def _limits(kind: str) -> httpx.Limits:
+    return httpx.Limits(max_connections=POOL_SIZES[kind], max_keepalive_connections=POOL_SIZES[kind])
 
 def build_client(
     model_name: str,
@@ -12,29 +47,247 @@ def build_client(
         api_key=api_key,
         base_url=base_url,
         timeout=timeout,
+        http_client=DefaultHttpxClient(limits=_limits("llm")),
+    )
+
+    return client
+
+def build_async_client(
+    model_name: str,
+    api_key: str,
+    base_url: str,
+    timeout: float = 600.0,
+):
+    client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        http_client=DefaultAsyncHttpxClient(limits=_limits("llm")),
     )
 
     return client
 
+def get_client(
+    model_name: str,
+    api_key: str,
+    base_url: str,
+    timeout: float = 600.0,
+):
+    """Process-wide OpenAI client for (base_url, api_key), reusing its keep-alive pool"""
+    key = (base_url, api_key)
+    client = _llm_clients.get(key)
+    if client is None:
+        with _registry_lock:
+            client = _llm_clients.get(key)
+            if client is None:
+                client = build_client(model_name=model_name, api_key=api_key, base_url=base_url, timeout=timeout)
+                _llm_clients[key] = client
+    return client
+
+def get_async_client(
+    model_name: str,
+    api_key: str,
+    base_url: str,
+    timeout: float = 600.0,
+):
+    """AsyncOpenAI counterpart of `get_client`, one per running event loop"""
+    clients = _async_llm_clients.setdefault(asyncio.get_running_loop(), {})
+    key = (base_url, api_key)
+    if key not in clients:
+        clients[key] = build_async_client(model_name=model_name, api_key=api_key, base_url=base_url, timeout=timeout)
+    return clients[key]
+
+def get_http_session(base_url: str, api_key: str = "") -> requests.Session:
+    """Process-wide keep-alive `requests.Session` for a tool endpoint"""
+    key = (base_url, api_key)
+    session = _http_sessions.get(key)
+    if session is None:
+        with _registry_lock:
+            session = _http_sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZES["http"], pool_maxsize=POOL_SIZES["http"])
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http_sessions[key] = session
+    return session
+
+def get_async_http_client(base_url: str, api_key: str = "") -> httpx.AsyncClient:
+    """`httpx.AsyncClient` counterpart of `get_http_session`, one per running event loop"""
+    clients = _async_http_clients.setdefault(asyncio.get_running_loop(), {})
+    key = (base_url, api_key)
+    if key not in clients:
+        clients[key] = httpx.AsyncClient(limits=_limits("http"), follow_redirects=True)
+    return clients[key]
+
+async def aclose_clients():
+    """Close the async clients of the running event loop before it shuts down"""
+    loop = asyncio.get_running_loop()
+    for client in _async_llm_clients.pop(loop, {}).values():
+        await client.close()
+    for client in _async_http_clients.pop(loop, {}).values():
+        await client.aclose()
+
+def build_extra_body(client: Any, enable_thinking: bool = False) -> dict:
+    """Provider specific switch for the thinking mode"""
+    if enable_thinking:
+        if 'dashscope' in str(client._base_url).lower():
+            extra_body = {'enable_thinking': True}
+        else:
+            extra_body = {'thinking': {"type": "enabled"}}
+    else:
+        extra_body = {"thinking": {"type": "disabled"}}
+    return extra_body
+
+def _as_dict(value) -> dict:
+    if isinstance(value, dict):
+        return value
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return dict(vars(value))
+
+class StreamedMessage:
+    """Assembles the chunks of a `stream=True` chat completion into the message the
+    non-streaming call returns.
+
+    Tool-call deltas are merged by their index. A tool call is handed to
+    `on_tool_call(index, tool_call)` as soon as its arguments parse as a JSON
+    object, or at the latest when the next tool call starts or the stream ends,
+    so the caller can start it while the model is still generating.
+    """
+
+    def __init__(self, on_tool_call: Optional[Callable] = None):
+        self.on_tool_call = on_tool_call
+        self.content = []
+        self.reasoning_content = []
+        self.reasoning_details = []
+        self.tool_calls = []
+        self.dispatched = set()
+        self.usage = None
+
+    def add(self, chunk):
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+        if delta.content:
+            self.content.append(delta.content)
+        reasoning = getattr(delta, "reasoning_content", None)
+        if reasoning:
+            self.reasoning_content.append(reasoning)
+        for detail in getattr(delta, "reasoning_details", None) or []:
+            self._merge_reasoning_detail(_as_dict(detail))
+        for tool_call in delta.tool_calls or []:
+            self._merge_tool_call(tool_call)
+
+    def _merge_reasoning_detail(self, detail: dict):
+        # OpenRouter streams reasoning details as fragments sharing an index; their text fields are concatenated.
+        index = detail.get("index")
+        for merged in self.reasoning_details:
+            if index is not None and merged.get("index") == index and merged.get("type") == detail.get("type"):
+                for key, value in detail.items():
+                    if key in ("text", "summary", "data", "signature") and isinstance(value, str) and isinstance(merged.get(key), str):
+                        merged[key] += value
+                    elif value is not None:
+                        merged[key] = value
+                return
+        self.reasoning_details.append(dict(detail))
+
+    def _merge_tool_call(self, delta):
+        index = delta.index if delta.index is not None else len(self.tool_calls)
+        # A delta for a later index means every earlier tool call is complete.
+        for earlier in range(min(index, len(self.tool_calls))):
+            self._dispatch(earlier)
+        while len(self.tool_calls) <= index:
+            self.tool_calls.append({"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+        tool_call = self.tool_calls[index]
+        if delta.id:
+            tool_call["id"] = delta.id
+        if delta.function is not None:
+            if delta.function.name:
+                tool_call["function"]["name"] += delta.function.name
+            if delta.function.arguments:
+                tool_call["function"]["arguments"] += delta.function.arguments
+        arguments = tool_call["function"]["arguments"].rstrip()
+        if arguments.endswith("}") and tool_call["function"]["name"]:
+            try:
+                json.loads(arguments)
+            except ValueError:
+                return
+            self._dispatch(index)
+
+    def _dispatch(self, index: int):
+        if self.on_tool_call is None or index in self.dispatched:
+            return
+        self.dispatched.add(index)
+        self.on_tool_call(index, self._tool_call_object(index))
+
+    def _tool_call_object(self, index: int):
+        return ChatCompletionMessage.model_validate(
+            {"role": "assistant", "tool_calls": [self.tool_calls[index]]}
+        ).tool_calls[0]
+
+    def finish(self, messages: List[Dict]):
+        """(message, input_tokens, output_tokens), as returned by `generate_response`."""
+        for index in range(len(self.tool_calls)):
+            self._dispatch(index)
+        message = {
+            "role": "assistant",
+            "content": "".join(self.content) or None,
+            "tool_calls": self.tool_calls or None,
+            "reasoning_content": "".join(self.reasoning_content) or None,
+            # Always set: the agent reads it from every OpenRouter turn, with or without reasoning.
+            "reasoning_details": self.reasoning_details,
+        }
+        message = ChatCompletionMessage.model_validate(message)
+
+        if self.usage is not None:
+            return message, self.usage.prompt_tokens, self.usage.completion_tokens
+        # The endpoint ignored stream_options.include_usage; fall back to the rough estimate.
+        output_chars = sum(map(len, self.content)) + sum(map(len, self.reasoning_content))
+        output_chars += sum(len(t["function"]["arguments"]) for t in self.tool_calls)
+        return message, estimate_tokens(messages), output_chars // CHARS_PER_TOKEN
+
+def _stream_kwargs(kwargs: dict) -> dict:
+    stream_options = dict(kwargs.pop("stream_options", None) or {})
+    stream_options.setdefault("include_usage", True)
+    return dict(kwargs, stream=True, stream_options=stream_options)
+
 def generate_response(
     client: Any,
     messages: List[Dict[str, str]],
-    model: str = "deepseek-v3.2",  
+    model: str = "deepseek-v3.2",
     temperature: float = 1.0,
     max_tokens: int = 8192,
     tools=None,
     enable_thinking: bool = False,
+    stream: bool = False,
+    on_tool_call: Optional[Callable] = None,
     **kwargs
 ):
-    """Generate response from LLM client"""
-    if enable_thinking:
-        if 'dashscope' in str(client._base_url).lower():
-            extra_body = {'enable_thinking': True}
-        else:
-            extra_body = {'thinking': {"type": "enabled"}}
-    else:
-        extra_body = {"thinking": {"type": "disabled"}}
-        
+    """Generate response from LLM client
+
+    With `stream=True` the response is read as it is generated and every tool call
+    is passed to `on_tool_call(index, tool_call)` as soon as it is complete.
+    """
+    extra_body = build_extra_body(client, enable_thinking)
+
+    if stream:
+        assembler = StreamedMessage(on_tool_call)
+        chunks = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            tools=tools,
+            extra_body=extra_body,
+            **_stream_kwargs(kwargs)
+        )
+        for chunk in chunks:
+            assembler.add(chunk)
+        return assembler.finish(messages)
+
     response = client.chat.completions.create(
         model=model,
         messages=messages,
@@ -48,3 +301,51 @@ def generate_response(
     output_tokens = response.usage.completion_tokens
     messages = response.choices[0].message
     return messages, input_tokens, output_tokens
+
+async def agenerate_response(
+    client: Any,
+    messages: List[Dict[str, str]],
+    model: str = "deepseek-v3.2",
+    temperature: float = 1.0,
+    max_tokens: int = 8192,
+    tools=None,
+    enable_thinking: bool = False,
+    stream: bool = False,
+    on_tool_call: Optional[Callable] = None,
+    **kwargs
+):
+    """Generate response from an async LLM client
+
+    With `stream=True` the response is read as it is generated and every tool call
+    is passed to `on_tool_call(index, tool_call)` as soon as it is complete.
+    """
+    extra_body = build_extra_body(client, enable_thinking)
+
+    if stream:
+        assembler = StreamedMessage(on_tool_call)
+        chunks = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            tools=tools,
+            extra_body=extra_body,
+            **_stream_kwargs(kwargs)
+        )
+        async for chunk in chunks:
+            assembler.add(chunk)
+        return assembler.finish(messages)
+
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        tools=tools,
+        extra_body=extra_body,
+        **kwargs
+    )
+    input_tokens = response.usage.prompt_tokens
+    output_tokens = response.usage.completion_tokens
+    messages = response.choices[0].message
+    return messages, input_tokens, output_tokens